@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from app.database import engine
+from app.models import shipment_import_key_index, IMPORT_KEY_TRIM_CHARS
+
+def migrate():
+    print("Creating unique import key index on shipments (order_number, batch_number)...")
+    with engine.connect() as conn:
+        try:
+            # The index cannot be built while several shipments share the same key
+            duplicates = conn.execute(text("""
+                SELECT trim(order_number, :chars) AS order_key, trim(batch_number, :chars) AS batch_key,
+                       count(*) AS n, array_agg(id ORDER BY id) AS ids
+                FROM shipments
+                WHERE order_number IS NOT NULL AND order_number <> ''
+                GROUP BY 1, 2
+                HAVING count(*) > 1
+            """), {"chars": IMPORT_KEY_TRIM_CHARS}).all()
+
+            if duplicates:
+                print(f"Found {len(duplicates)} duplicated (order, batch) keys, merge or delete them first:")
+                for d in duplicates[:50]:
+                    print(f" - order={d.order_key!r} batch={d.batch_key!r}: {d.n} shipments (ids {d.ids})")
+                print("Migration aborted. Imports keep using the row-by-row engine until the index exists.")
+                return
+
+            conn.execute(CreateIndex(shipment_import_key_index, if_not_exists=True))
+            conn.commit()
+            print(f"Index {shipment_import_key_index.name} created. Excel imports now use the bulk upsert engine.")
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            conn.rollback()
+
+if __name__ == "__main__":
+    migrate()
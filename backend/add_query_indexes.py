@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from app.database import engine
+from app.models import shipment_trigram_indexes, query_indexes, trigram_available
+
+def migrate():
+    print("Creating query indexes...")
+    with engine.connect() as conn:
+        try:
+            indexes = list(query_indexes)
+            if trigram_available(bind=conn):
+                # Trigram operators for the ILIKE '%X%' indexes
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                indexes += shipment_trigram_indexes
+            else:
+                print("pg_trgm is not available on this server: skipping the trigram indexes.")
+            for index in indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+                print(f" - {index.name}")
+            conn.commit()
+            print("Migration successful.")
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            conn.rollback()
+
+if __name__ == "__main__":
+    migrate()
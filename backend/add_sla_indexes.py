@@ -0,0 +1,19 @@
+from sqlalchemy.schema import CreateIndex
+from app.database import engine
+from app.models import open_shipment_eta_index, active_delay_alert_index
+
+def migrate():
+    print("Creating SLA monitor indexes...")
+    with engine.connect() as conn:
+        try:
+            for index in (open_shipment_eta_index, active_delay_alert_index):
+                conn.execute(CreateIndex(index, if_not_exists=True))
+                print(f" - {index.name}")
+            conn.commit()
+            print("Migration successful.")
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            conn.rollback()
+
+if __name__ == "__main__":
+    migrate()
@@ -1,12 +1,29 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import hmac
 import os
 
-PWD_CONTEXT = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Hashes with fewer rounds are upgraded on the next successful login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+# pbkdf2 releases the GIL: hashing runs in parallel on this many threads, off the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+PWD_CONTEXT = CryptContext(
+    schemes=["pbkdf2_sha256"], deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+)
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 SECRET_KEY = os.getenv("JWT_SECRET", "changethisforproduction")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Changing it invalidates every issued API key
+API_KEY_SECRET = os.getenv("API_KEY_SECRET", SECRET_KEY)
 
 def verify_password(plain_password, hashed_password):
     return PWD_CONTEXT.verify(plain_password, hashed_password)
@@ -14,6 +31,31 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return PWD_CONTEXT.hash(password)
 
+def is_password_hash(hashed_password: Optional[str]) -> bool:
+    """Whether `hashed_password` is a hash PWD_CONTEXT can verify (no KDF work)."""
+    return bool(hashed_password) and PWD_CONTEXT.identify(hashed_password) is not None
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    verify_password on the hashing pool. Returns (valid, new hash), the new hash
+    being set when the password is valid but its hash uses outdated parameters.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, PWD_CONTEXT.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, PWD_CONTEXT.hash, password)
+
+def hash_api_key(raw_key: str) -> str:
+    """
+    HMAC-SHA256 of an API key. The keys are 256-bit random, so unlike passwords
+    they need no salt nor slow hash: the digest is deterministic and a presented
+    key is found by an indexed lookup on ApiKey.key_hash.
+    """
+    return hmac.new(API_KEY_SECRET.encode(), raw_key.encode(), hashlib.sha256).hexdigest()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,129 @@
+"""
+Broadcast backplane for the live dashboards.
+
+ConnectionManager publishes its broadcasts and shipment deltas here, and
+every process subscribed (itself included) delivers them to the websockets
+it holds, so the API can run with several uvicorn workers.
+
+LIVE_BACKPLANE selects the implementation:
+- "postgres" (default): NOTIFY on LIVE_BACKPLANE_CHANNEL, one LISTEN
+  connection per process. Messages are fire-and-forget: a worker whose
+  listener is reconnecting misses them, like a dashboard that is offline.
+- "memory": within the process only (single worker, tests).
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+
+from .database import background_engine, engine
+
+logger = logging.getLogger(__name__)
+
+LIVE_BACKPLANE = os.getenv("LIVE_BACKPLANE", "postgres") # postgres, memory
+LIVE_BACKPLANE_CHANNEL = os.getenv("LIVE_BACKPLANE_CHANNEL", "live_updates")
+
+# NOTIFY payloads must stay under 8000 bytes
+MAX_MESSAGE_BYTES = 7900
+
+Handler = Callable[[str, str], None]
+
+
+class InMemoryBackplane:
+    """Delivers to the subscriber of this process only."""
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._handler = None
+
+    def publish(self, kind: str, payload: str):
+        """Deliver `payload` to the handler on its event loop. Safe from any thread."""
+        loop, handler = self._loop, self._handler
+        if handler is None or loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(handler, kind, payload)
+
+
+class PostgresBackplane:
+    """Postgres LISTEN/NOTIFY; the handler runs on the loop that called start()."""
+
+    def __init__(self, channel: str = LIVE_BACKPLANE_CHANNEL):
+        self.channel = channel
+        self.conninfo = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._handler: Optional[Handler] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    def publish(self, kind: str, payload: str):
+        """
+        NOTIFY every worker: one blocking round-trip, or a thread pool task
+        when called on an event loop (commit hooks of async sessions).
+        """
+        message = f"{kind}:{payload}"
+        if len(message.encode()) > MAX_MESSAGE_BYTES:
+            logger.error(f"Backplane: {kind} message too large ({len(message.encode())} bytes), dropped")
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._notify(message)
+        else:
+            loop.run_in_executor(None, self._notify, message)
+
+    def _notify(self, message: str):
+        try:
+            with background_engine.connect() as conn:
+                conn.execute(select(func.pg_notify(self.channel, message)))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Backplane: NOTIFY failed: {e}")
+
+    async def _listen(self):
+        import psycopg
+        from psycopg import sql
+
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                    logger.info(f"Backplane: listening on {self.channel}")
+                    delay = 1
+                    async for notify in conn.notifies():
+                        kind, _, payload = notify.payload.partition(":")
+                        try:
+                            self._handler(kind, payload)
+                        except Exception as e:
+                            logger.error(f"Backplane: handler failed for {kind}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane: listener error, reconnecting in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def create_backplane(kind: str = LIVE_BACKPLANE):
+    if kind == "postgres" and engine.dialect.name == "postgresql":
+        return PostgresBackplane()
+    if kind == "postgres":
+        logger.warning(f"Backplane: {engine.dialect.name} has no LISTEN/NOTIFY, using the in-memory backplane")
+    return InMemoryBackplane()
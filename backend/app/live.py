@@ -1,19 +1,440 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+"""
+Live updates for the /ws/shipments dashboards.
+
+Shipment changes are pushed as JSON deltas rather than "refetch" pings:
+    {"type": "shipments.delta", "shipments": [
+        {"id": 12, "op": "updated", "status": "...", "fields": {"planned_eta": "..."}},
+        {"id": 13, "op": "deleted"}]}
+Committed changes are collected by session hooks (or notify_bulk_import for
+Core writes) and coalesced for LIVE_DELTA_WINDOW_SECONDS, so an import ends
+up as one message per client. Values are read back from the database once
+per window, and each client only gets the shipments of its allowed_customer.
+
+New alerts (see services/sla_monitor.py) are pushed the same way, filtered
+by customer: {"type": "alerts.created", "alerts": [{"id", "shipment_id", ...}]}.
+
+Broadcasts, deltas and alerts go through the backplane (see backplane.py),
+so every worker process pushes them to its own connections.
+
+broadcast() only enqueues the message: a fan-out task copies it to a bounded
+queue per connection, and each connection has its own writer task, so a slow
+or dead client never holds up the others or the request that broadcast.
+
+When a connection's queue is full (LIVE_SEND_QUEUE_SIZE), the slow consumer
+policy applies: "disconnect" (default) closes it, the dashboard reconnects and
+refetches; "drop_oldest" discards its oldest queued message. A send taking
+longer than LIVE_SEND_TIMEOUT_SECONDS, or failing, also closes the connection.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional
+
+from fastapi import WebSocket
+from sqlalchemy import event, inspect, select
+
+from .backplane import MAX_MESSAGE_BYTES, create_backplane
+from .database import BackgroundSessionLocal, SessionLocal
+from .models import Shipment
+from .schemas import Shipment as ShipmentSchema
+
+logger = logging.getLogger(__name__)
+
+LIVE_SEND_QUEUE_SIZE = int(os.getenv("LIVE_SEND_QUEUE_SIZE", "100"))
+LIVE_SEND_TIMEOUT_SECONDS = float(os.getenv("LIVE_SEND_TIMEOUT_SECONDS", "10"))
+LIVE_SLOW_CONSUMER_POLICY = os.getenv("LIVE_SLOW_CONSUMER_POLICY", "disconnect") # disconnect, drop_oldest
+LIVE_DELTA_WINDOW_SECONDS = float(os.getenv("LIVE_DELTA_WINDOW_SECONDS", "0.5"))
+
+# Sent for created shipments, and for Core writes whose changed columns are unknown
+LIVE_DELTA_COLUMNS = (
+    "reference", "customer", "origin", "destination", "incoterm", "planned_etd", "planned_eta",
+    "sku", "quantity", "order_number", "mad_date", "its_date", "vessel", "bl_number",
+    "forwarder_ref", "status", "created_at",
+)
+# Changed columns are only pushed if the API exposes them
+_VISIBLE_COLUMNS = frozenset(ShipmentSchema.model_fields) - {"events"}
+
+# Close code for connections dropped server-side ("try again later")
+WS_TRY_AGAIN_LATER = 1013
+
+
+def allowed_customers(allowed_customer: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Customers a user may see (comma-separated allowed_customer), None for all."""
+    if not allowed_customer:
+        return None
+    return frozenset(c.strip() for c in allowed_customer.split(','))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _load_shipments(ids: List[int], columns: Iterable[str]) -> Dict[int, Dict[str, Any]]:
+    table = Shipment.__table__
+    db = BackgroundSessionLocal()
+    try:
+        rows = db.execute(select(table.c.id, *[table.c[col] for col in columns]).where(table.c.id.in_(ids)))
+        return {row.id: row._asdict() for row in rows}
+    finally:
+        db.close()
+
+
+def _encode_deltas(deltas: Dict[int, Dict[str, Any]]) -> Iterator[str]:
+    """Deltas as compact JSON arrays, split to fit in backplane messages."""
+    chunk, size = [], 2
+    for shipment_id, d in deltas.items():
+        item = [
+            shipment_id, d["op"],
+            sorted(d["fields"]) if d["fields"] is not None else None,
+            d.get("customer"), sorted(d.get("previous_customers", ())),
+        ]
+        item_size = len(json.dumps(item, separators=(",", ":")).encode()) + 1
+        if chunk and size + item_size > MAX_MESSAGE_BYTES - 16:
+            yield json.dumps(chunk, separators=(",", ":"))
+            chunk, size = [], 2
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        yield json.dumps(chunk, separators=(",", ":"))
+
+
+def _decode_deltas(payload: str) -> Dict[int, Dict[str, Any]]:
+    deltas = {}
+    for shipment_id, op, fields, customer, previous in json.loads(payload):
+        deltas[shipment_id] = {
+            "op": op,
+            "fields": frozenset(fields) if fields is not None else None,
+            "customer": customer,
+            "previous_customers": frozenset(previous),
+        }
+    return deltas
+
+
+def _encode_alerts(alerts: List[Dict[str, Any]]) -> Iterator[str]:
+    """Alerts as JSON lists, split to fit in backplane messages."""
+    chunk, size = [], 2
+    for alert in alerts:
+        item = json.dumps(alert, default=_json_default, separators=(",", ":"))
+        if chunk and size + len(item.encode()) + 1 > MAX_MESSAGE_BYTES - 16:
+            yield "[" + ",".join(chunk) + "]"
+            chunk, size = [], 2
+        chunk.append(item)
+        size += len(item.encode()) + 1
+    if chunk:
+        yield "[" + ",".join(chunk) + "]"
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, queue_size: int, allowed: Optional[FrozenSet[str]] = None):
+        self.websocket = websocket
+        self.allowed = allowed # None: every customer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, queue_size: int = LIVE_SEND_QUEUE_SIZE, send_timeout: float = LIVE_SEND_TIMEOUT_SECONDS,
+                 slow_consumer_policy: str = LIVE_SLOW_CONSUMER_POLICY, backplane=None):
+        self.backplane = backplane or create_backplane()
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.slow_consumer_policy = slow_consumer_policy
+        self.connections: Dict[WebSocket, _Connection] = {}
+        self._outgoing: Optional[asyncio.Queue] = None
+        self._fanout: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = False
+        self._deltas: Dict[int, Dict[str, Any]] = {}
+        self._delta_timer: Optional[asyncio.TimerHandle] = None
+        self.broadcasts = 0
+        self.delta_messages = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+
+    @property
+    def active_connections(self):
+        return list(self.connections)
+
+    async def start(self):
+        """Subscribe to the backplane (at startup, or on the first connection)."""
+        if self._started:
+            return
+        self._started = True
+        self._loop = asyncio.get_running_loop()
+        await self.backplane.start(self._on_backplane_message)
 
-    async def connect(self, websocket: WebSocket):
+    async def stop(self):
+        await self.backplane.stop()
+        self._started = False
+
+    async def connect(self, websocket: WebSocket, allowed: Optional[FrozenSet[str]] = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        await self.start()
+        conn = _Connection(websocket, self.queue_size, allowed)
+        conn.writer = asyncio.create_task(self._write(conn))
+        self.connections[websocket] = conn
+        self._ensure_fanout()
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        conn = self.connections.pop(websocket, None)
+        if conn and conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        """Queue `message` for every connection of every worker; returns without waiting for any send."""
+        self.backplane.publish("broadcast", message)
+
+    def publish_deltas(self, deltas: Dict[int, Dict[str, Any]]):
+        """
+        Queue shipment deltas ({id: {"op", "fields", ...}}, see _merge_delta)
+        for the next coalesced message of every worker. Safe to call from any thread.
+        """
+        for payload in _encode_deltas(deltas):
+            self.backplane.publish("deltas", payload)
+
+    def publish_alerts(self, alerts: List[Dict[str, Any]]):
+        """
+        Push new alerts (dicts with a "customer" key) to the clients allowed to
+        see that customer, on every worker. Safe to call from any thread.
+        """
+        for payload in _encode_alerts(alerts):
+            self.backplane.publish("alerts", payload)
+
+    def _on_backplane_message(self, kind: str, payload: str):
+        if not self.connections:
+            return
+        if kind == "broadcast":
+            self._ensure_fanout()
+            self._outgoing.put_nowait(payload)
+            self.broadcasts += 1
+        elif kind == "deltas":
+            self._add_deltas(_decode_deltas(payload))
+        elif kind == "alerts":
+            self._ensure_fanout()
+            self._outgoing.put_nowait(json.loads(payload))
+
+    def metrics(self) -> dict:
+        depths = [conn.queue.qsize() for conn in self.connections.values()]
+        return {
+            "connections": len(self.connections),
+            "pending_broadcasts": self._outgoing.qsize() if self._outgoing else 0,
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "broadcasts": self.broadcasts,
+            "delta_messages": self.delta_messages,
+            "pending_deltas": len(self._deltas),
+            "dropped_messages": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "send_errors": self.send_errors,
+        }
+
+    def _ensure_fanout(self):
+        if self._fanout is None or self._fanout.done():
+            self._outgoing = asyncio.Queue()
+            self._fanout = asyncio.create_task(self._fan_out())
+
+    async def _fan_out(self):
+        while True:
+            message = await self._outgoing.get()
+            if isinstance(message, dict):
+                try:
+                    await self._fan_out_deltas(message)
+                except Exception as e:
+                    logger.error(f"Live: failed to push shipment deltas: {e}")
+                continue
+            if isinstance(message, list):
+                self._fan_out_alerts(message)
+                continue
+            for conn in list(self.connections.values()):
+                self._enqueue(conn, message)
+            # Let the writers run before the next message of a burst
+            await asyncio.sleep(0)
+
+    def _add_deltas(self, deltas: Dict[int, Dict[str, Any]]):
+        for shipment_id, delta in deltas.items():
+            _merge_delta(self._deltas, shipment_id, delta)
+        if self._delta_timer is None:
+            self._delta_timer = self._loop.call_later(LIVE_DELTA_WINDOW_SECONDS, self._release_deltas)
+
+    def _release_deltas(self):
+        deltas, self._deltas, self._delta_timer = self._deltas, {}, None
+        if deltas and self.connections:
+            self._ensure_fanout()
+            self._outgoing.put_nowait(deltas)
+
+    async def _fan_out_deltas(self, deltas: Dict[int, Dict[str, Any]]):
+        ids = [shipment_id for shipment_id, d in deltas.items() if d["op"] != "deleted"]
+        columns = {"customer", "status"}
+        for shipment_id in ids:
+            columns.update(deltas[shipment_id]["fields"] or LIVE_DELTA_COLUMNS)
+        rows = await asyncio.to_thread(_load_shipments, ids, sorted(columns)) if ids else {}
+
+        # (payload, customer it belongs to, customers it belonged to before)
+        items = []
+        for shipment_id, delta in deltas.items():
+            row = rows.get(shipment_id)
+            if row is None:
+                items.append(({"id": shipment_id, "op": "deleted"}, delta.get("customer"), ()))
+                continue
+            fields = delta["fields"] or LIVE_DELTA_COLUMNS
+            payload = {
+                "id": shipment_id,
+                "op": delta["op"],
+                "status": row["status"],
+                "fields": {col: row[col] for col in fields},
+            }
+            items.append((payload, row["customer"], delta.get("previous_customers", ())))
+
+        for allowed, conns in self._connection_groups().items():
+            shipments = []
+            for payload, customer, previous in items:
+                if allowed is None or customer in allowed or (customer is None and payload["op"] == "deleted"):
+                    shipments.append(payload)
+                elif allowed.intersection(previous):
+                    # Moved to a customer this client can't see
+                    shipments.append({"id": payload["id"], "op": "deleted"})
+            if not shipments:
+                continue
+            message = json.dumps({"type": "shipments.delta", "shipments": shipments}, default=_json_default)
+            self.delta_messages += 1
+            for conn in conns:
+                self._enqueue(conn, message)
+
+    def _connection_groups(self) -> Dict[Optional[FrozenSet[str]], List[_Connection]]:
+        """Connections by allowed customers, to build each message once per group."""
+        groups: Dict[Optional[FrozenSet[str]], List[_Connection]] = {}
+        for conn in self.connections.values():
+            groups.setdefault(conn.allowed, []).append(conn)
+        return groups
+
+    def _fan_out_alerts(self, alerts: List[Dict[str, Any]]):
+        for allowed, conns in self._connection_groups().items():
+            visible = [a for a in alerts if allowed is None or a.get("customer") in allowed]
+            if not visible:
+                continue
+            message = json.dumps({"type": "alerts.created", "alerts": visible})
+            for conn in conns:
+                self._enqueue(conn, message)
+
+    def _enqueue(self, conn: _Connection, message: str):
+        try:
+            conn.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_consumer_policy == "drop_oldest":
+            conn.queue.get_nowait()
+            conn.queue.put_nowait(message)
+            conn.dropped += 1
+            self.dropped += 1
+        else:
+            self.slow_disconnects += 1
+            logger.warning(f"Live: closing slow websocket ({conn.queue.qsize()} messages queued)")
+            self._close(conn)
+
+    def _close(self, conn: _Connection):
+        self.disconnect(conn.websocket)
+        asyncio.create_task(self._close_socket(conn.websocket))
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket):
+        try:
+            await websocket.close(code=WS_TRY_AGAIN_LATER)
+        except Exception:
+            pass
+
+    async def _write(self, conn: _Connection):
+        while True:
+            message = await conn.queue.get()
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await conn.websocket.send_text(message)
+                conn.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.send_errors += 1
+                logger.info(f"Live: dropping websocket after failed send: {e!r}")
+                self._close(conn)
+                return
+
+
+def _merge_delta(deltas: Dict[int, Dict[str, Any]], shipment_id: int, delta: Dict[str, Any]):
+    """
+    Fold `delta` into the pending ones. A delta has "op" (created, updated,
+    deleted), "fields" (changed columns, None for LIVE_DELTA_COLUMNS) and
+    optionally "customer" (of a deleted shipment) and "previous_customers".
+    """
+    current = deltas.get(shipment_id)
+    if current is None or delta["op"] == "deleted":
+        deltas[shipment_id] = dict(delta)
+        return
+    if current["op"] == "deleted":
+        return
+    if current["fields"] is None or delta["fields"] is None:
+        current["fields"] = None
+    else:
+        current["fields"] = current["fields"] | delta["fields"]
+    if delta.get("previous_customers"):
+        current["previous_customers"] = frozenset(current.get("previous_customers", ())) | delta["previous_customers"]
+
 
 manager = ConnectionManager()
+
+
+# -------------------------------------------------------------------------
+# Session hooks
+# -------------------------------------------------------------------------
+
+_SESSION_KEY = "live_shipment_deltas"
+
+
+def _collect_shipment_deltas(session, flush_context):
+    """after_flush: what this flush changed on shipments, with the changed columns."""
+    deltas = session.info.setdefault(_SESSION_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, Shipment):
+            _merge_delta(deltas, obj.id, {"op": "created", "fields": None})
+    for obj in session.deleted:
+        if isinstance(obj, Shipment):
+            _merge_delta(deltas, obj.id, {"op": "deleted", "fields": None, "customer": obj.customer})
+    for obj in session.dirty:
+        if not isinstance(obj, Shipment) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        changed = frozenset(
+            attr.key for attr in state.mapper.column_attrs
+            if attr.key in _VISIBLE_COLUMNS and state.attrs[attr.key].history.has_changes()
+        )
+        if not changed:
+            continue
+        delta = {"op": "updated", "fields": changed}
+        if "customer" in changed:
+            delta["previous_customers"] = frozenset(c for c in state.attrs.customer.history.deleted if c)
+        _merge_delta(deltas, obj.id, delta)
+
+
+def _publish_after_commit(session):
+    deltas = session.info.pop(_SESSION_KEY, None)
+    if deltas:
+        manager.publish_deltas(deltas)
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def setup_live_deltas(session_factory=SessionLocal):
+    event.listen(session_factory, "after_flush", _collect_shipment_deltas)
+    event.listen(session_factory, "after_commit", _publish_after_commit)
+    event.listen(session_factory, "after_rollback", _discard_after_rollback)
@@ -0,0 +1,62 @@
+"""
+Relationship loading.
+
+Shipment.events, .alerts and .documents load lazily: touching one of them on
+every shipment of a list runs one query per shipment. Queries whose results
+use a relationship pass the matching loader options below, which load it for
+all the returned shipments in one more SELECT ... WHERE shipment_id IN (...).
+
+count_queries() counts the statements a block of code runs, to keep a read
+path's query count in check (see benchmark_query_counts.py).
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+
+from .database import async_engine, background_engine, engine
+from .models import Shipment
+
+# ShipmentSchema responses (events are serialized with the shipment)
+SHIPMENT_WITH_EVENTS = (selectinload(Shipment.events),)
+# Chatbot tracking answers: latest event and alerts
+SHIPMENT_TRACKING = (selectinload(Shipment.events), selectinload(Shipment.alerts))
+SHIPMENT_WITH_DOCUMENTS = (selectinload(Shipment.documents),)
+
+
+class QueryCounter:
+    """Statements run while counting."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(max_queries: Optional[int] = None) -> Iterator[QueryCounter]:
+    """
+    Count the statements run on the app's engines during the block, whatever
+    the thread (so run nothing else concurrently, e.g. the scheduler).
+    Raises AssertionError at the end of the block if more than `max_queries` ran.
+    """
+    counter = QueryCounter()
+    engines = (engine, background_engine, async_engine.sync_engine)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    for eng in engines:
+        event.listen(eng, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        for eng in engines:
+            event.remove(eng, "before_cursor_execute", before_cursor_execute)
+    if max_queries is not None and counter.count > max_queries:
+        raise AssertionError(
+            f"{counter.count} queries, expected at most {max_queries}:\n" + "\n".join(counter.statements)
+        )
@@ -1,13 +1,25 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base, SessionLocal
+from .database import engine, Base, SessionLocal, pool_metrics
 from .routers import auth, shipments, events, chatbot, reports, webhooks, sync, settings, auth_microsoft, webhook_settings, api_keys
 from .models import User
-from .auth import get_password_hash
+from .auth import get_password_hash, is_password_hash
 from .live import manager
-from .scheduler import start_scheduler
-from fastapi import WebSocket, WebSocketDisconnect
+from .security import get_user_from_token
+from .scheduler import start_scheduler, stop_scheduler
+from fastapi import WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import os
 from .observers import setup_observers
+from .services.api_key_usage import api_key_usage
+from .services.mirror_export import mirror_exporter
+from .services.webhook_dispatcher import webhook_dispatcher
+from .services.webhook_routing import webhook_routes
+from .services.webhook_outbox import outbox_relay
+
+# Set to reset the initial admin's password to the default on the next boot
+RESET_ADMIN_PASSWORD = os.getenv("RESET_ADMIN_PASSWORD", "false").lower() in ("1", "true", "yes")
 
 # Setup SQLAlchemy Event Listeners (Observers)
 setup_observers()
@@ -30,9 +42,23 @@ app.include_router(auth_microsoft.router)
 app.include_router(webhook_settings.router)
 app.include_router(api_keys.router)
 
+def _websocket_user(token: str):
+    db = SessionLocal()
+    try:
+        return get_user_from_token(token, db)
+    finally:
+        db.close()
+
 @app.websocket("/ws/shipments")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
+    # Browsers can't set headers on a websocket: the JWT comes as ?token=
+    # The user query (on a principal cache miss) runs off the event loop
+    user = await run_in_threadpool(_websocket_user, token) if token else None
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await manager.connect(websocket, user.allowed_customers)
     try:
         while True:
             await websocket.receive_text()
@@ -66,9 +92,9 @@ def startup_event():
             db.add(admin)
             db.commit()
             print("Admin user created: admin@example.com / ChangeMe123!")
-        else:
-            # Force password reset to ensure access
-            print("Ensuring admin password is valid...")
+        elif not is_password_hash(user.password_hash) or RESET_ADMIN_PASSWORD:
+            # Reset only an unusable hash (or on request): a valid one costs no KDF work at boot
+            print("Resetting admin password...")
             user.password_hash = get_password_hash("ChangeMe123!")
             db.commit()
             print("Admin user verified/updated: admin@example.com / ChangeMe123!")
@@ -82,9 +108,37 @@ def startup_event():
             import traceback
             traceback.print_exc()
         
+        # Webhook routes, so the first dispatch doesn't query them mid-flush
+        webhook_routes.load()
+        # Webhooks left undelivered by the previous run
+        outbox_relay.wake()
     finally:
         db.close()
 
+@app.on_event("startup")
+async def start_live_updates():
+    # Listen to the backplane (other workers' broadcasts) from startup
+    await manager.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Don't lose a debounced mirror export, queued webhooks or API key usage
+    mirror_exporter.flush()
+    webhook_dispatcher.flush(timeout=10)
+    api_key_usage.flush()
+    # Hand the scheduled jobs over to the other workers
+    stop_scheduler()
+
 @app.get("/health")
 def read_health():
     return {"status": "ok"}
+
+@app.get("/health/live")
+def read_live_metrics():
+    """Websocket connections and send queue depths."""
+    return manager.metrics()
+
+@app.get("/health/db")
+def read_pool_metrics():
+    """Connection pools (request / background): saturation and checkout waits."""
+    return pool_metrics()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Enum, JSON, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float, Enum, JSON, Text, Index, DDL, Sequence, and_, event, literal_column, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -216,6 +216,45 @@ class SystemSetting(Base):
     is_encrypted = Column(Boolean, default=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class SyncRowFingerprint(Base):
+    """
+    Content hash of the Master file rows at the last OneDrive sync, per (order, batch) key.
+    Lets the sync send only the rows that changed to the import.
+    """
+    __tablename__ = "sync_row_fingerprints"
+
+    source = Column(String, primary_key=True) # OneDrive file ID
+    row_key = Column(String, primary_key=True) # JSON [order_number, batch_number], trimmed like the import key
+    fingerprint = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SchedulerLease(Base):
+    """
+    Which app process runs a scheduled job. Every process schedules the jobs;
+    only the lease holder runs them, and another process takes over once the
+    lease expires.
+    """
+    __tablename__ = "scheduler_leases"
+
+    job = Column(String, primary_key=True)
+    owner = Column(String, nullable=False) # host:pid:nonce of the process
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+class JobRun(Base):
+    """
+    History of the scheduled job runs.
+    """
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job = Column(String, nullable=False, index=True)
+    owner = Column(String, nullable=False)
+    status = Column(String, nullable=False) # running, success, failed
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+
 class ApiLog(Base):
     """
     Log des appels API pour le debugging et la sécurité (Quietude).
@@ -237,6 +276,78 @@ class ApiLog(Base):
 Shipment.alerts = relationship("Alert", back_populates="shipment")
 Shipment.documents = relationship("Document", back_populates="shipment")
 
+# Natural key of a shipment in the Master file: (Order number, batch), whitespace-trimmed.
+# Unique so that the Excel import can upsert with INSERT ... ON CONFLICT.
+# Rows without order number (manual shipments) are not part of the key.
+IMPORT_KEY_TRIM_CHARS = " \t\r\n\x0b\x0c\xa0"
+_trim_chars = literal_column("'" + IMPORT_KEY_TRIM_CHARS + "'")
+
+shipment_import_key_index = Index(
+    "ux_shipments_order_batch",
+    func.trim(Shipment.order_number, _trim_chars),
+    func.trim(Shipment.batch_number, _trim_chars),
+    unique=True,
+    postgresql_where=and_(Shipment.order_number.isnot(None), Shipment.order_number != literal_column("''")),
+    postgresql_nulls_not_distinct=True,
+)
+
+# SLA monitor (services/sla_monitor.py): shipments not delivered yet, by ETA,
+# and the active DELAY alert of a shipment
+open_shipment_eta_index = Index(
+    "ix_shipments_open_planned_eta",
+    Shipment.planned_eta,
+    postgresql_where=Shipment.status != "FINAL_DELIVERY",
+)
+
+active_delay_alert_index = Index(
+    "ix_alerts_active_delay",
+    Alert.shipment_id,
+    postgresql_where=and_(Alert.type == "DELAY", Alert.active == True),
+)
+
+# Keyset pagination of /shipments/list (services/shipment_listing.py)
+shipment_list_indexes = (
+    Index("ix_shipments_planned_eta_id", Shipment.planned_eta, Shipment.id),
+    Index("ix_shipments_planned_etd_id", Shipment.planned_etd, Shipment.id),
+    Index("ix_shipments_created_at_id", Shipment.created_at, Shipment.id),
+)
+
+# Hot query patterns of the chatbot SQL templates (see explain_chatbot_queries.py).
+# ILIKE '%X%' can only use a trigram index (pg_trgm); every branch of an
+# "a ILIKE .. OR b ILIKE .." needs one, or the whole condition is a sequential scan.
+SHIPMENT_TRIGRAM_COLUMNS = ("reference", "customer", "sku", "batch_number", "container_number", "vessel", "supplier")
+
+def trigram_available(ddl=None, target=None, bind=None, **kw) -> bool:
+    """pg_trgm can be installed (it ships with contrib, missing from some PostgreSQL builds)."""
+    if bind is None or bind.dialect.name != "postgresql":
+        return False
+    return bind.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is not None
+
+shipment_trigram_indexes = tuple(
+    Index(
+        f"ix_shipments_{name}_trgm",
+        Shipment.__table__.c[name],
+        postgresql_using="gin",
+        postgresql_ops={name: "gin_trgm_ops"},
+    ).ddl_if(callable_=trigram_available)
+    for name in SHIPMENT_TRIGRAM_COLUMNS
+)
+
+query_indexes = (
+    # Events of a shipment, latest first (also the relationship's order)
+    Index("ix_events_shipment_timestamp", Event.shipment_id, Event.timestamp),
+    Index("ix_events_type_timestamp", Event.type, Event.timestamp),
+    Index("ix_alerts_shipment_id", Alert.shipment_id),
+    Index("ix_alerts_active_type_severity", Alert.type, Alert.severity, postgresql_where=Alert.active == True),
+    Index("ix_documents_shipment_id", Document.shipment_id),
+)
+
+# create_all builds the trigram indexes along with the shipments table (skipped without pg_trgm)
+event.listen(
+    Shipment.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(callable_=trigram_available)
+)
+
 class WebhookSubscription(Base):
     """
     To register external services that want to be notified of events.
@@ -252,6 +363,19 @@ class WebhookSubscription(Base):
     last_triggered_at = Column(DateTime(timezone=True), nullable=True)
     failure_count = Column(Integer, default=0)
 
+class WebhookOutbox(Base):
+    """
+    Webhooks to send, written in the same transaction as the row they announce.
+    Drained after commit by the outbox relay; a row is deleted once delivered.
+    """
+    __tablename__ = "webhook_outbox"
+
+    id = Column(BigInteger, primary_key=True) # Sequence number sent with the webhook
+    topic = Column(String, nullable=False) # event.created, shipment.created
+    entity_id = Column(Integer, nullable=False) # Event or Shipment ID
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True) # Claimed by a relay until then
+
 class ApiKey(Base):
     """
     To allow external applications to access the API securely.
@@ -268,5 +392,36 @@ class ApiKey(Base):
     last_used_at = Column(DateTime(timezone=True), nullable=True)
     created_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+class ChatbotCacheEntry(Base):
+    """
+    Chatbot answers shared by the app processes (services/chatbot/cache.py).
+    UNLOGGED: writes skip the WAL, and the table is emptied after a crash and
+    not replicated, which a cache can afford.
+    """
+    __tablename__ = "chatbot_cache"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
 
+    key = Column(String, primary_key=True) # sha256 of scope, data version and normalized question
+    scope = Column(String, nullable=False) # Customer filter of the answer ("" for all customers)
+    data_version = Column(BigInteger, nullable=False, index=True)
+    question = Column(Text, nullable=False) # Normalized
+    response = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
+class ChatbotSqlCacheEntry(Base):
+    """
+    SQL generated by the chatbot for a question, shared by the app processes
+    (services/chatbot/cache.py). UNLOGGED like chatbot_cache.
+    """
+    __tablename__ = "chatbot_sql_cache"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String, primary_key=True) # sha256 of scope and normalized question
+    scope = Column(String, nullable=False) # Customer filter and fingerprint of the SQL prompt
+    question = Column(Text, nullable=False) # Normalized
+    sql = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+# Bumped whenever data the chatbot answers from changes: answers cached under a
+# previous value are no longer looked up
+chatbot_data_version = Sequence("chatbot_data_version", metadata=Base.metadata)
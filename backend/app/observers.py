@@ -1,133 +1,49 @@
-from sqlalchemy import event
-from .models import Shipment, Event, WebhookSubscription
-from .database import SessionLocal
-import pandas as pd
-import os
+from .services.mirror_export import mirror_exporter, setup_mirror_export
+from .services.webhook_outbox import setup_webhook_outbox
+from .live import manager, setup_live_deltas
+from .security import setup_principal_invalidation
+from .services.chatbot.cache import chatbot_cache, setup_chatbot_cache_invalidation
+from .database import AsyncBackedSession, SessionLocal
 import logging
-import httpx
-import json
-import threading
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-EXPORT_PATH = os.path.join(os.getcwd(), "shipments_mirror.csv")
-
 # -------------------------------------------------------------------------
-# Webhook Dispatcher Logic
+# Bulk Imports
 # -------------------------------------------------------------------------
 
-def send_webhook(url, payload, secret=None):
+def notify_bulk_import(changed_ids=(), created_ids=()):
     """
-    Sends a webhook payload to the specified URL in a separate thread (fire-and-forget).
+    Bulk imports write with Core statements, which the session's flush hooks
+    don't see: export the shipments in `changed_ids` to the mirror CSV and
+    push them to the live dashboards (`created_ids` as new rows), and drop the
+    chatbot answers computed before them.
+    Their shipment.created webhooks go through record_outbox() in the import
+    transaction.
     """
-    def _send():
-        try:
-            headers = {"Content-Type": "application/json", "User-Agent": "BBOXL-Webhook/1.0"}
-            if secret:
-                headers["X-Hub-Signature"] = secret # simplistic signature
-            
-            # Using httpx for requests
-            response = httpx.post(url, json=payload, headers=headers, timeout=5.0)
-            logger.info(f"Webhook sent to {url} | Status: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Webhook failed for {url}: {e}")
-
-    thread = threading.Thread(target=_send)
-    thread.start()
+    if changed_ids:
+        mirror_exporter.schedule(changed_ids)
+        created = set(created_ids)
+        manager.publish_deltas({
+            shipment_id: {"op": "created" if shipment_id in created else "updated", "fields": None}
+            for shipment_id in changed_ids
+        })
+        chatbot_cache.invalidate()
 
+def setup_observers():
+    # Sync sessions (and background ones), and the sessions behind AsyncSessionLocal
+    for session_factory in (SessionLocal, AsyncBackedSession):
+        # CSV Mirror: one export per committed transaction
+        setup_mirror_export(session_factory)
 
-def dispatch_event_webhooks(mapper, connection, target):
-    """
-    Triggered when a new Event is inserted.
-    """
-    try:
-        # We need to query subscriptions. Using a new session is safest.
-        session = SessionLocal()
-        try:
-            # Get all active subscriptions
-            subs = session.query(WebhookSubscription).filter(WebhookSubscription.is_active == True).all()
-            
-            event_type = target.type
-            payload = {
-                "event": "event.created",
-                "type": event_type,
-                "shipment_id": target.shipment_id,
-                "timestamp": target.timestamp.isoformat() if target.timestamp else datetime.now().isoformat(),
-                "data": target.payload
-            }
-            
-            for sub in subs:
-                # Check if subscription wants this event
-                # We assume sub.events is a list of strings
-                if event_type in sub.events or "*" in sub.events:
-                    send_webhook(sub.url, payload, sub.secret)
-                    
-        finally:
-            session.close()
-    except Exception as e:
-        logger.error(f"Error dispatching event webhooks: {e}")
-
-def dispatch_shipment_created_webhook(mapper, connection, target):
-    """
-    Triggered when a new Shipment is inserted.
-    """
-    try:
-        session = SessionLocal()
-        try:
-            subs = session.query(WebhookSubscription).filter(WebhookSubscription.is_active == True).all()
-            
-            payload = {
-                "event": "shipment.created",
-                "shipment_id": target.id,
-                "reference": target.reference,
-                "timestamp": target.created_at.isoformat() if target.created_at else datetime.now().isoformat()
-            }
-            
-            for sub in subs:
-                if "shipment.created" in sub.events or "*" in sub.events:
-                    send_webhook(sub.url, payload, sub.secret)
-        finally:
-            session.close()
-    except Exception as e:
-        logger.error(f"Error dispatching shipment webhooks: {e}")
-
+        # Webhooks: outbox rows written on flush, relayed after commit
+        setup_webhook_outbox(session_factory)
 
-# -------------------------------------------------------------------------
-# CSV Export Logic
-# -------------------------------------------------------------------------
+        # Live dashboards: shipment deltas pushed after commit
+        setup_live_deltas(session_factory)
 
-def export_shipments_to_csv_simulation(mapper, connection, target):
-    """
-    Observer function triggered after a Shipment is updated or inserted.
-    It dumps the current state of the shipments table to a CSV file,
-    simulating a write-back to the Master File.
-    """
-    try:
-        logger.info(f"Observer: Shipment {target.reference} changed. Regenerating mirror CSV...")
-        
-        session = SessionLocal()
-        try:
-            query = session.query(Shipment)
-            df = pd.read_sql(query.statement, session.bind)
-            
-            # Save to CSV
-            df.to_csv(EXPORT_PATH, index=False, encoding='utf-8-sig')
-            logger.info(f"Observer: Mirror CSV saved to {EXPORT_PATH}")
-            
-        except Exception as e:
-            logger.error(f"Observer Error: {e}")
-        finally:
-            session.close()
-            
-    except Exception as e:
-        logger.error(f"Observer Safety Catch: {e}")
+        # Authentication: cached users dropped once a change to them commits
+        setup_principal_invalidation(session_factory)
 
-def setup_observers():
-    # CSV Mirror
-    event.listen(Shipment, 'after_update', export_shipments_to_csv_simulation)
-    event.listen(Shipment, 'after_insert', export_shipments_to_csv_simulation)
-    
-    # Webhooks
-    event.listen(Event, 'after_insert', dispatch_event_webhooks)
-    event.listen(Shipment, 'after_insert', dispatch_shipment_created_webhook)
+        # Chatbot: cached answers outdated once a change to their data commits
+        setup_chatbot_cache_invalidation(session_factory)
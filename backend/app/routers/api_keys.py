@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import ApiKey, User
-from ..security import get_current_user
-from ..auth import get_password_hash # We can use this for hashing keys too
+from ..security import API_KEY_SCOPES, get_current_user
+from ..auth import hash_api_key
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -25,6 +25,7 @@ class ApiKeyResponse(BaseModel):
     created_at: datetime
     last_used_at: Optional[datetime]
     is_active: bool
+    scopes: List[str] = []
 
     class Config:
         orm_mode = True
@@ -32,6 +33,13 @@ class ApiKeyResponse(BaseModel):
 class ApiKeyCreatedResponse(ApiKeyResponse):
     key: str # The full key, returned only on creation
 
+@router.get("/scopes", response_model=List[str])
+def get_api_key_scopes(current_user: User = Depends(get_current_user)):
+    """Scopes a key can be granted"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return list(API_KEY_SCOPES)
+
 @router.get("/", response_model=List[ApiKeyResponse])
 def get_api_keys(
     current_user: User = Depends(get_current_user),
@@ -51,7 +59,8 @@ def get_api_keys(
             prefix=k.key_prefix,
             created_at=k.created_at,
             last_used_at=k.last_used_at,
-            is_active=k.is_active
+            is_active=k.is_active,
+            scopes=k.scopes or []
         ) for k in keys
     ]
 
@@ -63,11 +72,22 @@ def create_api_key(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
+
+    if not key_data.scopes:
+        # Every route open to API keys requires a scope
+        raise HTTPException(status_code=400, detail=f"At least one scope is required. Available: {', '.join(API_KEY_SCOPES)}")
+    unknown = set(key_data.scopes) - set(API_KEY_SCOPES)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown scopes: {', '.join(sorted(unknown))}. Available: {', '.join(API_KEY_SCOPES)}"
+        )
     
     # Generate Key
     raw_key = f"pk_live_{secrets.token_urlsafe(32)}"
     prefix = raw_key[:12] # pk_live_xxxx
-    hashed_key = get_password_hash(raw_key)
+    # Deterministic digest, so a presented key is found by the key_hash index
+    hashed_key = hash_api_key(raw_key)
     
     new_key = ApiKey(
         name=key_data.name,
@@ -88,6 +108,7 @@ def create_api_key(
         created_at=new_key.created_at,
         last_used_at=new_key.last_used_at,
         is_active=new_key.is_active,
+        scopes=new_key.scopes or [],
         key=raw_key
     )
 
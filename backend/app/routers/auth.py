@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import timedelta
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..models import User
 from ..schemas import Token, UserCreate, User as UserSchema
-from ..auth import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..auth import verify_password_async, get_password_hash_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from ..security import get_current_user, require_admin
 
 router = APIRouter(
@@ -15,14 +17,20 @@ router = APIRouter(
 )
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # The password is checked on the hashing pool: a burst of logins doesn't block the event loop
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalars().first()
+    valid, new_hash = await verify_password_async(form_data.password, user.password_hash) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Rehash with the configured parameters, now that the password is known
+        user.password_hash = new_hash
+        await db.commit()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email, "role": user.role},
@@ -31,18 +39,18 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=UserSchema)
-def register_user(user: UserCreate, db: Session = Depends(get_db), current_user: User = Depends(require_admin)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(require_admin)):
     # Admin-only: require_admin dependency handles authorization
 
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(email=user.email, password_hash=hashed_password, role=user.role, name=user.name)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.get("/users", response_model=List[UserSchema])
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..models import Event, Shipment, User
 from ..schemas import Event as EventSchema, EventCreate
-from ..security import get_current_user, require_ops_or_admin, require_any
-from ..live import manager
+from ..security import require_events_reader, require_events_writer
 import os
 
 router = APIRouter(
@@ -13,22 +13,15 @@ router = APIRouter(
     tags=["events"]
 )
 
-API_KEY = "dev"
-
-def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != API_KEY:
-        raise HTTPException(status_code=400, detail="Invalid API Key")
-    return x_api_key
-
 @router.post("/", response_model=EventSchema)
 async def create_event(
     event: EventCreate, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(require_ops_or_admin)
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: User = Depends(require_events_writer)
 ):
-    """Create event - Requires 'ops' or 'admin' role"""
+    """Create event - Requires 'ops' or 'admin' role, or an API key with write:events"""
     # Check if shipment exists
-    shipment = db.query(Shipment).filter(Shipment.id == event.shipment_id).first()
+    shipment = await db.get(Shipment, event.shipment_id)
     if not shipment:
         raise HTTPException(status_code=404, detail="Shipment not found")
 
@@ -70,24 +63,21 @@ async def create_event(
                 shipment.vessel = p["vessel_name"]
             # voyage_ref could also be stored if there was a column, currently maybe just in event note?
 
-    db.commit()
-    db.refresh(db_event)
-    
-    # Broadcast update
-    await manager.broadcast(f"event_created")
+    await db.commit()
+    await db.refresh(db_event)
+    # Dashboards get the shipment delta from the commit hook
     
     return db_event
 
 @router.get("/shipments/{shipment_id}", response_model=List[EventSchema])
-def read_shipment_events(shipment_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_any)):
-    """Read events - All authenticated users"""
+def read_shipment_events(shipment_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_events_reader)):
+    """Read events - All authenticated users, or an API key with read:events"""
     shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
     if not shipment:
         return []
         
-    if current_user.allowed_customer:
-        allowed = [c.strip() for c in current_user.allowed_customer.split(',')]
-        if shipment.customer not in allowed:
+    if current_user.allowed_customers is not None:
+        if shipment.customer not in current_user.allowed_customers:
             raise HTTPException(status_code=403, detail="Not authorized to view this shipment's events")
 
     events = db.query(Event).filter(Event.shipment_id == shipment_id).order_by(Event.timestamp.desc()).all()
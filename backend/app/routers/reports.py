@@ -17,8 +17,8 @@ def export_shipments(db: Session = Depends(get_db), current_user: User = Depends
     """Export shipments - Requires 'ops' or 'admin' role"""
     query = db.query(Shipment)
     
-    if current_user.allowed_customer:
-        query = query.filter(Shipment.customer == current_user.allowed_customer)
+    if current_user.allowed_customers is not None:
+        query = query.filter(Shipment.customer.in_(current_user.allowed_customers))
         
     shipments = query.all()
     
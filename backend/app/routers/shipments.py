@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List, Optional
 from ..database import get_db
+from ..loading import SHIPMENT_WITH_EVENTS
 from ..models import Shipment, User
-from ..schemas import Shipment as ShipmentSchema, ShipmentCreate, ImportMode, ImportPreviewResult, ImportResult, ImportPreviewRow
-from ..security import get_current_user, require_ops_or_admin, require_any
-from ..services.excel_import import parse_excel, validate_and_preview, execute_import
+from ..schemas import Shipment as ShipmentSchema, ShipmentCreate, ShipmentPage, ShipmentStats, ImportMode, ImportPreviewResult, ImportResult, ImportPreviewRow
+from ..security import require_ops_or_admin, require_shipments_reader
+from ..services.excel_import import preview_excel_stream, import_excel_stream
+from ..services.shipment_listing import DEFAULT_LIMIT, MAX_LIMIT, list_shipments, shipment_stats
 import os
 
 router = APIRouter(
@@ -13,14 +16,6 @@ router = APIRouter(
     tags=["shipments"]
 )
 
-API_KEY_NAME = "X-API-Key"
-API_KEY = "dev"
-
-def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != API_KEY:
-        raise HTTPException(status_code=400, detail="Invalid API Key")
-    return x_api_key
-
 @router.post("/", response_model=ShipmentSchema)
 def create_shipment(
     shipment: ShipmentCreate, 
@@ -35,25 +30,58 @@ def create_shipment(
     return db_shipment
 
 @router.get("/", response_model=List[ShipmentSchema])
-def read_shipments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(require_any)):
-    """Read shipments - All authenticated users (client, ops, admin)"""
-    query = db.query(Shipment)
+def read_shipments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(require_shipments_reader)):
+    """Read shipments - All authenticated users (client, ops, admin), or an API key with read:shipments"""
+    query = db.query(Shipment).options(*SHIPMENT_WITH_EVENTS)
     
-    if current_user.allowed_customer:
-        # Support comma-separated list of allowed customers
-        allowed = [c.strip() for c in current_user.allowed_customer.split(',')]
-        query = query.filter(Shipment.customer.in_(allowed))
+    if current_user.allowed_customers is not None:
+        query = query.filter(Shipment.customer.in_(current_user.allowed_customers))
         
     shipments = query.offset(skip).limit(limit).all()
     return shipments
 
+@router.get("/list", response_model=ShipmentPage, response_model_exclude_unset=True)
+def read_shipment_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    sort: str = "planned_eta",
+    direction: str = "asc",
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (id is always included)"),
+    status: Optional[List[str]] = Query(None),
+    customer: Optional[List[str]] = Query(None),
+    mode: Optional[List[str]] = Query(None, description="Transport mode"),
+    eta_from: Optional[datetime] = None,
+    eta_to: Optional[datetime] = None,
+    rush: Optional[bool] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_shipments_reader)
+):
+    """
+    Page of shipments (without events) - All authenticated users.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
+    """
+    try:
+        items, next_cursor = list_shipments(
+            db, current_user.allowed_customers,
+            sort=sort, direction=direction, limit=limit, cursor=cursor,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            status=status, customer=customer, mode=mode, eta_from=eta_from, eta_to=eta_to, rush=rush
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+@router.get("/stats", response_model=ShipmentStats)
+def read_shipment_stats(db: Session = Depends(get_db), current_user: User = Depends(require_shipments_reader)):
+    """Dashboard counters - All authenticated users"""
+    return shipment_stats(db, current_user.allowed_customers)
+
 @router.get("/{shipment_id}", response_model=ShipmentSchema)
-def read_shipment(shipment_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(Shipment).filter(Shipment.id == shipment_id)
+def read_shipment(shipment_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_shipments_reader)):
+    query = db.query(Shipment).options(*SHIPMENT_WITH_EVENTS).filter(Shipment.id == shipment_id)
     
-    if current_user.allowed_customer:
-        allowed = [c.strip() for c in current_user.allowed_customer.split(',')]
-        query = query.filter(Shipment.customer.in_(allowed))
+    if current_user.allowed_customers is not None:
+        query = query.filter(Shipment.customer.in_(current_user.allowed_customers))
         
     shipment = query.first()
     if shipment is None:
@@ -64,7 +92,7 @@ def read_shipment(shipment_id: int, db: Session = Depends(get_db), current_user:
 # --- Excel Import Endpoints ---
 
 @router.post("/import/preview", response_model=ImportPreviewResult)
-async def preview_import(
+def preview_import(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_ops_or_admin)
@@ -82,9 +110,8 @@ async def preview_import(
         )
     
     try:
-        content = await file.read()
-        parsed_rows, columns = parse_excel(content)
-        preview_rows = validate_and_preview(parsed_rows, db)
+        # The upload is read from its spooled temp file, sheet rows are streamed
+        preview_rows, columns = preview_excel_stream(file.file, db)
         
         # Count statuses
         new_count = sum(1 for r in preview_rows if r['status'] == 'new')
@@ -106,7 +133,7 @@ async def preview_import(
 
 
 @router.post("/import", response_model=ImportResult)
-async def import_excel(
+def import_excel(
     file: UploadFile = File(...),
     mode: ImportMode = Form(default=ImportMode.UPDATE_OR_CREATE),
     db: Session = Depends(get_db),
@@ -128,9 +155,8 @@ async def import_excel(
         )
     
     try:
-        content = await file.read()
-        parsed_rows, _ = parse_excel(content)
-        result = execute_import(parsed_rows, mode, db)
+        # Rows are streamed from the upload and committed chunk by chunk
+        result = import_excel_stream(file.file, mode, db)
         
         return ImportResult(
             created=result['created'],
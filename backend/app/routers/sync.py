@@ -12,13 +12,15 @@ router = APIRouter(
 )
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..services.onedrive_client import OneDriveClient
-from ..services.excel_import import parse_excel, execute_import, ImportMode
+from fastapi.concurrency import run_in_threadpool
+from ..services.sync_jobs import sync_queue
 from ..models import SystemSetting
-from ..schemas import OneDriveFile, SyncConfig, SyncResult, ImportResultError
+from ..schemas import OneDriveFile, SyncConfig, SyncResult, SyncJobStatus, ImportResultError
 from ..security import get_current_user, require_ops_or_admin
 import json
 from datetime import datetime
@@ -81,45 +83,56 @@ def get_sync_config(
 
 @router.post("/onedrive/run", response_model=SyncResult)
 async def run_onedrive_sync(
-    db: Session = Depends(get_db),
+    full: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_ops_or_admin)
 ):
-    """Manually trigger sync from configured OneDrive file"""
-    file_id_setting = db.query(SystemSetting).filter(SystemSetting.key == "ONEDRIVE_FILE_ID").first()
+    """
+    Manually trigger sync from configured OneDrive file.
+    Only rows changed since the last sync are imported, unless `full` is set.
+    Runs on the sync job queue (after any sync of the file in progress).
+    """
+    file_id_setting = await db.get(SystemSetting, "ONEDRIVE_FILE_ID")
     if not file_id_setting or not file_id_setting.value:
         raise HTTPException(status_code=400, detail="No sync file configured")
         
     file_id = json.loads(file_id_setting.value)
+    # Don't hold a connection while the sync runs
+    await db.close()
     
-    client = OneDriveClient(db)
-    try:
-        # Download
-        content = await client.download_file(file_id)
-        
-        # Parse & Import
-        parsed_rows, _ = parse_excel(content)
-        result = execute_import(parsed_rows, ImportMode.UPDATE_OR_CREATE, db)
-        
-        # Update last run
-        s = db.query(SystemSetting).filter(SystemSetting.key == "SYNC_LAST_RUN").first()
-        now_str = datetime.now().isoformat()
-        if not s:
-            s = SystemSetting(key="SYNC_LAST_RUN", value=json.dumps(now_str), is_encrypted=True)
-            db.add(s)
-        else:
-            s.value = json.dumps(now_str)
-        db.commit()
-        
-        return SyncResult(
-            created=result['created'],
-            updated=result['updated'],
-            skipped=result['skipped'],
-            errors=[ImportResultError(row=e['row'], reference=e['reference'], error=e['error']) for e in result['errors']],
-            total_processed=result['total_processed']
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
+    job = sync_queue.enqueue(file_id, trigger="manual", full=full)
+    await run_in_threadpool(job.wait)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Sync failed: {job.error}")
+    
+    result = job.result
+    return SyncResult(
+        created=result['created'],
+        updated=result['updated'],
+        skipped=result['skipped'],
+        errors=[ImportResultError(row=e['row'], reference=e['reference'], error=e['error']) for e in result['errors']],
+        total_processed=result['total_processed'],
+        unchanged=result['unchanged'],
+        file_unchanged=result['file_unchanged']
+    )
+
+@router.get("/onedrive/jobs", response_model=List[SyncJobStatus])
+def list_sync_jobs(
+    current_user = Depends(require_ops_or_admin)
+):
+    """Queued, running and recent sync jobs (webhook and manual)"""
+    return [job.to_dict() for job in sync_queue.jobs()]
+
+@router.get("/onedrive/jobs/{job_id}", response_model=SyncJobStatus)
+def get_sync_job(
+    job_id: str,
+    current_user = Depends(require_ops_or_admin)
+):
+    """Status of a sync job"""
+    job = sync_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @router.post("/onedrive/subscribe")
 async def toggle_realtime(
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import WebhookSubscription, EventType, User
 from ..security import get_current_user
+from ..services.webhook_routing import webhook_routes
 from pydantic import BaseModel, HttpUrl
 from typing import List, Optional
 from datetime import datetime
@@ -64,6 +65,7 @@ def create_webhook(
     )
     db.add(new_hook)
     db.commit()
+    webhook_routes.invalidate()
     db.refresh(new_hook)
     return new_hook
 
@@ -89,6 +91,7 @@ def update_webhook(
         db_hook.is_active = webhook.is_active
         
     db.commit()
+    webhook_routes.invalidate()
     db.refresh(db_hook)
     return db_hook
 
@@ -107,4 +110,5 @@ def delete_webhook(
         
     db.delete(db_hook)
     db.commit()
+    webhook_routes.invalidate()
     return {"status": "deleted"}
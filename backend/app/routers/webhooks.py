@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..models import Shipment, Event
-from ..live import manager
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/webhooks",
@@ -11,7 +14,7 @@ router = APIRouter(
 )
 
 @router.post("/carrier")
-async def carrier_webhook(request: Request, db: Session = Depends(get_db)):
+async def carrier_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Simulated Carrier Webhook.
     Payload: { "ref": "REF001", "status": "TRANSIT_OCEAN", "location": "Pacific" }
@@ -28,7 +31,7 @@ async def carrier_webhook(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Missing ref or status")
 
     # Find Shipment
-    shipment = db.query(Shipment).filter(Shipment.reference == ref).first()
+    shipment = await db.scalar(select(Shipment).where(Shipment.reference == ref))
     if not shipment:
         return {"status": "ignored", "reason": "Shipment not found"}
 
@@ -43,24 +46,18 @@ async def carrier_webhook(request: Request, db: Session = Depends(get_db)):
         note=f"Update via Carrier Webhook. Location: {payload.get('location', 'Unknown')}"
     )
     db.add(event)
-    db.commit()
-    db.refresh(event)
-
-    # Broadcast
-    await manager.broadcast("event_created")
-
-    db.refresh(event)
-
-    # Broadcast
-    await manager.broadcast("event_created")
+    await db.commit()
+    # Dashboards get the shipment delta from the commit hook
 
     return {"status": "processed", "shipment": ref, "new_status": status}
 
-@router.post("/onedrive")
-async def onedrive_webhook(request: Request, db: Session = Depends(get_db)):
+@router.post("/onedrive", status_code=202)
+async def onedrive_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Handle OneDrive/Graph API Notifications.
     Url: /api/webhooks/onedrive
+    
+    The sync itself runs on the sync job queue; Graph gets its 202 right away.
     """
     # 1. Validation Token Handshake (GET/POST?)
     # Graph API sends validationToken in query string for validation
@@ -77,18 +74,24 @@ async def onedrive_webhook(request: Request, db: Session = Depends(get_db)):
         return {"status": "ignored", "reason": "No JSON"}
 
     values = payload.get("value", [])
-    processed = 0
     
     from ..models import SystemSetting
+    from ..services.sync_jobs import sync_queue
     import json
     
     # Check if subscription matches ours
-    sub_id_setting = db.query(SystemSetting).filter(SystemSetting.key == "ONEDRIVE_SUBSCRIPTION_ID").first()
+    sub_id_setting = await db.get(SystemSetting, "ONEDRIVE_SUBSCRIPTION_ID")
     my_sub_id = json.loads(sub_id_setting.value) if sub_id_setting and sub_id_setting.value else None
     
     if not my_sub_id:
          return {"status": "ignored", "reason": "No active subscription locally"}
 
+    file_id_setting = await db.get(SystemSetting, "ONEDRIVE_FILE_ID")
+    file_id = json.loads(file_id_setting.value) if file_id_setting and file_id_setting.value else None
+    if not file_id:
+        return {"status": "ignored", "reason": "No sync file configured"}
+
+    jobs = {}
     for notification in values:
         if notification.get("subscriptionId") == my_sub_id:
             # Check client state
@@ -96,27 +99,8 @@ async def onedrive_webhook(request: Request, db: Session = Depends(get_db)):
                 logger.warning("OneDrive Webhook: Invalid client state")
                 continue
                 
-            # Trigger Sync in Background
-            # Access resource = notification['resource'] (e.g., "me/drive/items/...")
-            logger.info("Triggering OneDrive Sync from Webhook")
-            
-            from ..services.onedrive_client import OneDriveClient
-            from ..services.excel_import import parse_excel, execute_import, ImportMode
-            
-            # We reuse the logic from sync.py roughly
-            # Ideally this should be a shared task
-            try:
-                # Get file ID from config
-                file_id_setting = db.query(SystemSetting).filter(SystemSetting.key == "ONEDRIVE_FILE_ID").first()
-                if file_id_setting:
-                    file_id = json.loads(file_id_setting.value)
-                    client = OneDriveClient(db)
-                    content = await client.download_file(file_id)
-                    parsed_rows, _ = parse_excel(content)
-                    res = execute_import(parsed_rows, ImportMode.UPDATE_OR_CREATE, db)
-                    logger.info(f"Auto-Sync Result: {res}")
-                    processed += 1
-            except Exception as e:
-                logger.error(f"Auto-Sync Failed: {e}")
+            # Queue the sync (notifications for the same file are merged into one job)
+            job = sync_queue.enqueue(file_id, trigger="webhook")
+            jobs[job.id] = job.status
 
-    return {"status": "processed", "count": processed}
+    return {"status": "accepted", "count": len(jobs), "jobs": list(jobs)}
@@ -1,53 +1,158 @@
+"""
+Background jobs.
+
+Every app process starts the scheduler, but each run of a job first takes the
+job's row in scheduler_leases: the process that holds it (or finds it expired)
+runs the job and extends the lease by the job's interval plus
+SCHEDULER_LEASE_GRACE_SECONDS, the others skip that run. If the leader dies,
+its lease expires and the next process to tick takes the job over. Leases
+are released on shutdown so a restart hands over at once. Every run is
+recorded in job_runs, kept SCHEDULER_HISTORY_DAYS.
+"""
+import os
+import socket
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .models import Shipment
-from datetime import datetime, timezone
+from .database import BackgroundSessionLocal
+from .models import JobRun, SchedulerLease
+from .services.sla_monitor import detect_sla_violations
+
+SCHEDULER_LEASE_GRACE_SECONDS = float(os.getenv("SCHEDULER_LEASE_GRACE_SECONDS", "30"))
+SCHEDULER_HISTORY_DAYS = int(os.getenv("SCHEDULER_HISTORY_DAYS", "30"))
+
+# Identifies this process in scheduler_leases and job_runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+scheduler: Optional[BackgroundScheduler] = None
+
 
 def check_sla_violations():
     """
-    Periodic job to check for shipments past their ETA.
+    Periodic job raising DELAY alerts for the shipments that passed their ETA since the last run.
     """
-    db = SessionLocal()
+    db = BackgroundSessionLocal()
     try:
-        now = datetime.now(timezone.utc)
-        late_shipments = db.query(Shipment).filter(
-            Shipment.planned_eta < now,
-            Shipment.status != "FINAL_DELIVERY"
-        ).all()
-        
-        if late_shipments:
-            print(f"[ALERT] Found {len(late_shipments)} late shipments!")
-            for s in late_shipments:
-                print(f" - Shipment {s.reference} is late. ETA was {s.planned_eta}")
+        alerts = detect_sla_violations(db)
+
+        if alerts:
+            print(f"[ALERT] {len(alerts)} new late shipments!")
+            for a in alerts:
+                print(f" - Shipment {a['reference']} is late. ETA was {a['planned_eta']}")
         else:
-            print("[INFO] No SLA violations found.")
-            
+            print("[INFO] No new SLA violations found.")
+
     except Exception as e:
         print(f"Error in scheduler: {e}")
+        raise
     finally:
         db.close()
 
+def acquire_lease(db: Session, job: str, seconds: float) -> bool:
+    """Take or extend the lease on `job` for `seconds`. False if another live process holds it."""
+    expires_at = func.now() + timedelta(seconds=seconds)
+    stmt = insert(SchedulerLease).values(job=job, owner=WORKER_ID, expires_at=expires_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SchedulerLease.job],
+        set_={"owner": WORKER_ID, "expires_at": expires_at},
+        where=or_(SchedulerLease.owner == WORKER_ID, SchedulerLease.expires_at < func.now())
+    ).returning(SchedulerLease.owner)
+    acquired = db.execute(stmt).first() is not None
+    db.commit()
+    return acquired
+
+def release_leases():
+    """Expire the leases of this process so another one takes over at its next tick."""
+    db = BackgroundSessionLocal()
+    try:
+        db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.owner == WORKER_ID)
+            .values(expires_at=func.now())
+        )
+        db.commit()
+    except Exception as e:
+        print(f"Failed to release scheduler leases: {e}")
+    finally:
+        db.close()
+
+def run_exclusive(job: str, job_func: Callable[[], None], interval: timedelta):
+    """
+    Run `job_func` if this process holds the lease on `job`, and record the run.
+    """
+    db = BackgroundSessionLocal()
+    try:
+        if not acquire_lease(db, job, interval.total_seconds() + SCHEDULER_LEASE_GRACE_SECONDS):
+            return
+
+        run = JobRun(job=job, owner=WORKER_ID, status="running")
+        db.add(run)
+        db.commit()
+
+        started = time.monotonic()
+        try:
+            job_func()
+            run.status = "success"
+        except Exception:
+            run.status = "failed"
+            run.error = traceback.format_exc()
+        run.finished_at = datetime.now(timezone.utc)
+        run.duration_ms = int((time.monotonic() - started) * 1000)
+
+        db.execute(delete(JobRun).where(
+            JobRun.job == job,
+            JobRun.started_at < func.now() - timedelta(days=SCHEDULER_HISTORY_DAYS)
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Scheduler: {job} run failed: {e}")
+    finally:
+        db.close()
+
+def add_exclusive_job(scheduler: BackgroundScheduler, job_func: Callable[[], None], **interval):
+    job = job_func.__name__
+    scheduler.add_job(
+        run_exclusive, 'interval', args=[job, job_func, timedelta(**interval)],
+        id=job, coalesce=True, max_instances=1, **interval
+    )
+
 def start_scheduler():
+    global scheduler
     scheduler = BackgroundScheduler()
     # Check every 1 minute for demo purposes (real app: every hour)
-    scheduler.add_job(check_sla_violations, 'interval', minutes=1)
+    add_exclusive_job(scheduler, check_sla_violations, minutes=1)
     scheduler.start()
-    print("Scheduler started...")
-    
+    print(f"Scheduler started ({WORKER_ID})...")
+
     # Renewal job (Check daily)
-    scheduler.add_job(renew_onedrive_subscription, 'interval', days=1)
+    add_exclusive_job(scheduler, renew_onedrive_subscription, days=1)
+
+def stop_scheduler():
+    global scheduler
+    if scheduler is None:
+        return
+    scheduler.shutdown(wait=True)
+    scheduler = None
+    release_leases()
 
 def renew_onedrive_subscription():
     """
     Check if we have an active subscription closer to expiry and renew it.
     """
-    db = SessionLocal()
+    db = BackgroundSessionLocal()
     try:
         from .services.onedrive_client import OneDriveClient
         from .models import SystemSetting
         import json
-        
+
         sub_id = db.query(SystemSetting).filter(SystemSetting.key == "ONEDRIVE_SUBSCRIPTION_ID").first()
         if sub_id and sub_id.value:
             real_id = json.loads(sub_id.value)
@@ -58,6 +163,6 @@ def renew_onedrive_subscription():
             print("Subscription renewed.")
     except Exception as e:
         print(f"Failed to renew subscription: {e}")
+        raise
     finally:
         db.close()
-
@@ -132,6 +132,30 @@ class Shipment(ShipmentBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ShipmentSummary(ShipmentBase):
+    """
+    Row of the /shipments/list page: no events, and only the requested
+    `fields` when the listing is projected (every field is optional).
+    """
+    id: int
+    reference: Optional[str] = None
+    incoterm: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ShipmentPage(BaseModel):
+    items: List[ShipmentSummary]
+    next_cursor: Optional[str] = None # Pass as `cursor` for the next page, None on the last one
+    limit: int
+
+class ShipmentStats(BaseModel):
+    total: int
+    in_transit: int
+    delivered: int
+    pending: int
+
 
 # --- Excel Import ---
 from enum import Enum
@@ -185,5 +209,20 @@ class SyncConfig(BaseModel):
     file_name: str
 
 class SyncResult(ImportResult):
-    pass
+    unchanged: int = 0 # Rows identical to the last sync, not re-imported
+    file_unchanged: bool = False # Whole file identical to the last sync
+
+class SyncJobStatus(BaseModel):
+    id: str
+    file_id: str
+    trigger: str # webhook, manual
+    full: bool = False
+    status: str # queued, running, done, failed
+    notifications: int = 1 # Requests merged into this job
+    created_at: datetime
+    scheduled_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[SyncResult] = None
+    error: Optional[str] = None
 
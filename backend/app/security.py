@@ -1,55 +1,240 @@
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from .database import get_db
-from .models import User
-from .auth import SECRET_KEY, ALGORITHM
+from .database import get_db, SessionLocal
+from .models import ApiKey, User
+from .auth import SECRET_KEY, ALGORITHM, hash_api_key
+from .live import allowed_customers
+from .services.api_key_usage import api_key_usage
 from .schemas import TokenData
-from typing import List
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Routes open to API keys take either credential, so neither is required by itself
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# Permissions an API key can be granted (ApiKey.scopes)
+API_KEY_SCOPES = ("read:shipments", "read:events", "write:events")
+
+# Resolved users are cached by email, for at most the TTL and the token's lifetime.
+# Changes to a user (committed through the ORM) drop its entry in this process;
+# other processes pick them up within PRINCIPAL_CACHE_TTL_SECONDS (0 disables the cache).
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated user: a snapshot of the users row, not bound to a session.
+    `allowed_customers` is allowed_customer parsed once (None for all customers).
+    """
+    id: int
+    email: str
+    name: Optional[str]
+    role: str
+    allowed_customer: Optional[str]
+    allowed_customers: Optional[FrozenSet[str]]
+    api_key_id: Optional[int] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id, email=user.email, name=user.name, role=user.role,
+            allowed_customer=user.allowed_customer,
+            allowed_customers=allowed_customers(user.allowed_customer),
+        )
+
+    @classmethod
+    def from_api_key(cls, key: ApiKey) -> "Principal":
+        """An API key acts for its creator, on every customer, within its scopes only."""
+        return cls(
+            id=key.created_by_user_id, email=f"api-key:{key.key_prefix}", name=key.name, role="api",
+            allowed_customer=None, allowed_customers=None, api_key_id=key.id,
+        )
+
+class PrincipalCache:
+    """LRU of principals by email, each entry valid until its deadline."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, email: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return entry[1]
+
+    def put(self, principal: Principal, expires_at: float, generation: int):
+        """Cache `principal` until `expires_at` (epoch seconds) at the latest."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            # A user changed while this one was loaded: it may be stale
+            if generation != self._generation:
+                return
+            self._entries[principal.email] = (min(time.time() + self.ttl, expires_at), principal)
+            self._entries.move_to_end(principal.email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, emails: Optional[Iterable[str]] = None):
+        """Drop the entries of `emails` (all of them if None)."""
+        with self._lock:
+            self._generation += 1
+            if emails is None:
+                self._entries.clear()
+            else:
+                for email in emails:
+                    self._entries.pop(email, None)
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_SIZE)
+
+def get_user_from_token(token: str, db: Session) -> Optional[Principal]:
+    """User of a JWT access token, None if the token is invalid or the user unknown."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            return None
         token_data = TokenData(email=email)
     except JWTError:
-        raise credentials_exception
-    
+        return None
+
+    principal = principal_cache.get(token_data.email)
+    if principal is not None:
+        return principal
+
+    generation = principal_cache.generation
     user = db.query(User).filter(User.email == token_data.email).first()
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal, payload.get("exp", float("inf")), generation)
+    return principal
+
+_SESSION_KEY = "principal_cache_emails"
+
+def _collect_user_changes(session, flush_context):
+    """after_flush: emails of the users this flush updated or deleted."""
+    emails = session.info.setdefault(_SESSION_KEY, set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            emails.add(obj.email)
+            # Renamed: the entry is under the previous email
+            emails.update(e for e in inspect(obj).attrs.email.history.deleted if e)
+
+def _invalidate_after_commit(session):
+    emails = session.info.pop(_SESSION_KEY, None)
+    if emails:
+        principal_cache.invalidate(emails)
+
+def _discard_after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+def setup_principal_invalidation(session_factory=SessionLocal):
+    event.listen(session_factory, "after_flush", _collect_user_changes)
+    event.listen(session_factory, "after_commit", _invalidate_after_commit)
+    event.listen(session_factory, "after_rollback", _discard_after_rollback)
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = get_user_from_token(token, db)
     if user is None:
         raise credentials_exception
     return user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+def get_api_key(raw_key: str, db: Session) -> Optional[ApiKey]:
+    """Active API key matching `raw_key` (one indexed lookup on its digest), None if there is none."""
+    key = db.query(ApiKey).filter(ApiKey.key_hash == hash_api_key(raw_key), ApiKey.is_active == True).first()
+    if key is not None:
+        api_key_usage.touch(key.id)
+    return key
+
+def get_api_key_principal(raw_key: str, scope: str, db: Session) -> Principal:
+    key = get_api_key(raw_key, db)
+    if key is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+            headers={"WWW-Authenticate": "ApiKey"},
+        )
+    if scope not in (key.scopes or []):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"API key not authorized. Required scope: {scope}"
+        )
+    return Principal.from_api_key(key)
+
+def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 # ========== ROLE-BASED DEPENDENCIES ==========
 
-def require_role(allowed_roles: List[str]):
+def require_role(allowed_roles: List[str], api_scope: Optional[str] = None):
     """
     Factory function that returns a dependency requiring specific roles.
     Usage: Depends(require_role(["ops", "admin"]))
+    With `api_scope`, a request without a bearer token may authenticate with an
+    X-API-Key header instead, if the key has that scope.
     """
-    def role_checker(current_user: User = Depends(get_current_user)):
+    def role_checker(current_user: Principal = Depends(get_current_user)):
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Role '{current_user.role}' not authorized. Required: {allowed_roles}"
             )
         return current_user
-    return role_checker
+
+    if api_scope is None:
+        return role_checker
+
+    def role_or_scope_checker(
+        token: Optional[str] = Depends(optional_oauth2_scheme),
+        x_api_key: Optional[str] = Depends(api_key_header),
+        db: Session = Depends(get_db),
+    ):
+        if token is None and x_api_key is not None:
+            return get_api_key_principal(x_api_key, api_scope, db)
+        if token is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return role_checker(get_current_user(token, db))
+    return role_or_scope_checker
 
 # Pre-defined role checkers
 require_ops_or_admin = require_role(["ops", "admin"])
 require_admin = require_role(["admin"])
 require_any = require_role(["client", "ops", "admin"])  # All authenticated users
+
+# Routes open to integrations (API keys with the scope)
+require_shipments_reader = require_role(["client", "ops", "admin"], api_scope="read:shipments")
+require_events_reader = require_role(["client", "ops", "admin"], api_scope="read:events")
+require_events_writer = require_role(["ops", "admin"], api_scope="write:events")
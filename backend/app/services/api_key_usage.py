@@ -0,0 +1,98 @@
+"""
+API Key Usage
+Records when each API key was last used without writing to api_keys on every
+request: authenticated requests only note the key's id and time in memory, and
+a background thread writes them at most once per API_KEY_USAGE_FLUSH_SECONDS,
+in one UPDATE ... executemany for all the keys used meanwhile.
+
+last_used_at only moves forward, so several workers flushing the same key in
+any order keep the latest time. Usage not yet flushed is lost if the process
+dies (the shutdown hook flushes it otherwise).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, or_, update
+
+from ..database import BackgroundSessionLocal
+from ..models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+API_KEY_USAGE_FLUSH_SECONDS = float(os.getenv("API_KEY_USAGE_FLUSH_SECONDS", "30"))
+
+_table = ApiKey.__table__
+_UPDATE_LAST_USED = (
+    update(_table)
+    .where(_table.c.id == bindparam("key_id"))
+    .where(or_(_table.c.last_used_at.is_(None), _table.c.last_used_at < bindparam("used_at")))
+    .values(last_used_at=bindparam("used_at"))
+)
+
+
+class ApiKeyUsageRecorder:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._used: Dict[int, datetime] = {}
+        self._due: Optional[float] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def touch(self, key_id: int):
+        """Note that key `key_id` was used now; written within the flush interval."""
+        with self._cond:
+            self._used[key_id] = datetime.now(timezone.utc)
+            if self._due is not None:
+                return
+            self._due = time.monotonic() + self.interval
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="api-key-usage", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def flush(self):
+        """Write the pending usage now (e.g. on shutdown)."""
+        with self._cond:
+            used = self._take()
+        if used:
+            self._write(used)
+
+    def _take(self) -> Dict[int, datetime]:
+        used, self._used, self._due = self._used, {}, None
+        return used
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._due is None:
+                    self._cond.wait()
+                delay = self._due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                used = self._take()
+            if used:
+                self._write(used)
+
+    def _write(self, used: Dict[int, datetime]):
+        with self._flush_lock:
+            db = BackgroundSessionLocal()
+            try:
+                db.execute(_UPDATE_LAST_USED, [
+                    {"key_id": key_id, "used_at": used_at} for key_id, used_at in used.items()
+                ])
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("Failed to record the usage of %d API keys", len(used))
+            finally:
+                db.close()
+
+
+api_key_usage = ApiKeyUsageRecorder(API_KEY_USAGE_FLUSH_SECONDS)
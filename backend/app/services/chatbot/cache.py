@@ -0,0 +1,382 @@
+"""
+Chatbot Cache
+Answers of ChatbotEngine, reused for the same question asked again, and the
+SQL generated for a question, reused to answer it from current data.
+
+An answer is cached under (customer scope, data version, normalized question):
+ - the scope is the customer filter the SQL was generated with, so an answer
+   never reaches a user restricted to other customers;
+ - the data version (the chatbot_data_version sequence) is bumped once a
+   transaction changing shipments, events, alerts, documents or carrier
+   schedules commits, so answers computed from older data are not looked up
+   anymore (they expire with their TTL);
+ - the words of the SQL prompt's dictionary are compared accent-, case- and
+   punctuation-insensitively, with their synonyms mapped to one term
+   ("retards client X" and "Retard client X ?" share an entry); other words,
+   such as customers and references, are kept verbatim;
+ - the answer is written in the question's language, so the question's
+   language (French, English, or neither recognized) is part of the key:
+   "late client X" doesn't get the answer to "retards client X".
+
+Each process keeps an LRU of CHATBOT_CACHE_SIZE answers (CHATBOT_CACHE_TTL_SECONDS
+each) in front of the chatbot_cache table, an UNLOGGED table shared by all the
+processes. With CHATBOT_CACHE_BACKEND=memory only the local LRU is used, and
+the data version is local too (only this process's changes invalidate it).
+The cache never fails a question: backend errors are logged and count as misses.
+
+The SQL cache (chatbot_sql_cache table, CHATBOT_SQL_CACHE_TTL_SECONDS) skips
+the SQL generation round-trip to the LLM when an answer is missed. The SQL
+only depends on the question and the prompt it was generated from (which
+holds the customer filter), not on the data: its entries are not versioned,
+and are keyed on a fingerprint of the prompt instead, so a changed prompt
+doesn't reuse SQL generated from the previous one. Its questions are not
+normalized like the answers' (see literal_question): SQL generated for
+"Lancôme" or "PO-2024/12" is not reused for "Lancome" or "PO 2024 12".
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, inspect, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from ...database import SessionLocal, background_engine, engine
+from ...models import Alert, CarrierSchedule, ChatbotCacheEntry, ChatbotSqlCacheEntry, Document, Event, Shipment
+
+logger = logging.getLogger(__name__)
+
+CHATBOT_CACHE_TTL_SECONDS = float(os.getenv("CHATBOT_CACHE_TTL_SECONDS", "300"))
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "1000"))
+CHATBOT_CACHE_BACKEND = os.getenv("CHATBOT_CACHE_BACKEND", "postgres") # postgres, memory
+CHATBOT_SQL_CACHE_TTL_SECONDS = float(os.getenv("CHATBOT_SQL_CACHE_TTL_SECONDS", "86400"))
+
+# Tables the chatbot answers from (api_logs changes on every carrier poll and is left out)
+CACHED_MODELS = (Shipment, Event, Alert, Document, CarrierSchedule)
+# Shipment columns written by every carrier poll, which don't change the answers
+_SYNC_BOOKKEEPING = {"last_sync_at", "sync_status", "next_poll_at"}
+
+_SESSION_KEY = "chatbot_data_changed"
+_READ_VERSION = text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM chatbot_data_version")
+_BUMP_VERSION = text("SELECT nextval('chatbot_data_version')")
+
+
+def _fold(value: str) -> str:
+    """Lowercase, without accents, punctuation turned into single spaces."""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", without_accents).split())
+
+
+# Words, with a French elision ("d'", "l'") split off the word it precedes
+_TOKEN = re.compile(r"[^\s'’]+['’]?|['’]")
+# Sentence punctuation around a word, not part of it
+_OUTER_PUNCTUATION = "?!.,;:\"«»()[]{}"
+# References, dates and codes: a digit, hyphen or slash in the word
+_LITERAL = re.compile(r"[\d/-]")
+# Folded words telling a French question from an English one; words common to
+# both ("client", "transit", "urgent", "ETA", ...) are in neither
+_FRENCH_WORDS = frozenset("""
+    le la les l un une des du de d au aux et ou est sont quel quels quelle quelles
+    quoi quand combien comment pourquoi qui mes mon ma nos notre pour avec sans sur
+    dans par ce cette ces il elle je moi y montre montrer liste lister donne
+    affiche afficher expedition expeditions envoi envois commande commandes retard
+    retards livraison livraisons arrivee arrivees depart departs douane conteneur
+    conteneurs bateau navire avion camion aerien routier maritime facture factures
+    fournisseur fournisseurs acheteur produit produits alerte alertes greve tempete
+    meteo statut etat suivi semaine mois annee aujourd hui hier demain prevue prevu
+    prevues cours bloque bloquee bloquees arrive qualite conformite conforme
+    disponibilite etape etapes jalon jalons papiers risque risques probleme
+    problemes colisage connaissement dedouanement transitaire
+""".split())
+_ENGLISH_WORDS = frozenset("""
+    the of to in at for with without by is are was were what which where when
+    how why who my our show list give display shipment shipments order orders
+    late delayed delay delays delivery deliveries delivered arrival arrivals
+    departure departures customs container containers boat ship vessel plane flight
+    truck road sea invoice invoices supplier suppliers vendor buyer customer
+    customers product products alert alerts strike storm weather status state
+    tracking week month year today yesterday tomorrow planned pending blocked
+    arrived quality available availability milestone milestones paperwork risk
+    risks issue issues many much overdue packing bill lading forwarder
+""".split())
+
+
+class QuestionNormalizer:
+    """
+    Maps a question to its cache form. The synonyms are read from the
+    `- "a", "b", ... → target` lines of `prompt`: every phrase of a line is
+    replaced by the line's first one (longest phrases first, whole words only,
+    the first line wins for a phrase listed twice).
+
+    Only the dictionary's words are compared accent-, case- and
+    punctuation-insensitively. Any other word (a customer, a reference such as
+    PO-2024/12) is kept verbatim, as the generated SQL searches for it: two
+    questions naming different values never share an entry. A word with a
+    digit, hyphen or slash is never taken for a dictionary word.
+
+    The dictionary maps French and English phrases to the same term, but the
+    answer is in the question's language: the cache form starts with the
+    language most of the question's words are in ("[fr] ", "[en] ", or "[] "
+    when neither is recognized or it is a tie).
+    """
+
+    def __init__(self, prompt: str):
+        self.synonyms: Dict[str, str] = {}
+        for line in prompt.splitlines():
+            if not line.startswith("- ") or "→" not in line:
+                continue
+            phrases = [_fold(p) for p in re.findall(r'"([^"]*)"', line.split("→")[0])]
+            phrases = [p for p in phrases if p]
+            for phrase in phrases:
+                self.synonyms.setdefault(phrase, phrases[0])
+        self._longest = max((len(p.split()) for p in self.synonyms), default=0)
+
+    def __call__(self, question: str) -> str:
+        words = [w for w in (t.strip(_OUTER_PUNCTUATION) for t in _TOKEN.findall(question)) if w]
+        # Folded form of the words a phrase may start or continue with
+        folded = [None if _LITERAL.search(w) else _fold(w) for w in words]
+        result = []
+        i = 0
+        while i < len(words):
+            for length in range(min(self._longest, len(words) - i), 0, -1):
+                span = folded[i:i + length]
+                if None in span:
+                    continue
+                canonical = self.synonyms.get(" ".join(f for f in span if f))
+                if canonical is not None and span[0]:
+                    result.append(canonical)
+                    i += length
+                    break
+            else:
+                result.append(words[i])
+                i += 1
+        return f"[{self._language(folded)}] " + " ".join(result)
+
+    @staticmethod
+    def _language(folded: List[Optional[str]]) -> str:
+        parts = [part for word in folded if word for part in word.split()]
+        french = sum(part in _FRENCH_WORDS for part in parts)
+        english = sum(part in _ENGLISH_WORDS for part in parts)
+        if french == english:
+            return ""
+        return "fr" if french > english else "en"
+
+
+def literal_question(question: str) -> str:
+    """
+    Cache form of a question for the SQL cache: only case and whitespace are
+    folded. The generated SQL copies values from the question (accents and
+    punctuation included), so questions differing in anything else may need
+    different SQL.
+    """
+    return " ".join(question.lower().split())
+
+
+@dataclass(frozen=True)
+class CacheLookup:
+    """A question looked up in the cache, and the answer if there was one."""
+    key: str
+    scope: str
+    data_version: int
+    question: str
+    response: Optional[str]
+
+
+class ChatbotCache:
+    """
+    Values by (scope, normalized question), kept in `model`'s table when shared.
+    Unless `versioned`, the data version is left out (always 0).
+    """
+
+    def __init__(self, model, column: str, ttl: float, max_size: int, shared: bool = True, versioned: bool = True):
+        self.model = model
+        self.column = getattr(model, column)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.shared = shared
+        self.versioned = versioned
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._local_version = 0
+
+    @staticmethod
+    def _key(scope: str, data_version: int, question: str) -> str:
+        return hashlib.sha256(f"{scope}\x00{data_version}\x00{question}".encode()).hexdigest()
+
+    def data_version(self) -> int:
+        if not self.versioned:
+            return 0
+        if not self.shared:
+            return self._local_version
+        with engine.connect() as conn:
+            return conn.execute(_READ_VERSION).scalar_one()
+
+    def lookup(self, scope: str, question: str) -> CacheLookup:
+        """The cached answer to the normalized `question` in `scope` (response None on a miss)."""
+        try:
+            data_version = self.data_version()
+        except Exception:
+            logger.exception("Chatbot cache: failed to read the data version")
+            return CacheLookup("", scope, -1, question, None)
+        key = self._key(scope, data_version, question)
+        response = self._get_local(key)
+        if response is None and self.shared:
+            response = self._get_shared(key)
+        return CacheLookup(key, scope, data_version, question, response)
+
+    def put(self, lookup: CacheLookup, response: str):
+        """Cache `response` as the value of a missed `lookup`."""
+        if self.ttl <= 0 or lookup.data_version < 0:
+            return
+        expires_at = time.time() + self.ttl
+        self._put_local(lookup.key, response, expires_at)
+        if self.shared:
+            self._put_shared(lookup, response, expires_at)
+
+    def invalidate(self):
+        """
+        Answers cached so far are outdated (the data changed). The shared version
+        is bumped with one blocking round-trip, or a thread pool task when called
+        on an event loop (commit hooks of async sessions).
+        """
+        if not self.versioned:
+            return
+        with self._lock:
+            self._local_version += 1
+            self._entries.clear()
+        if not self.shared:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._bump_version()
+        else:
+            loop.run_in_executor(None, self._bump_version)
+
+    def _bump_version(self):
+        try:
+            with background_engine.connect() as conn:
+                conn.execute(_BUMP_VERSION)
+                conn.commit()
+        except Exception:
+            logger.exception("Chatbot cache: failed to bump the data version")
+
+    def _get_local(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: str, response: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[str]:
+        model = self.model
+        try:
+            with engine.connect() as conn:
+                row = conn.execute(
+                    select(self.column, model.expires_at)
+                    .where(model.key == key, model.expires_at > datetime.now(timezone.utc))
+                ).first()
+        except Exception:
+            logger.exception("Chatbot cache: lookup in %s failed", model.__tablename__)
+            return None
+        if row is None:
+            return None
+        value, expires_at = row
+        # Keep it locally until the shared entry expires
+        self._put_local(key, value, expires_at.timestamp())
+        return value
+
+    def _put_shared(self, lookup: CacheLookup, response: str, expires_at: float):
+        model = self.model
+        expires = datetime.fromtimestamp(expires_at, timezone.utc)
+        values = {"key": lookup.key, "scope": lookup.scope, "question": lookup.question,
+                  self.column.key: response, "expires_at": expires}
+        outdated = model.expires_at <= datetime.now(timezone.utc)
+        if self.versioned:
+            values["data_version"] = lookup.data_version
+            # Entries of previous data versions can't be hit anymore
+            outdated = or_(outdated, model.data_version < lookup.data_version)
+        entry = insert(model).values(**values)
+        try:
+            with engine.begin() as conn:
+                conn.execute(entry.on_conflict_do_update(
+                    index_elements=[model.key],
+                    set_={self.column.key: response, "expires_at": expires},
+                ))
+                conn.execute(delete(model).where(outdated))
+        except Exception:
+            logger.exception("Chatbot cache: store in %s failed", model.__tablename__)
+
+
+_shared = CHATBOT_CACHE_BACKEND == "postgres"
+# Answers, by customer filter and data version
+chatbot_cache = ChatbotCache(ChatbotCacheEntry, "response", CHATBOT_CACHE_TTL_SECONDS, CHATBOT_CACHE_SIZE, shared=_shared)
+# Generated SQL, by customer filter and prompt fingerprint
+chatbot_sql_cache = ChatbotCache(ChatbotSqlCacheEntry, "sql", CHATBOT_SQL_CACHE_TTL_SECONDS, CHATBOT_CACHE_SIZE,
+                                 shared=_shared, versioned=False)
+
+
+def _changes_answers(session, obj) -> bool:
+    if not isinstance(obj, CACHED_MODELS):
+        return False
+    if not isinstance(obj, Shipment) or obj in session.new or obj in session.deleted:
+        return True
+    state = inspect(obj)
+    return any(
+        state.attrs[attr.key].history.has_changes()
+        for attr in state.mapper.column_attrs if attr.key not in _SYNC_BOOKKEEPING
+    )
+
+
+def _collect_data_changes(session, flush_context):
+    """after_flush: note whether this flush changed data the chatbot answers from."""
+    if session.info.get(_SESSION_KEY):
+        return
+    if any(_changes_answers(session, obj) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_SESSION_KEY] = True
+
+
+def _collect_statement_changes(orm_execute_state):
+    """do_orm_execute: ORM-enabled insert/update/delete statements bypass the flush."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, CACHED_MODELS):
+        orm_execute_state.session.info[_SESSION_KEY] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop(_SESSION_KEY, None):
+        chatbot_cache.invalidate()
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def setup_chatbot_cache_invalidation(session_factory=SessionLocal):
+    event.listen(session_factory, "after_flush", _collect_data_changes)
+    event.listen(session_factory, "do_orm_execute", _collect_statement_changes)
+    event.listen(session_factory, "after_commit", _invalidate_after_commit)
+    event.listen(session_factory, "after_rollback", _discard_after_rollback)
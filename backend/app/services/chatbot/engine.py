@@ -1,3 +1,4 @@
+import hashlib
 import os
 from langchain_groq import ChatGroq
 from langchain_community.utilities import SQLDatabase
@@ -5,6 +6,7 @@ from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from ...database import engine as db_engine
+from .cache import QuestionNormalizer, chatbot_cache, chatbot_sql_cache, literal_question
 
 # ========================================
 # COMPREHENSIVE SQL PROMPT - ALL TEMPLATES
@@ -639,37 +641,9 @@ Question: {question}
 Données: {result}
 Réponse:"""
 
-# Simple in-memory cache for responses (TTL 5 minutes)
-import hashlib
-import time
-from functools import lru_cache
-
-_response_cache = {}
-_cache_ttl = 300  # 5 minutes
-
-def _get_cache_key(query: str) -> str:
-    """Generate cache key from normalized query"""
-    normalized = query.lower().strip()
-    return hashlib.md5(normalized.encode()).hexdigest()
-
-def _get_cached_response(query: str):
-    """Get cached response if valid"""
-    key = _get_cache_key(query)
-    if key in _response_cache:
-        cached_time, response = _response_cache[key]
-        if time.time() - cached_time < _cache_ttl:
-            return response
-        del _response_cache[key]
-    return None
-
-def _set_cached_response(query: str, response: str):
-    """Cache a response"""
-    key = _get_cache_key(query)
-    _response_cache[key] = (time.time(), response)
-    # Limit cache size to 100 entries
-    if len(_response_cache) > 100:
-        oldest_key = min(_response_cache.keys(), key=lambda k: _response_cache[k][0])
-        del _response_cache[oldest_key]
+# Cached answers are looked up by question, normalized with the synonyms above
+# and tagged with its language (ANSWER_PROMPT answers in the question's language)
+_normalize_question = QuestionNormalizer(SQL_PROMPT)
 
 
 class ChatbotEngine:
@@ -694,6 +668,8 @@ class ChatbotEngine:
         filter_customer = self.user.allowed_customer
         if not filter_customer and self.user.role == "client":
             filter_customer = self.user.name
+        # Cached answers are only shared between users with the same filter
+        self.cache_scope = filter_customer or ""
             
         final_prompt = SQL_PROMPT
 
@@ -722,6 +698,8 @@ RÈGLES DE FILTRAGE :
 """
             
         final_prompt = SQL_PROMPT + filter_instruction + SQL_PROMPT_SUFFIX
+        # Generated SQL is reused for the same filter and prompt only
+        self.sql_cache_scope = f"{self.cache_scope}@{hashlib.sha256(final_prompt.encode()).hexdigest()[:16]}"
         
         self.sql_prompt = PromptTemplate.from_template(final_prompt)
         self.answer_prompt = PromptTemplate.from_template(ANSWER_PROMPT)
@@ -792,19 +770,27 @@ SQL corrigé:"""
         print(f"DEBUG: Starting process_stream for query: {query}", flush=True)
         try:
             # Check cache first
-            cached = _get_cached_response(query)
-            if cached:
+            question = _normalize_question(query)
+            cached = chatbot_cache.lookup(self.cache_scope, question)
+            if cached.response:
                 print("DEBUG: Returning cached response", flush=True)
-                yield cached
+                yield cached.response
                 return
             
-            # Generate SQL (first attempt)
-            print("DEBUG: Attempting to generate SQL...", flush=True)
-            sql = self._generate_sql(query)
-            print(f"DEBUG: SQL to validate: {sql}", flush=True)
+            # SQL generated for this question before: run it on current data, without the LLM
+            cached_sql = chatbot_sql_cache.lookup(self.sql_cache_scope, literal_question(query))
+            if cached_sql.response and self._validate_sql(cached_sql.response)[0]:
+                print("DEBUG: Reusing cached SQL", flush=True)
+                sql = cached_sql.response
+                is_valid = True
+            else:
+                # Generate SQL (first attempt)
+                print("DEBUG: Attempting to generate SQL...", flush=True)
+                sql = self._generate_sql(query)
+                print(f"DEBUG: SQL to validate: {sql}", flush=True)
             
-            # Validate SQL
-            is_valid, validation_error = self._validate_sql(sql)
+                # Validate SQL
+                is_valid, validation_error = self._validate_sql(sql)
             if not is_valid:
                 print(f"DEBUG: SQL Invalid: {validation_error}. Retrying...", flush=True)
                 # Fallback: retry with error context
@@ -842,6 +828,9 @@ SQL corrigé:"""
                 msg = f"Erreur après {max_retries} tentatives: {last_error}"
                 print(f"DEBUG: Final Failure: {msg}", flush=True)
                 result = msg
+            elif not str(result).startswith("Error") and sql != cached_sql.response:
+                # The SQL ran (the tool returns "Error: ..." otherwise): reuse it for this question
+                chatbot_sql_cache.put(cached_sql, sql)
             
             # Generate answer with streaming
             print("DEBUG: Generating answer stream...", flush=True)
@@ -859,7 +848,7 @@ SQL corrigé:"""
             
             # Cache the full response (only if successful)
             if "Erreur" not in str(result) and full_response:
-                _set_cached_response(query, full_response)
+                chatbot_cache.put(cached, full_response)
                 
         except Exception as e:
             print(f"DEBUG: Global process_stream exception: {e}", flush=True)
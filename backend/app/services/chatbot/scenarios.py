@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from ...models import Shipment, Event, Alert, Document, CarrierSchedule
+from ...loading import SHIPMENT_TRACKING, SHIPMENT_WITH_DOCUMENTS, SHIPMENT_WITH_EVENTS
 from ..external_data import external_service
 from datetime import datetime, timedelta
 
@@ -23,7 +24,7 @@ class ChatbotScenarios:
     # --- CLIENT SCENARIOS ---
     
     def get_tracking(self, ref: str):
-        shipment = self._filter_shipments().filter((Shipment.reference == ref) | (Shipment.order_number == ref)).first()
+        shipment = self._filter_shipments().options(*SHIPMENT_TRACKING).filter((Shipment.reference == ref) | (Shipment.order_number == ref)).first()
         if not shipment:
             return "Commande introuvable ou accès refusé."
         
@@ -39,7 +40,7 @@ class ChatbotScenarios:
         return msg
 
     def get_documents_status(self, ref: str):
-         shipment = self._filter_shipments().filter(Shipment.reference == ref).first()
+         shipment = self._filter_shipments().options(*SHIPMENT_WITH_DOCUMENTS).filter(Shipment.reference == ref).first()
          if not shipment: return "Commande introuvable."
          
          docs = shipment.documents
@@ -201,7 +202,7 @@ class ChatbotScenarios:
         """Statut EXW → DDP pour la commande {id}"""
         if not self._require_ops(): return "Accès refusé."
         
-        shipment = self.db.query(Shipment).filter(
+        shipment = self.db.query(Shipment).options(*SHIPMENT_WITH_EVENTS).filter(
             (Shipment.reference == ref) | (Shipment.order_number == ref)
         ).first()
         
@@ -421,7 +422,7 @@ Dernier statut: {shipment.status}"""
         """Confirmation de complétude livraison DDP (POD)"""
         if not self._require_ops(): return "Accès refusé."
         
-        shipment = self.db.query(Shipment).filter(
+        shipment = self.db.query(Shipment).options(*SHIPMENT_WITH_DOCUMENTS).filter(
             (Shipment.reference == ref) | (Shipment.order_number == ref)
         ).first()
         
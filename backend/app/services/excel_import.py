@@ -2,14 +2,28 @@
 Excel Import Service
 Handles parsing, validation, and import of Excel files for shipments.
 """
+import logging
+import os
+import re
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional, Tuple
+from collections.abc import Sequence
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable, BinaryIO
 from enum import Enum
+from sqlalchemy import Boolean, Text, and_, cast, column, func, literal_column, select, table, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.orm import Session
 from io import BytesIO
 from datetime import datetime
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers.readers import STR_NA_VALUES
 
-from ..models import Shipment
+from ..models import Shipment, shipment_import_key_index, IMPORT_KEY_TRIM_CHARS
+from ..observers import notify_bulk_import
+from .webhook_outbox import SHIPMENT_CREATED, record_outbox
+
+logger = logging.getLogger(__name__)
 
 
 class ImportMode(str, Enum):
@@ -173,113 +187,657 @@ def _build_reference(row: pd.Series) -> str:
     return str(order_num)
 
 
-def parse_excel(file_content: bytes) -> Tuple[List[Dict[str, Any]], List[str]]:
-    """
-    Parse Excel file and return list of row data with parsed values.
-    
-    Returns:
-        Tuple of (parsed_rows, columns_found)
-    """
+def _read_frame(file_content: bytes) -> pd.DataFrame:
+    """Load the first sheet of the workbook into a DataFrame."""
     try:
-        df = pd.read_excel(BytesIO(file_content))
+        return pd.read_excel(BytesIO(file_content))
     except Exception as e:
         raise ValueError(f"Erreur lecture Excel: {str(e)}")
+
+
+def _parse_row(index: Any, row: pd.Series) -> Dict[str, Any]:
+    """Parse a single DataFrame row (reference implementation, cell by cell)."""
+    row_data = {
+        'row_number': index + 2,  # +2 because Excel is 1-indexed and has header
+        'data': {},
+        'reference': None,
+        'error': None
+    }
     
-    parsed_rows = []
+    try:
+        # Build reference
+        reference = _build_reference(row)
+        if not reference:
+            row_data['error'] = "Référence manquante (Order number requis)"
+            return row_data
+        
+        row_data['reference'] = reference
+        row_data['data']['reference'] = reference
+        
+        # Map columns
+        for excel_col, model_field in COL_MAPPING.items():
+            value = _get_value(row, excel_col)
+            
+            if model_field in DATE_FIELDS:
+                row_data['data'][model_field] = _parse_date(value)
+            elif model_field in FLOAT_FIELDS:
+                row_data['data'][model_field] = _parse_float(value)
+            elif model_field in INT_FIELDS:
+                row_data['data'][model_field] = _parse_int(value)
+            else:
+                row_data['data'][model_field] = str(value) if value is not None else None
+        
+        # Add origin/destination from loading_place/pod
+        row_data['data']['origin'] = _get_value(row, 'Loading Place')
+        row_data['data']['destination'] = _get_value(row, 'POD')
+
+        # --- Status Inference Logic ---
+        excel_status_val = row_data['data'].get('excel_status')
+        dep_stat = row_data['data'].get('departure_stat')
+        
+        inferred_status = None
+        
+        # 1. Primary check on new 'Status' column
+        if excel_status_val and isinstance(excel_status_val, str):
+            s = excel_status_val.upper().strip()
+            if "ON BOARD" in s:
+                inferred_status = "TRANSIT_OCEAN"
+            elif "READY" in s:
+                inferred_status = "CONTAINER_READY_FOR_DEPARTURE"
+            elif "PROD" in s:
+                inferred_status = "PRODUCTION_READY"
+            elif "DELIVERED" in s:
+                inferred_status = "FINAL_DELIVERY"
+        
+        # 2. Fallback check on 'Départ' if not found
+        if not inferred_status and dep_stat and isinstance(dep_stat, str):
+            s = dep_stat.upper().strip()
+            if "ON BOARD" in s or "TRANSIT" in s:
+                inferred_status = "TRANSIT_OCEAN"
+        
+        # 3. Last fallback: Check delivery_date
+        if not inferred_status and row_data['data'].get('delivery_date'):
+            inferred_status = "FINAL_DELIVERY"
+            
+        if inferred_status:
+            row_data['data']['status'] = inferred_status
+        
+    except Exception as e:
+        row_data['error'] = f"Erreur parsing: {str(e)}"
     
-    for index, row in df.iterrows():
+    return row_data
+
+
+def _parse_rows_iterrows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Row-by-row parsing engine (kept as reference for the vectorized one)."""
+    return [_parse_row(index, row) for index, row in df.iterrows()]
+
+
+# --- Vectorized parsing engine ---
+
+# Excel column feeding each model field. When several headers map to the same
+# field (e.g. 'batch' / 'BATCH'), the last one in COL_MAPPING wins, exactly
+# like the row-by-row loop which overwrites the field on each pass.
+_FIELD_SOURCES: Dict[str, str] = {}
+for _excel_col, _model_field in COL_MAPPING.items():
+    _FIELD_SOURCES[_model_field] = _excel_col
+
+_STATUS_RULES = [
+    ("ON BOARD", "TRANSIT_OCEAN"),
+    ("READY", "CONTAINER_READY_FOR_DEPARTURE"),
+    ("PROD", "PRODUCTION_READY"),
+    ("DELIVERED", "FINAL_DELIVERY"),
+]
+
+
+# Exact cell types eligible for the vectorized conversions (subclasses such as
+# bool or numpy scalars keep going through the scalar parsers).
+_OTHER, _STR, _INT, _FLOAT, _DATETIME = range(5)
+_KIND_CODES = {str: _STR, int: _INT, float: _FLOAT, datetime: _DATETIME, pd.Timestamp: _DATETIME}
+
+
+def _format_batch(batch: Any) -> str:
+    """Batch suffix used in the reference (same rule as _build_reference)."""
+    try:
+        if isinstance(batch, float) and batch.is_integer():
+            return str(int(batch))
+        return str(batch)
+    except:
+        return str(batch)
+
+
+def _to_str(value: Any) -> str:
+    return str(value)
+
+
+class _ColumnParser:
+    """
+    Converts whole columns of the `df.values` matrix (the same Python objects
+    iterrows() would hand to the scalar parsers).
+    Cells of the common native types are converted in one vectorized pass;
+    anything else goes through the scalar parser once per distinct value.
+    Row positions where the scalar parser raises are collected in `failed_rows`
+    so they can be re-parsed by the reference implementation.
+    """
+
+    def __init__(self, values: np.ndarray, columns: pd.Index):
+        self.values = values
+        self.positions = {col: i for i, col in enumerate(columns)}
+        self.n_rows = values.shape[0]
+        # Native Python scalars only exist in an object matrix; a homogeneous
+        # frame yields numpy scalars which only the scalar parsers handle exactly.
+        self.native = values.dtype == object
+        self.failed_rows: set = set()
+
+    def raw(self, excel_col: str) -> Optional[np.ndarray]:
+        pos = self.positions.get(excel_col)
+        if pos is None:
+            return None
+        return self.values[:, pos]
+
+    def map_unique(self, arr: np.ndarray, mask: np.ndarray, func, out: np.ndarray):
+        cache = {}
+        for i in np.flatnonzero(mask):
+            v = arr[i]
+            key = (type(v), v)
+            try:
+                if key not in cache:
+                    cache[key] = func(v)
+                out[i] = cache[key]
+            except Exception:
+                self.failed_rows.add(int(i))
+
+    def _prepare(self, excel_col: str):
+        arr = self.raw(excel_col)
+        out = np.full(self.n_rows, None, dtype=object)
+        if arr is None:
+            return None, None, None, out
+        present = ~pd.isna(arr)
+        kinds = np.fromiter((_KIND_CODES.get(type(v), _OTHER) for v in arr), dtype=np.int8, count=len(arr))
+        return arr, present, kinds, out
+
+    def parse(self, model_field: str, excel_col: str) -> np.ndarray:
+        if model_field in DATE_FIELDS:
+            return self.parse_dates(excel_col)
+        if model_field in FLOAT_FIELDS:
+            return self.parse_floats(excel_col)
+        if model_field in INT_FIELDS:
+            return self.parse_ints(excel_col)
+        return self.parse_strings(excel_col)
+
+    def parse_dates(self, excel_col: str) -> np.ndarray:
+        arr, present, kinds, out = self._prepare(excel_col)
+        if arr is None:
+            return out
+        fast = present & (kinds == _DATETIME) if self.native else np.zeros(self.n_rows, bool)
+        if fast.any():
+            try:
+                out[fast] = pd.DatetimeIndex(pd.to_datetime(arr[fast], errors='coerce')).to_pydatetime()
+            except Exception:
+                fast[:] = False
+        self.map_unique(arr, present & ~fast, _parse_date, out)
+        return out
+
+    def parse_floats(self, excel_col: str) -> np.ndarray:
+        arr, present, kinds, out = self._prepare(excel_col)
+        if arr is None:
+            return out
+        fast = present & ((kinds == _INT) | (kinds == _FLOAT)) if self.native else np.zeros(self.n_rows, bool)
+        if fast.any():
+            out[fast] = pd.to_numeric(arr[fast]).astype(float).tolist()
+        self.map_unique(arr, present & ~fast, _parse_float, out)
+        return out
+
+    def parse_ints(self, excel_col: str) -> np.ndarray:
+        arr, present, kinds, out = self._prepare(excel_col)
+        if arr is None:
+            return out
+        fast = np.zeros(self.n_rows, bool)
+        if self.native:
+            is_int = present & (kinds == _INT)
+            out[is_int] = arr[is_int]
+            fast |= is_int
+            is_float = present & (kinds == _FLOAT)
+            if is_float.any():
+                floats = arr[is_float].astype(float)
+                # int() truncates toward zero, as does the int64 cast for finite in-range values;
+                # NaN/inf/huge values go through the scalar path (which raises for inf, like before).
+                ok = np.isfinite(floats) & (np.abs(floats) < 2 ** 62)
+                idx = np.flatnonzero(is_float)[ok]
+                out[idx] = floats[ok].astype(np.int64).tolist()
+                fast[idx] = True
+        self.map_unique(arr, present & ~fast, _parse_int, out)
+        return out
+
+    def parse_strings(self, excel_col: str) -> np.ndarray:
+        arr, present, kinds, out = self._prepare(excel_col)
+        if arr is None:
+            return out
+        fast = present & (kinds == _STR)
+        out[fast] = arr[fast]
+        self.map_unique(arr, present & ~fast, _to_str, out)
+        return out
+
+    def parse_raw(self, excel_col: str) -> np.ndarray:
+        arr = self.raw(excel_col)
+        out = np.full(self.n_rows, None, dtype=object)
+        if arr is not None:
+            present = ~pd.isna(arr)
+            out[present] = arr[present]
+        return out
+
+
+def _infer_status(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Vectorized status inference (Status column, then 'Départ', then delivery date)."""
+    n = len(columns['excel_status'])
+    excel_status = pd.Series(columns['excel_status'], dtype=object)
+    dep_stat = pd.Series(columns['departure_stat'], dtype=object)
+
+    status_norm = excel_status.str.upper().str.strip()
+    has_status = excel_status.notna() & (excel_status != '')
+    conditions = [
+        (has_status & status_norm.str.contains(needle, regex=False, na=False)).to_numpy(bool)
+        for needle, _ in _STATUS_RULES
+    ]
+    choices = [status for _, status in _STATUS_RULES]
+
+    dep_norm = dep_stat.str.upper().str.strip()
+    has_dep = dep_stat.notna() & (dep_stat != '')
+    dep_transit = has_dep & (
+        dep_norm.str.contains("ON BOARD", regex=False, na=False)
+        | dep_norm.str.contains("TRANSIT", regex=False, na=False)
+    )
+    conditions.append(dep_transit.to_numpy(bool))
+    choices.append("TRANSIT_OCEAN")
+
+    conditions.append(np.array([d is not None for d in columns['delivery_date']], dtype=bool))
+    choices.append("FINAL_DELIVERY")
+
+    # Apply rules from lowest to highest priority so the first match wins
+    statuses = np.full(n, None, dtype=object)
+    for condition, status in reversed(list(zip(conditions, choices))):
+        statuses[condition] = status
+    return statuses
+
+
+class ParsedRows(Sequence):
+    """
+    Column-oriented result of the vectorized parser.
+    Row dicts (same shape as the row-by-row engine) are only built when a row
+    is accessed, and are not kept: each access returns a fresh dict.
+    """
+
+    def __init__(
+        self,
+        row_numbers: List[int],
+        references: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        statuses: np.ndarray,
+        overrides: Dict[int, Dict[str, Any]]
+    ):
+        self._row_numbers = row_numbers
+        self._references = references
+        self._columns = columns
+        self._statuses = statuses
+        self._overrides = overrides
+
+    def __len__(self) -> int:
+        return len(self._row_numbers)
+
+    def _build(self, i: int) -> Dict[str, Any]:
+        if i in self._overrides:
+            return self._overrides[i]
+
+        reference = self._references[i]
         row_data = {
-            'row_number': index + 2,  # +2 because Excel is 1-indexed and has header
+            'row_number': self._row_numbers[i],
             'data': {},
             'reference': None,
             'error': None
         }
-        
+        if reference is None:
+            row_data['error'] = "Référence manquante (Order number requis)"
+            return row_data
+
+        row_data['reference'] = reference
+        data = {'reference': reference}
+        for field, values in self._columns.items():
+            data[field] = values[i]
+        if self._statuses[i] is not None:
+            data['status'] = self._statuses[i]
+        row_data['data'] = data
+        return row_data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._build(i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self._build(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._build(i)
+
+
+def _parse_rows_vectorized(df: pd.DataFrame) -> ParsedRows:
+    """Column-wise parsing engine: converts each mapped column in one pass."""
+    values = df.values  # same cell objects iterrows() would yield
+    parser = _ColumnParser(values, df.columns)
+    row_numbers = [index + 2 for index in df.index]
+
+    # Reference = "Order number" or "Order number-batch"
+    order = parser.parse_raw('Order number')
+    has_order = np.array([bool(v) for v in order], dtype=bool)
+    references = np.full(len(df), None, dtype=object)
+    if has_order.any():
+        order_str = np.full(len(df), None, dtype=object)
+        parser.map_unique(order, has_order, _to_str, order_str)
+        batch = parser.parse_raw('batch')
+        has_batch = np.array([bool(v) for v in batch], dtype=bool) & has_order
+        batch_str = np.full(len(df), None, dtype=object)
+        parser.map_unique(batch, has_batch, _format_batch, batch_str)
+        references[has_order] = order_str[has_order]
+        if has_batch.any():
+            references[has_batch] = (
+                pd.Series(order_str[has_batch], dtype=object) + "-" + pd.Series(batch_str[has_batch], dtype=object)
+            ).to_numpy(dtype=object)
+
+    columns: Dict[str, np.ndarray] = {}
+    for model_field, excel_col in _FIELD_SOURCES.items():
+        columns[model_field] = parser.parse(model_field, excel_col)
+    columns['origin'] = parser.parse_raw('Loading Place')
+    columns['destination'] = parser.parse_raw('POD')
+
+    statuses = _infer_status(columns)
+
+    # Cells the scalar parsers rejected make the whole row go through the
+    # reference implementation so the error message is identical.
+    overrides = {}
+    for i in sorted(parser.failed_rows):
+        if references[i] is None:
+            continue
+        row = pd.Series(values[i], index=df.columns, name=df.index[i])
+        overrides[i] = _parse_row(df.index[i], row)
+
+    return ParsedRows(row_numbers, references, columns, statuses, overrides)
+
+
+def parse_excel(file_content: bytes, vectorized: bool = True) -> Tuple[Sequence[Dict[str, Any]], List[str]]:
+    """
+    Parse Excel file and return list of row data with parsed values.
+    
+    The vectorized engine (default) converts the file column by column and
+    builds row dicts lazily; `vectorized=False` runs the row-by-row engine.
+    Both produce the same rows.
+    
+    Returns:
+        Tuple of (parsed_rows, columns_found)
+    """
+    df = _read_frame(file_content)
+    
+    if vectorized:
+        parsed_rows = _parse_rows_vectorized(df)
+    else:
+        parsed_rows = _parse_rows_iterrows(df)
+    
+    return parsed_rows, list(df.columns)
+
+
+# --- Streaming reader ---
+
+# Rows parsed (and committed, for imports) per chunk by the streaming reader
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+# Strings pandas converts to numbers when a whole column is numeric
+_INTEGER_STRING = re.compile(r"^\s*[+-]?\d+\s*$")
+_NUMERIC_STRING = re.compile(r"^\s*[+-]?((\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|inf(inity)?)\s*$", re.IGNORECASE)
+
+
+def _convert_cell(cell) -> Any:
+    """Cell value as pandas' openpyxl reader returns it ('' for empty cells)."""
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def _is_na(value: Any) -> bool:
+    if isinstance(value, str):
+        return value in STR_NA_VALUES
+    return isinstance(value, float) and value != value
+
+
+def _dedup_names(names: List[Any]) -> List[Any]:
+    """Header names as pandas builds them ('Unnamed: i', 'name.1' for duplicates)."""
+    names = [f"Unnamed: {i}" if name == "" else name for i, name in enumerate(names)]
+    counts: Dict[Any, int] = {}
+    for i, col in enumerate(names):
+        cur_count = counts.get(col, 0)
+        while cur_count > 0:
+            counts[col] = cur_count + 1
+            col = f"{col}.{cur_count}"
+            cur_count = counts.get(col, 0)
+        names[i] = col
+        counts[col] = cur_count + 1
+    return names
+
+
+class ExcelStream:
+    """
+    Constant-memory reader for the first sheet of an .xlsx workbook.
+    
+    The sheet is read twice with openpyxl in read-only mode. The first pass
+    records the header, the row count and which columns pandas would turn
+    into numbers (a column holding only numbers becomes float as soon as one
+    cell is blank or decimal). The second pass yields the rows in ParsedRows
+    chunks, identical to what parse_excel returns for the same rows.
+    """
+    
+    def __init__(self, source: BinaryIO):
+        self.source = source
+        self.columns: List[Any] = []
+        self.total_rows = 0
+        self._numeric: List[bool] = []
+        self._floating: List[bool] = []
+        self._scan()
+    
+    def _rows(self) -> Iterator[List[Any]]:
+        """Converted rows without trailing empty cells; trailing empty rows are dropped."""
         try:
-            # Build reference
-            reference = _build_reference(row)
-            if not reference:
-                row_data['error'] = "Référence manquante (Order number requis)"
-                parsed_rows.append(row_data)
-                continue
-            
-            row_data['reference'] = reference
-            row_data['data']['reference'] = reference
-            
-            # Map columns
-            for excel_col, model_field in COL_MAPPING.items():
-                value = _get_value(row, excel_col)
-                
-                if model_field in DATE_FIELDS:
-                    row_data['data'][model_field] = _parse_date(value)
-                elif model_field in FLOAT_FIELDS:
-                    row_data['data'][model_field] = _parse_float(value)
-                elif model_field in INT_FIELDS:
-                    row_data['data'][model_field] = _parse_int(value)
+            self.source.seek(0)
+            wb = load_workbook(self.source, read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f"Erreur lecture Excel: {str(e)}")
+        try:
+            ws = wb.worksheets[0]
+            ws.reset_dimensions()
+            blank_rows = 0
+            for row in ws.rows:
+                values = [_convert_cell(cell) for cell in row]
+                while values and values[-1] == "":
+                    values.pop()
+                if not values:
+                    blank_rows += 1
+                    continue
+                for _ in range(blank_rows):
+                    yield []
+                blank_rows = 0
+                yield values
+        except Exception as e:
+            raise ValueError(f"Erreur lecture Excel: {str(e)}")
+        finally:
+            wb.close()
+    
+    def _scan(self):
+        rows = self._rows()
+        header = next(rows, None)
+        if header is None:
+            return
+        numeric = [True] * len(header)
+        floating = [False] * len(header)
+        has_number = [False] * len(header)
+        
+        for values in rows:
+            self.total_rows += 1
+            if len(values) > len(numeric):
+                # Cells of the new columns were blank on the previous rows
+                extra = len(values) - len(numeric)
+                numeric += [True] * extra
+                floating += [self.total_rows > 1] * extra
+                has_number += [False] * extra
+            for i in range(len(numeric)):
+                value = values[i] if i < len(values) else ""
+                if _is_na(value):
+                    floating[i] = True
+                elif not numeric[i]:
+                    continue
+                elif isinstance(value, bool):
+                    continue
+                elif isinstance(value, int):
+                    numeric[i] = abs(value) < 2 ** 63
+                    has_number[i] = True
+                elif isinstance(value, float):
+                    floating[i] = has_number[i] = True
+                elif isinstance(value, str) and _INTEGER_STRING.match(value):
+                    numeric[i] = abs(int(value)) < 2 ** 63
+                    has_number[i] = True
+                elif isinstance(value, str) and _NUMERIC_STRING.match(value):
+                    floating[i] = has_number[i] = True
                 else:
-                    row_data['data'][model_field] = str(value) if value is not None else None
-            
-            # Add origin/destination from loading_place/pod
-            row_data['data']['origin'] = _get_value(row, 'Loading Place')
-            row_data['data']['destination'] = _get_value(row, 'POD')
+                    numeric[i] = False
+        
+        self.columns = _dedup_names(header + [""] * (len(numeric) - len(header)))
+        # Columns of booleans only are left as they are
+        self._numeric = [n and h for n, h in zip(numeric, has_number)]
+        self._floating = floating
+    
+    def _convert_row(self, values: List[Any]) -> List[Any]:
+        row = []
+        for i in range(len(self.columns)):
+            value = values[i] if i < len(values) else ""
+            if _is_na(value):
+                row.append(None)
+            elif self._numeric[i]:
+                row.append(float(value) if self._floating[i] else int(value))
+            else:
+                row.append(value)
+        return row
+    
+    def _parse_chunk(self, rows: List[List[Any]], start: int) -> ParsedRows:
+        df = pd.DataFrame(
+            rows,
+            columns=pd.Index(self.columns, dtype=object),
+            index=range(start, start + len(rows)),
+            dtype=object
+        )
+        return _parse_rows_vectorized(df)
+    
+    def chunks(self, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[ParsedRows]:
+        """Parsed rows, `chunk_size` at a time."""
+        rows = self._rows()
+        try:
+            next(rows, None)  # header
+            buffer = []
+            start = 0
+            for values in rows:
+                buffer.append(self._convert_row(values))
+                if len(buffer) == chunk_size:
+                    yield self._parse_chunk(buffer, start)
+                    start += len(buffer)
+                    buffer = []
+            if buffer:
+                yield self._parse_chunk(buffer, start)
+        finally:
+            rows.close()
 
-            # --- Status Inference Logic ---
-            excel_status_val = row_data['data'].get('excel_status')
-            dep_stat = row_data['data'].get('departure_stat')
-            
-            inferred_status = None
-            
-            # 1. Primary check on new 'Status' column
-            if excel_status_val and isinstance(excel_status_val, str):
-                s = excel_status_val.upper().strip()
-                if "ON BOARD" in s:
-                    inferred_status = "TRANSIT_OCEAN"
-                elif "READY" in s:
-                    inferred_status = "CONTAINER_READY_FOR_DEPARTURE"
-                elif "PROD" in s:
-                    inferred_status = "PRODUCTION_READY"
-                elif "DELIVERED" in s:
-                    inferred_status = "FINAL_DELIVERY"
-            
-            # 2. Fallback check on 'Départ' if not found
-            if not inferred_status and dep_stat and isinstance(dep_stat, str):
-                s = dep_stat.upper().strip()
-                if "ON BOARD" in s or "TRANSIT" in s:
-                    inferred_status = "TRANSIT_OCEAN"
-            
-            # 3. Last fallback: Check delivery_date
-            if not inferred_status and row_data['data'].get('delivery_date'):
-                inferred_status = "FINAL_DELIVERY"
-                
-            if inferred_status:
-                row_data['data']['status'] = inferred_status
-            
-        except Exception as e:
-            row_data['error'] = f"Erreur parsing: {str(e)}"
+
+def preview_excel_stream(
+    source: BinaryIO,
+    db: Session,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Streaming version of parse_excel + validate_and_preview.
+    
+    Returns:
+        Tuple of (preview_rows, columns_found)
+    """
+    stream = ExcelStream(source)
+    preview_rows = []
+    for chunk in stream.chunks(chunk_size):
+        preview_rows.extend(validate_and_preview(chunk, db))
+    return preview_rows, stream.columns
+
+
+def import_excel_stream(
+    source: BinaryIO,
+    mode: ImportMode,
+    db: Session,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Streaming version of parse_excel + execute_import.
+    
+    Rows are imported and committed `chunk_size` at a time, so memory use does
+    not depend on the size of the workbook. If a chunk fails, the previous
+    ones stay imported. `progress(done, total)` is called after each chunk.
+    """
+    stream = ExcelStream(source)
+    result = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': [], 'total_processed': 0}
+    done = 0
+    
+    for chunk in stream.chunks(chunk_size):
+        try:
+            chunk_result = execute_import(chunk, mode, db)
+        except ValueError as e:
+            raise ValueError(
+                f"{str(e)} (lignes {chunk[0]['row_number']} à {chunk[-1]['row_number']}, "
+                f"{done} lignes déjà importées)"
+            )
+        for key in ('created', 'updated', 'skipped', 'total_processed'):
+            result[key] += chunk_result[key]
+        result['errors'].extend(chunk_result['errors'])
         
-        parsed_rows.append(row_data)
+        done += len(chunk)
+        logger.info(f"Excel import: {done}/{stream.total_rows} rows")
+        if progress:
+            progress(done, stream.total_rows)
     
-    return parsed_rows, list(df.columns)
+    return result
 
 
 def validate_and_preview(
-    parsed_rows: List[Dict[str, Any]], 
-    db: Session
+    parsed_rows: Sequence[Dict[str, Any]], 
+    db: Session,
+    key_lookup: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Validate rows and check for existing references.
     Key Logic matches execute_import: Order + Batch.
-    """
-    # Map existing shipments by (order_number, batch_number)
-    existing_shipments_map = {}
-    all_shipments = db.query(Shipment).all()
     
-    for s in all_shipments:
-        order_key = str(s.order_number).strip() if s.order_number else None
-        batch_key = _normalize_batch(s.batch_number)
-        
-        if order_key:
-             existing_shipments_map[(order_key, batch_key)] = True
+    With the unique import key index (PostgreSQL), only the keys found in the
+    file are looked up, in one query; otherwise every shipment is loaded.
+    """
+    if key_lookup and _bulk_upsert_available(db):
+        key_of = _import_key
+        existing_keys = _lookup_existing_keys(
+            {_import_key(r['data']['order_number'], r['data'].get('batch_number'))
+             for r in parsed_rows if r.get('data', {}).get('order_number')},
+            db
+        )
+    else:
+        key_of = lambda order, batch: (str(order).strip(), _normalize_batch(batch))
+        existing_keys = _scan_existing_keys(db)
     
     preview_rows = []
     
@@ -287,13 +845,10 @@ def validate_and_preview(
         row_order = row.get('data', {}).get('order_number')
         row_batch = row.get('data', {}).get('batch_number')
         
-        lookup_order = str(row_order).strip() if row_order else None
-        lookup_batch = _normalize_batch(row_batch)
-        lookup_key = (lookup_order, lookup_batch)
-        
         exists = False
-        if lookup_order:
-             exists = lookup_key in existing_shipments_map
+        if row_order:
+            lookup_key = key_of(row_order, row_batch)
+            exists = bool(lookup_key[0]) and lookup_key in existing_keys
         
         preview_row = {
             'row_number': row['row_number'],
@@ -309,6 +864,59 @@ def validate_and_preview(
     return preview_rows
 
 
+def _scan_existing_keys(db: Session) -> set:
+    """Keys (order_number, batch_number) of every shipment in the database."""
+    existing_keys = set()
+    all_shipments = db.query(Shipment).all()
+    
+    for s in all_shipments:
+        order_key = str(s.order_number).strip() if s.order_number else None
+        batch_key = _normalize_batch(s.batch_number)
+        
+        if order_key:
+             existing_keys.add((order_key, batch_key))
+    
+    return existing_keys
+
+
+def _lookup_existing_keys(keys: set, db: Session) -> set:
+    """
+    Return the subset of `keys` already present in the database.
+    The keys are sent as two arrays and matched against the unique import key
+    index, so only matching keys come back whatever the size of the table.
+    """
+    if not keys:
+        return set()
+    
+    keys = list(keys)
+    incoming = func.unnest(
+        cast([k[0] for k in keys], ARRAY(Text)),
+        cast([k[1] for k in keys], ARRAY(Text))
+    ).table_valued('order_key', 'batch_key').render_derived(name='incoming')
+    
+    order_expr, batch_expr = shipment_import_key_index.expressions
+    stmt = select(incoming.c.order_key, incoming.c.batch_key).where(
+        select(Shipment.id).where(
+            order_expr == incoming.c.order_key,
+            batch_expr.is_not_distinct_from(incoming.c.batch_key),
+            shipment_import_key_index.dialect_options['postgresql']['where']
+        ).exists()
+    )
+    return {(r.order_key, r.batch_key) for r in db.execute(stmt)}
+
+
+def find_existing_keys(keys: set, db: Session) -> set:
+    """Subset of import keys (see _import_key) that match an existing shipment."""
+    if _bulk_upsert_available(db):
+        return _lookup_existing_keys(keys, db)
+    existing = {
+        _import_key(order, batch)
+        for order, batch in db.query(Shipment.order_number, Shipment.batch_number)
+        if order
+    }
+    return keys & existing
+
+
 def _normalize_batch(batch_val: Any) -> Optional[str]:
     """Normalize batch value to string, handling float integers."""
     if batch_val is None:
@@ -321,13 +929,30 @@ def _normalize_batch(batch_val: Any) -> Optional[str]:
         return str(batch_val).strip()
 
 def execute_import(
-    parsed_rows: List[Dict[str, Any]],
+    parsed_rows: Sequence[Dict[str, Any]],
     mode: ImportMode,
-    db: Session
+    db: Session,
+    bulk: bool = True
 ) -> Dict[str, Any]:
     """
     Execute the import with the given mode.
     Key Logic: Update existing by (Order number + Batch), Create otherwise.
+    
+    Uses the set-based PostgreSQL engine when available (and `bulk` is set),
+    the ORM row-by-row engine otherwise. Both return the same counters.
+    """
+    if bulk and _bulk_upsert_available(db):
+        return _execute_import_bulk(parsed_rows, mode, db)
+    return _execute_import_orm(parsed_rows, mode, db)
+
+
+def _execute_import_orm(
+    parsed_rows: Sequence[Dict[str, Any]],
+    mode: ImportMode,
+    db: Session
+) -> Dict[str, Any]:
+    """
+    Row-by-row import through the ORM (any database).
     """
     created = 0
     updated = 0
@@ -352,6 +977,9 @@ def execute_import(
     # Track processed in this batch to handle duplicates within the file itself
     # If file has 2 rows for same shipment, second one should UPDATE the first one (which might be new)
     
+    # Shipments switching to TRANSIT_OCEAN, their LOADING alerts are closed in one UPDATE
+    transitions = set()
+    
     for row in parsed_rows:
         if row.get('error'):
             errors.append({
@@ -403,10 +1031,8 @@ def execute_import(
                 
                 # Alert Logic
                 if new_status == "TRANSIT_OCEAN" and old_status != "TRANSIT_OCEAN":
-                    # Close "LOADING" alerts
-                    for alert in existing.alerts:
-                        if alert.active and "LOADING" in alert.type:
-                             alert.active = False
+                    # Close "LOADING" alerts (after the loop)
+                    transitions.add(existing.id)
                     
                     # Create DELAY alert check
                     if existing.planned_eta and existing.planned_eta.date() < datetime.now().date():
@@ -456,6 +1082,13 @@ def execute_import(
             })
     
     try:
+        if transitions:
+            from ..models import Alert
+            db.execute(
+                update(Alert)
+                .where(Alert.shipment_id.in_(list(transitions)), Alert.active == True, Alert.type.contains("LOADING"))
+                .values(active=False)
+            )
         db.commit()
     except Exception as e:
         db.rollback()
@@ -468,3 +1101,286 @@ def execute_import(
         'errors': errors,
         'total_processed': created + updated + skipped + len(errors)
     }
+
+
+# --- Bulk import engine (PostgreSQL) ---
+
+_STAGE_TABLE = "shipments_import_stage"
+
+# Columns the import writes: everything parse_excel produces that is a Shipment column
+_IMPORT_COLUMNS = [
+    c.name for c in Shipment.__table__.columns
+    if c.name in set(_FIELD_SOURCES) | {'reference', 'origin', 'destination', 'status', 'created_at'}
+]
+
+# Set on creation only, never overwritten by an update
+_INSERT_ONLY_COLUMNS = {'reference', 'created_at'}
+
+# Status given to created shipments when the file doesn't provide one
+DEFAULT_IMPORT_STATUS = 'CREATED'
+
+# Values filled in on creation when the file leaves the column empty
+# (the ORM omits None values from INSERTs, so column defaults apply)
+_INSERT_DEFAULTS = {
+    c.name: c.default.arg for c in Shipment.__table__.columns
+    if c.name in _IMPORT_COLUMNS and c.default is not None and c.default.is_scalar
+}
+_INSERT_DEFAULTS['status'] = DEFAULT_IMPORT_STATUS
+
+
+def _bulk_upsert_available(db: Session) -> bool:
+    """The bulk engine needs PostgreSQL and the unique (order, batch) index."""
+    if db.get_bind().dialect.name != 'postgresql':
+        return False
+    found = db.execute(
+        text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+        {"table": Shipment.__tablename__, "index": shipment_import_key_index.name}
+    ).first()
+    return found is not None
+
+
+def _import_key(order: Any, batch: Any) -> Tuple[str, Optional[str]]:
+    """(order, batch) key trimmed the same way as the unique index."""
+    batch_key = None
+    if batch is not None:
+        batch_key = _normalize_batch(batch) if isinstance(batch, float) else str(batch).strip(IMPORT_KEY_TRIM_CHARS)
+    return str(order).strip(IMPORT_KEY_TRIM_CHARS), batch_key
+
+
+def _execute_import_bulk(
+    parsed_rows: Sequence[Dict[str, Any]],
+    mode: ImportMode,
+    db: Session
+) -> Dict[str, Any]:
+    """
+    Set-based import: rows are merged per (order, batch) key in Python, staged
+    in a temp table with one COPY, then created/updated with a single
+    INSERT ... ON CONFLICT statement against the unique import key index.
+    Values left empty in the file never overwrite existing data, as in the
+    row-by-row engine.
+    """
+    created = 0
+    updated = 0
+    skipped = 0
+    errors = []
+    now = datetime.now()
+    
+    # 1. Validate and merge rows sharing the same key (file order is kept:
+    #    later rows update what earlier ones set, like sequential updates)
+    staged: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+    # (status, planned_eta) of each row, for the alert logic
+    occurrences: Dict[Tuple[str, Optional[str]], List[Tuple[Optional[str], Any]]] = {}
+    
+    for row in parsed_rows:
+        if row.get('error'):
+            errors.append({
+                'row': row['row_number'],
+                'reference': row.get('reference'),
+                'error': row['error']
+            })
+            continue
+        
+        data = row['data']
+        row_order = data.get('order_number')
+        if not row_order:
+            errors.append({
+                'row': row['row_number'],
+                'reference': None,
+                'error': 'Order number manquant (requis pour identification)'
+            })
+            continue
+        
+        key = _import_key(row_order, data.get('batch_number'))
+        
+        if key not in staged:
+            record = {col: data.get(col) for col in _IMPORT_COLUMNS}
+            reference = row.get('reference')
+            if not reference:
+                reference = f"{key[0]}-{key[1]}" if key[1] else key[0]
+            record['reference'] = reference
+            record['created_at'] = now
+            staged[key] = record
+            occurrences[key] = [(data.get('status'), data.get('planned_eta'))]
+        else:
+            occurrences[key].append((data.get('status'), data.get('planned_eta')))
+            if mode == ImportMode.UPDATE_OR_CREATE:
+                record = staged[key]
+                for col in _IMPORT_COLUMNS:
+                    value = data.get(col)
+                    if value is not None and col not in _INSERT_ONLY_COLUMNS:
+                        record[col] = value
+    
+    if not staged:
+        return {
+            'created': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': errors,
+            'total_processed': len(errors)
+        }
+    
+    # Keys that may switch to TRANSIT_OCEAN (alert handling below)
+    transit_keys = set()
+    if mode == ImportMode.UPDATE_OR_CREATE:
+        transit_keys = {k for k, occ in occurrences.items() if any(st == 'TRANSIT_OCEAN' for st, _ in occ)}
+    
+    try:
+        conn = db.connection()
+        
+        # 2. Stage rows in a temp table with a single COPY
+        dialect = conn.dialect
+        column_defs = ", ".join(
+            f"{col} {Shipment.__table__.c[col].type.compile(dialect=dialect)}" for col in _IMPORT_COLUMNS
+        )
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS pg_temp.{_STAGE_TABLE}")
+        conn.exec_driver_sql(
+            f"CREATE TEMP TABLE {_STAGE_TABLE} ({column_defs}, transit_candidate BOOLEAN) ON COMMIT DROP"
+        )
+        
+        copy_columns = ", ".join(_IMPORT_COLUMNS + ['transit_candidate'])
+        with conn.connection.cursor() as cursor:
+            with cursor.copy(f"COPY {_STAGE_TABLE} ({copy_columns}) FROM STDIN") as copy:
+                for key, record in staged.items():
+                    copy.write_row([record[col] for col in _IMPORT_COLUMNS] + [key in transit_keys])
+        
+        stage = table(
+            _STAGE_TABLE,
+            *[column(col, Shipment.__table__.c[col].type) for col in _IMPORT_COLUMNS],
+            column('transit_candidate', Boolean)
+        )
+        shipments = Shipment.__table__
+        index_where = shipment_import_key_index.dialect_options['postgresql']['where']
+        
+        # Current status/ETA of existing shipments that may switch to transit
+        previous = {}
+        if transit_keys:
+            trim = lambda col: func.trim(col, literal_column("'" + IMPORT_KEY_TRIM_CHARS + "'"))
+            rows = db.execute(
+                select(stage.c.order_number, stage.c.batch_number, shipments.c.status, shipments.c.planned_eta)
+                .select_from(stage.join(
+                    shipments,
+                    and_(
+                        trim(shipments.c.order_number) == trim(stage.c.order_number),
+                        trim(shipments.c.batch_number).is_not_distinct_from(trim(stage.c.batch_number)),
+                        index_where
+                    )
+                ))
+                .where(stage.c.transit_candidate)
+            )
+            previous = {_import_key(r.order_number, r.batch_number): (r.status, r.planned_eta) for r in rows}
+        
+        # 3. Create and update in one statement
+        stmt = pg_insert(shipments).from_select(_IMPORT_COLUMNS, select(*[stage.c[col] for col in _IMPORT_COLUMNS]))
+        
+        if mode == ImportMode.CREATE_ONLY:
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=shipment_import_key_index.expressions,
+                index_where=index_where
+            )
+        else:
+            set_ = {
+                col: func.coalesce(stmt.excluded[col], shipments.c[col])
+                for col in _IMPORT_COLUMNS
+                if col not in _INSERT_ONLY_COLUMNS
+            }
+            stmt = stmt.on_conflict_do_update(
+                index_elements=shipment_import_key_index.expressions,
+                index_where=index_where,
+                set_=set_
+            )
+        
+        stmt = stmt.returning(
+            shipments.c.id,
+            shipments.c.reference,
+            shipments.c.order_number,
+            shipments.c.batch_number,
+            shipments.c.planned_eta,
+            shipments.c.created_at,
+            literal_column("xmax = 0").label("inserted")
+        )
+        returned = {_import_key(r.order_number, r.batch_number): r for r in db.execute(stmt)}
+        
+        # Defaults for what the file left empty on created shipments
+        created_ids = [r.id for r in returned.values() if r.inserted]
+        if created_ids:
+            for col, default in _INSERT_DEFAULTS.items():
+                db.execute(
+                    update(shipments)
+                    .where(shipments.c.id.in_(created_ids), shipments.c[col].is_(None))
+                    .values({col: default})
+                )
+        
+        record_outbox(db, SHIPMENT_CREATED, created_ids)
+        
+        # 4. Counters, per occurrence in the file
+        for key, occ in occurrences.items():
+            result = returned.get(key)
+            if result is not None and result.inserted:
+                created += 1
+            elif mode == ImportMode.CREATE_ONLY:
+                skipped += 1
+            else:
+                updated += 1
+            
+            if mode == ImportMode.CREATE_ONLY:
+                skipped += len(occ) - 1
+            else:
+                updated += len(occ) - 1
+        
+        # 5. Alert Logic: replay each row's update of the shipments switching to TRANSIT_OCEAN
+        transitions = {}
+        for key in transit_keys:
+            result = returned.get(key)
+            if result is None:
+                continue
+            if key in previous:
+                (status, eta), sequence = previous[key], occurrences[key]
+            else:
+                (status, eta), sequence = occurrences[key][0], occurrences[key][1:]
+                status = status or DEFAULT_IMPORT_STATUS
+            etas = []
+            for new_status, new_eta in sequence:
+                if new_eta is not None:
+                    eta = new_eta
+                if new_status == "TRANSIT_OCEAN" and status != "TRANSIT_OCEAN":
+                    etas.append(eta)
+                if new_status is not None:
+                    status = new_status
+            if etas:
+                transitions[result.id] = etas
+        
+        if transitions:
+            from ..models import Alert
+            # Close "LOADING" alerts
+            db.execute(
+                update(Alert)
+                .where(Alert.shipment_id.in_(list(transitions)), Alert.active == True, Alert.type.contains("LOADING"))
+                .values(active=False)
+            )
+            # Create DELAY alert check
+            today = datetime.now().date()
+            for shipment_id, etas in transitions.items():
+                for eta in etas:
+                    if eta and eta.date() < today:
+                        db.add(Alert(
+                            shipment_id=shipment_id,
+                            type="DELAY",
+                            severity="HIGH",
+                            message=f"Expédition en transit mais ETA dépassée ({eta.strftime('%d/%m/%Y')})",
+                            active=True
+                        ))
+        
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise ValueError(f"Erreur commit: {str(e)}")
+    
+    notify_bulk_import([r.id for r in returned.values()], created_ids)
+    
+    return {
+        'created': created,
+        'updated': updated,
+        'skipped': skipped,
+        'errors': errors,
+        'total_processed': created + updated + skipped + len(errors)
+    }
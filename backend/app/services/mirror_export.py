@@ -0,0 +1,239 @@
+"""
+Mirror Export Service
+Keeps shipments_mirror.csv (simulated write-back to the Master File) in sync
+with the shipments table.
+
+Shipment IDs touched by a flush are collected on the session and handed over
+when it commits, so a transaction costs one export however many rows it
+changed; a rolled back transaction costs none. A background thread exports at
+most once per MIRROR_EXPORT_DEBOUNCE_SECONDS, into a temp file renamed over
+the mirror, so readers never see a half-written file.
+
+With MIRROR_EXPORT_MODE=patch only the changed rows are read back from the
+database and merged into the existing mirror (kept sorted by id). The default
+"full" mode streams the whole table.
+"""
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..database import BackgroundSessionLocal, SessionLocal
+from ..models import Shipment
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PATH = os.getenv("MIRROR_EXPORT_PATH", os.path.join(os.getcwd(), "shipments_mirror.csv"))
+MIRROR_EXPORT_DEBOUNCE_SECONDS = float(os.getenv("MIRROR_EXPORT_DEBOUNCE_SECONDS", "2"))
+MIRROR_EXPORT_MODE = os.getenv("MIRROR_EXPORT_MODE", "full") # full, patch
+MIRROR_FETCH_SIZE = 1000
+
+_SESSION_KEY = "mirror_dirty_shipments"
+
+
+class _UnsortedMirror(Exception):
+    """The existing mirror is not sorted by id and cannot be patched."""
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+class MirrorExporter:
+    def __init__(self, path: str, debounce: float, mode: str = "full"):
+        self.path = path
+        self.debounce = debounce
+        self.mode = mode
+        self.columns = [c.name for c in Shipment.__table__.columns]
+        self._cond = threading.Condition()
+        self._export_lock = threading.Lock()
+        self._dirty: Set[int] = set()
+        self._full = False
+        self._due: Optional[float] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def schedule(self, shipment_ids: Optional[Iterable[int]] = None):
+        """
+        Export the changes to `shipment_ids` (None: the whole table) within
+        the debounce delay. Changes arriving meanwhile join the same export.
+        """
+        with self._cond:
+            if shipment_ids is None:
+                self._full = True
+            else:
+                self._dirty.update(shipment_ids)
+            if not self._full and not self._dirty:
+                return
+            if self._due is None:
+                self._due = time.monotonic() + self.debounce
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="mirror-export", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def flush(self):
+        """Run the pending export now (e.g. on shutdown)."""
+        with self._cond:
+            pending = self._take()
+        if pending:
+            self._export(*pending)
+
+    def _take(self):
+        if not self._full and not self._dirty:
+            return None
+        pending = (self._full, self._dirty)
+        self._full, self._dirty, self._due = False, set(), None
+        return pending
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._due is None:
+                    self._cond.wait()
+                delay = self._due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                pending = self._take()
+            if pending:
+                self._export(*pending)
+
+    def _export(self, full: bool, shipment_ids: Set[int]):
+        with self._export_lock:
+            db = BackgroundSessionLocal()
+            try:
+                start = time.perf_counter()
+                if not full and self.mode == "patch" and self._patch(db, shipment_ids):
+                    logger.info(
+                        f"Mirror CSV patched ({len(shipment_ids)} shipments) in "
+                        f"{time.perf_counter() - start:.2f}s: {self.path}"
+                    )
+                else:
+                    self._write(self._fetch(db))
+                    logger.info(f"Mirror CSV exported in {time.perf_counter() - start:.2f}s: {self.path}")
+            except Exception as e:
+                logger.error(f"Mirror export failed: {e}")
+            finally:
+                db.close()
+
+    def _fetch(self, db: Session, shipment_ids: Optional[List[int]] = None) -> Iterator[List[str]]:
+        """Formatted shipment rows ordered by id, streamed from the database."""
+        shipments = Shipment.__table__
+        stmt = select(shipments).order_by(shipments.c.id)
+        if shipment_ids is not None:
+            stmt = stmt.where(shipments.c.id.in_(shipment_ids))
+        result = db.execute(stmt.execution_options(yield_per=MIRROR_FETCH_SIZE))
+        for row in result:
+            yield [_csv_value(value) for value in row]
+
+    def _write(self, rows: Iterable[List[str]]):
+        """Write the mirror to a temp file in the same directory, then rename it over."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".shipments_mirror.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.columns)
+                writer.writerows(rows)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _patch(self, db: Session, shipment_ids: Set[int]) -> bool:
+        """
+        Merge the current rows of `shipment_ids` into the existing mirror.
+        Returns False when the mirror must be exported in full instead
+        (missing, other columns, not sorted by id).
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        ids = sorted(shipment_ids)
+        changed = {}
+        for i in range(0, len(ids), MIRROR_FETCH_SIZE):
+            for row in self._fetch(db, ids[i:i + MIRROR_FETCH_SIZE]):
+                changed[int(row[0])] = row
+
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            if next(reader, None) != self.columns:
+                return False
+            try:
+                self._write(self._merge(reader, shipment_ids, changed))
+            except _UnsortedMirror:
+                return False
+        return True
+
+    @staticmethod
+    def _merge(existing: Iterator[List[str]], shipment_ids: Set[int], changed: dict) -> Iterator[List[str]]:
+        """Existing rows with the changed ones replaced, inserted or dropped, in id order."""
+        pending = iter(sorted(changed.items()))
+        next_id, next_row = next(pending, (None, None))
+        previous_id = None
+        for row in existing:
+            row_id = int(row[0])
+            if previous_id is not None and row_id <= previous_id:
+                raise _UnsortedMirror()
+            previous_id = row_id
+
+            while next_id is not None and next_id < row_id:
+                yield next_row
+                next_id, next_row = next(pending, (None, None))
+            if row_id not in shipment_ids:
+                yield row
+            elif next_id == row_id:
+                yield next_row
+                next_id, next_row = next(pending, (None, None))
+            # else: deleted since the last export
+
+        while next_id is not None:
+            yield next_row
+            next_id, next_row = next(pending, (None, None))
+
+
+mirror_exporter = MirrorExporter(EXPORT_PATH, MIRROR_EXPORT_DEBOUNCE_SECONDS, MIRROR_EXPORT_MODE)
+
+
+# -------------------------------------------------------------------------
+# Session hooks
+# -------------------------------------------------------------------------
+
+def _collect_changed_shipments(session, flush_context):
+    """after_flush: remember the shipments written by this flush."""
+    ids = {
+        obj.id for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, Shipment) and obj.id is not None
+    }
+    if ids:
+        session.info.setdefault(_SESSION_KEY, set()).update(ids)
+
+
+def _export_committed_shipments(session):
+    """after_commit: one export for everything the transaction changed."""
+    ids = session.info.pop(_SESSION_KEY, None)
+    if ids:
+        mirror_exporter.schedule(ids)
+
+
+def _discard_changed_shipments(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def setup_mirror_export(session_factory=SessionLocal):
+    event.listen(session_factory, "after_flush", _collect_changed_shipments)
+    event.listen(session_factory, "after_commit", _export_committed_shipments)
+    event.listen(session_factory, "after_rollback", _discard_changed_shipments)
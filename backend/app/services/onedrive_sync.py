@@ -0,0 +1,171 @@
+"""
+OneDrive Sync Service
+Incremental import of the Master file synced from OneDrive.
+
+A file identical to the last synced one (same SHA-256) is skipped without
+being parsed. Otherwise each (order, batch) key gets a fingerprint of its
+rows, and only keys whose fingerprint changed since the last sync (or whose
+shipment no longer exists) go through execute_import.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, Any, Optional, Tuple
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from ..models import SystemSetting, SyncRowFingerprint
+from .excel_import import ExcelStream, ImportMode, execute_import, find_existing_keys, _import_key
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_KEY = "ONEDRIVE_SYNC_STATE"
+SYNC_LAST_RUN_KEY = "SYNC_LAST_RUN"
+
+
+def _row_key(row: Dict[str, Any]) -> Optional[Tuple[str, Optional[str]]]:
+    """Import key of a parsed row, None for rows the import reports as errors."""
+    data = row.get('data') or {}
+    if row.get('error') or not data.get('order_number'):
+        return None
+    return _import_key(data['order_number'], data.get('batch_number'))
+
+
+def _encode_key(key: Tuple[str, Optional[str]]) -> str:
+    return json.dumps(list(key), ensure_ascii=False)
+
+
+def _load_state(db: Session) -> Dict[str, Any]:
+    s = db.query(SystemSetting).filter(SystemSetting.key == SYNC_STATE_KEY).first()
+    return json.loads(s.value) if s and s.value else {}
+
+
+def _save_state(db: Session, state: Dict[str, Any]):
+    s = db.query(SystemSetting).filter(SystemSetting.key == SYNC_STATE_KEY).first()
+    if not s:
+        s = SystemSetting(key=SYNC_STATE_KEY, value=json.dumps(state), is_encrypted=False)
+        db.add(s)
+    else:
+        s.value = json.dumps(state)
+
+
+def _fingerprint_rows(stream: ExcelStream) -> Tuple[Dict[Tuple[str, Optional[str]], str], Dict[Tuple[str, Optional[str]], int]]:
+    """
+    Hash of the parsed rows of each key (all occurrences, in file order), and
+    the index of the last chunk holding rows of each key.
+    """
+    hashes = {}
+    last_chunk = {}
+    for index, chunk in enumerate(stream.chunks()):
+        for row in chunk:
+            key = _row_key(row)
+            if key is None:
+                continue
+            h = hashes.get(key)
+            if h is None:
+                h = hashes[key] = hashlib.sha1()
+            h.update(repr(sorted(row['data'].items())).encode())
+            last_chunk[key] = index
+    return {key: h.hexdigest() for key, h in hashes.items()}, last_chunk
+
+
+def _store_fingerprints(db: Session, source: str, fingerprints: Dict[Tuple[str, Optional[str]], str]):
+    row_keys = {_encode_key(key): fp for key, fp in fingerprints.items()}
+    db.execute(
+        delete(SyncRowFingerprint).where(
+            SyncRowFingerprint.source == source,
+            SyncRowFingerprint.row_key.in_(list(row_keys))
+        )
+    )
+    db.execute(
+        insert(SyncRowFingerprint),
+        [{'source': source, 'row_key': k, 'fingerprint': fp} for k, fp in row_keys.items()]
+    )
+    db.commit()
+
+
+def sync_workbook(content: bytes, source: str, db: Session, full: bool = False) -> Dict[str, Any]:
+    """
+    Import the synced workbook `content` (OneDrive file `source`) incrementally.
+    `full` ignores the stored hashes and imports every row.
+
+    Returns execute_import counters plus `unchanged` (rows not re-imported)
+    and `file_unchanged`.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    state = _load_state(db)
+
+    if not full and state.get('source') == source and state.get('sha256') == digest:
+        logger.info(f"OneDrive sync: file {source} unchanged, skipped")
+        rows = state.get('rows', 0)
+        return {
+            'created': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': [],
+            'unchanged': rows,
+            'total_processed': rows,
+            'file_unchanged': True
+        }
+
+    stream = ExcelStream(BytesIO(content))
+    fingerprints, last_chunk = _fingerprint_rows(stream)
+
+    unchanged_keys = set()
+    if not full:
+        stored = dict(
+            db.query(SyncRowFingerprint.row_key, SyncRowFingerprint.fingerprint)
+            .filter(SyncRowFingerprint.source == source)
+        )
+        same = {key for key, fp in fingerprints.items() if stored.get(_encode_key(key)) == fp}
+        # A shipment deleted since the last sync is re-created from the file
+        unchanged_keys = find_existing_keys(same, db) if same else set()
+
+    result = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': [], 'unchanged': 0, 'total_processed': 0}
+    for index, chunk in enumerate(stream.chunks()):
+        rows = []
+        for row in chunk:
+            if _row_key(row) in unchanged_keys:
+                result['unchanged'] += 1
+            else:
+                rows.append(row)
+        if not rows:
+            continue
+
+        chunk_result = execute_import(rows, ImportMode.UPDATE_OR_CREATE, db)
+        for key in ('created', 'updated', 'skipped', 'total_processed'):
+            result[key] += chunk_result[key]
+        result['errors'].extend(chunk_result['errors'])
+
+        # Only once all the rows of a key are committed (its last chunk), so the
+        # rows of a failed chunk are retried next time, even for keys spanning
+        # a chunk committed before
+        completed = {key for key in {_row_key(row) for row in rows} - {None} if last_chunk[key] == index}
+        if completed:
+            _store_fingerprints(db, source, {key: fingerprints[key] for key in completed})
+
+    _save_state(db, {'source': source, 'sha256': digest, 'rows': stream.total_rows})
+    db.commit()
+
+    result['total_processed'] += result['unchanged']
+    result['file_unchanged'] = False
+    logger.info(
+        f"OneDrive sync: {result['created']} created, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {len(result['errors'])} errors"
+    )
+    return result
+
+
+def record_last_run(db: Session):
+    """Store the time of the last successful sync (shown on the settings page)."""
+    s = db.query(SystemSetting).filter(SystemSetting.key == SYNC_LAST_RUN_KEY).first()
+    now_str = datetime.now().isoformat()
+    if not s:
+        s = SystemSetting(key=SYNC_LAST_RUN_KEY, value=json.dumps(now_str), is_encrypted=True)
+        db.add(s)
+    else:
+        s.value = json.dumps(now_str)
+    db.commit()
@@ -0,0 +1,150 @@
+"""
+Shipment Listing
+Keyset-paginated, filtered and projected reads of the shipments table for
+GET /shipments/list and /shipments/stats.
+
+Pages are ordered by (sort column, id) and continue from an opaque cursor
+holding the last row's key, so every page costs an index range scan of
+`limit` rows whatever its position (OFFSET reads and throws away every row
+before the page). NULLs come last in ascending order and first in descending
+order, as in the (planned_eta, id) index scanned forwards or backwards; the
+rows with and without a value are read as two segments, each a plain range
+of the index (a page crossing from one to the other runs two queries).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models import Shipment
+from ..schemas import ShipmentSummary
+
+SORT_COLUMNS = ("planned_eta", "planned_etd", "created_at", "reference")
+LISTING_FIELDS = frozenset(ShipmentSummary.model_fields)
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+_DATETIME_SORTS = {"planned_eta", "planned_etd", "created_at"}
+
+
+def _encode_cursor(sort: str, direction: str, value: Any, shipment_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, direction, value, shipment_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, direction: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_direction, value, shipment_id = json.loads(raw)
+        if value is not None and sort in _DATETIME_SORTS:
+            value = datetime.fromisoformat(value)
+        shipment_id = int(shipment_id)
+    except (ValueError, TypeError):
+        raise ValueError("Curseur de pagination invalide")
+    if (cursor_sort, cursor_direction) != (sort, direction):
+        raise ValueError("Le curseur ne correspond pas au tri demandé")
+    return value, shipment_id
+
+
+def _segment(column, nulls: bool, direction: str, after: Optional[Tuple[Any, int]]) -> list:
+    """Conditions for the rows of one segment (NULL or non-NULL `column`) after the key `after`."""
+    if nulls:
+        conditions = [column.is_(None)]
+        if after is not None and after[0] is None:
+            conditions.append(Shipment.id > after[1] if direction == "asc" else Shipment.id < after[1])
+    else:
+        conditions = [column.isnot(None)]
+        if after is not None and after[0] is not None:
+            key = tuple_(column, Shipment.id)
+            conditions.append(key > tuple_(*after) if direction == "asc" else key < tuple_(*after))
+    return conditions
+
+
+def _filters(allowed: Optional[FrozenSet[str]], status: Optional[List[str]] = None,
+             customer: Optional[List[str]] = None, mode: Optional[List[str]] = None,
+             eta_from: Optional[datetime] = None, eta_to: Optional[datetime] = None,
+             rush: Optional[bool] = None) -> list:
+    conditions = []
+    if allowed is not None:
+        conditions.append(Shipment.customer.in_(allowed))
+    if status:
+        conditions.append(Shipment.status.in_(status))
+    if customer:
+        conditions.append(Shipment.customer.in_(customer))
+    if mode:
+        conditions.append(Shipment.transport_mode.in_(mode))
+    if eta_from is not None:
+        conditions.append(Shipment.planned_eta >= eta_from)
+    if eta_to is not None:
+        conditions.append(Shipment.planned_eta < eta_to)
+    if rush is not None:
+        conditions.append(Shipment.rush_status == rush)
+    return conditions
+
+
+def list_shipments(db: Session, allowed: Optional[FrozenSet[str]] = None,
+                   sort: str = "planned_eta", direction: str = "asc",
+                   limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None,
+                   fields: Optional[Iterable[str]] = None,
+                   **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of shipments the user may see (`allowed` customers, None for all),
+    as dicts of `fields` (every listing field by default) plus id.
+    Returns (rows, cursor of the next page or None).
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Tri invalide: {sort} (valeurs possibles: {', '.join(SORT_COLUMNS)})")
+    if direction not in ("asc", "desc"):
+        raise ValueError(f"Ordre invalide: {direction} (asc ou desc)")
+    fields = sorted(LISTING_FIELDS if not fields else set(fields) | {"id"})
+    unknown = set(fields) - LISTING_FIELDS
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(sorted(unknown))}")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    table = Shipment.__table__
+    column = table.c[sort]
+    query = select(*{name: table.c[name] for name in [*fields, sort]}.values()).where(*_filters(allowed, **filters))
+    if direction == "asc":
+        query = query.order_by(column.asc(), table.c.id.asc())
+        segments = [False, True]
+    else:
+        query = query.order_by(column.desc(), table.c.id.desc())
+        segments = [True, False]
+
+    after = _decode_cursor(cursor, sort, direction) if cursor else None
+    if after is not None:
+        # Continue from the cursor's segment
+        segments = segments[segments.index(after[0] is None):]
+
+    rows = []
+    for nulls in segments:
+        segment = _segment(column, nulls, direction, after)
+        rows += db.execute(query.where(*segment).limit(limit + 1 - len(rows))).mappings().all()
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(sort, direction, rows[-1][sort], rows[-1]["id"])
+    return [{name: row[name] for name in fields} for row in rows], next_cursor
+
+
+def shipment_stats(db: Session, allowed: Optional[FrozenSet[str]] = None) -> Dict[str, int]:
+    """Dashboard counters, computed in one aggregate query."""
+    status = Shipment.status
+    in_transit = or_(status.contains("TRANSIT"), status.contains("ON BOARD"), status == "ON_BOARD")
+    row = db.execute(
+        select(
+            func.count(),
+            func.count(case((status == "FINAL_DELIVERY", 1))),
+            func.count(case((in_transit, 1))),
+        ).select_from(Shipment).where(*_filters(allowed))
+    ).one()
+    total, delivered, transit = row
+    return {"total": total, "in_transit": transit, "delivered": delivered, "pending": total - delivered - transit}
@@ -0,0 +1,90 @@
+"""
+SLA Monitor
+Incremental detection of shipments that passed their ETA without final delivery.
+
+Each run only looks at the ETAs crossed since the previous one: the window
+(high-water mark, now] is read through the partial index on the planned_eta
+of non-delivered shipments, and the mark is kept in system_settings
+(SLA_ETA_HIGH_WATER_MARK). The first run takes the whole late backlog.
+Shipments of the window get a DELAY alert unless they already have an active
+one, so a rerun never duplicates alerts, and new alerts are pushed to the
+dashboards of their customer.
+
+An ETA moved into the past (below the mark) is not picked up here; the Excel
+import raises DELAY alerts for those when the shipment goes in transit.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..live import manager
+from ..models import Alert, Shipment, SystemSetting
+
+logger = logging.getLogger(__name__)
+
+HIGH_WATER_MARK_KEY = "SLA_ETA_HIGH_WATER_MARK"
+
+
+def _lock_high_water_mark(db: Session) -> SystemSetting:
+    """The mark's setting row, locked so that two runs can't overlap."""
+    db.execute(pg_insert(SystemSetting).values(key=HIGH_WATER_MARK_KEY, value=None).on_conflict_do_nothing())
+    return db.query(SystemSetting).filter(SystemSetting.key == HIGH_WATER_MARK_KEY).with_for_update().one()
+
+
+def detect_sla_violations(db: Session) -> List[Dict[str, Any]]:
+    """Raise DELAY alerts for the ETAs crossed since the last run and commit. Returns the new alerts."""
+    mark = _lock_high_water_mark(db)
+    now = db.scalar(select(func.now()))
+
+    window = [Shipment.status != "FINAL_DELIVERY", Shipment.planned_eta <= now]
+    if mark.value:
+        window.append(Shipment.planned_eta > datetime.fromisoformat(json.loads(mark.value)))
+    has_active_delay = exists().where(
+        Alert.shipment_id == Shipment.id, Alert.type == "DELAY", Alert.active == True
+    )
+    late = db.execute(
+        select(Shipment.id, Shipment.reference, Shipment.customer, Shipment.planned_eta)
+        .where(*window, ~has_active_delay)
+        .order_by(Shipment.planned_eta)
+    ).all()
+
+    alerts = []
+    if late:
+        rows = [
+            {
+                "shipment_id": s.id,
+                "type": "DELAY",
+                "severity": "HIGH",
+                "message": f"ETA dépassée ({s.planned_eta.strftime('%d/%m/%Y')}) sans livraison finale",
+                "active": True,
+            }
+            for s in late
+        ]
+        created = db.execute(
+            insert(Alert).returning(Alert.id, Alert.shipment_id, Alert.created_at, sort_by_parameter_order=True),
+            rows
+        ).all()
+        for s, row, alert in zip(late, rows, created):
+            alerts.append({
+                "id": alert.id,
+                "shipment_id": s.id,
+                "reference": s.reference,
+                "customer": s.customer,
+                "type": row["type"],
+                "severity": row["severity"],
+                "message": row["message"],
+                "planned_eta": s.planned_eta,
+                "created_at": alert.created_at,
+            })
+
+    mark.value = json.dumps(now.isoformat())
+    db.commit()
+
+    if alerts:
+        manager.publish_alerts(alerts)
+    return alerts
@@ -0,0 +1,184 @@
+"""
+OneDrive Sync Jobs
+In-process queue running OneDrive syncs in a worker thread, so webhook
+notifications are acknowledged at once.
+
+A notification for a file that already has a queued job is merged into it.
+Webhook jobs wait ONEDRIVE_SYNC_DEBOUNCE_SECONDS to absorb bursts, and two
+syncs of the same file start at least ONEDRIVE_SYNC_MIN_INTERVAL_SECONDS
+apart. Manual syncs go through the same queue (without waiting) so that two
+syncs of one file never run at the same time.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from ..database import BackgroundSessionLocal
+
+logger = logging.getLogger(__name__)
+
+ONEDRIVE_SYNC_DEBOUNCE_SECONDS = float(os.getenv("ONEDRIVE_SYNC_DEBOUNCE_SECONDS", "5"))
+ONEDRIVE_SYNC_MIN_INTERVAL_SECONDS = float(os.getenv("ONEDRIVE_SYNC_MIN_INTERVAL_SECONDS", "30"))
+SYNC_JOB_HISTORY = 50
+
+
+class SyncJob:
+    def __init__(self, file_id: str, trigger: str, full: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.file_id = file_id
+        self.trigger = trigger # webhook, manual
+        self.full = full
+        self.status = "queued" # queued, running, done, failed
+        self.notifications = 1 # Requests merged into this job
+        self.created_at = datetime.now(timezone.utc)
+        self.scheduled_at = self.created_at
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._run_at = time.monotonic()
+        self._done = threading.Event()
+
+    def _schedule(self, run_at: float):
+        self._run_at = run_at
+        self.scheduled_at = datetime.now(timezone.utc) + timedelta(seconds=max(run_at - time.monotonic(), 0))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job has run. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "file_id": self.file_id,
+            "trigger": self.trigger,
+            "full": self.full,
+            "status": self.status,
+            "notifications": self.notifications,
+            "created_at": self.created_at,
+            "scheduled_at": self.scheduled_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class SyncJobQueue:
+    def __init__(self, runner: Callable[[SyncJob], Dict[str, Any]], debounce: float, min_interval: float):
+        self._runner = runner
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self._cond = threading.Condition()
+        self._pending: Dict[str, SyncJob] = {} # file_id -> queued job
+        self._running: Optional[SyncJob] = None
+        self._history = deque(maxlen=SYNC_JOB_HISTORY)
+        self._last_start: Dict[str, float] = {}
+        self._worker: Optional[threading.Thread] = None
+
+    def enqueue(self, file_id: str, trigger: str = "webhook", full: bool = False) -> SyncJob:
+        """
+        Queue a sync of `file_id`, or merge into the one already queued.
+        Manual requests run as soon as the worker is free.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if trigger == "manual":
+                run_at = now
+            else:
+                last_start = self._last_start.get(file_id)
+                run_at = now + self.debounce
+                if last_start is not None:
+                    run_at = max(run_at, last_start + self.min_interval)
+
+            job = self._pending.get(file_id)
+            if job:
+                job.notifications += 1
+                job.full = job.full or full
+                if trigger == "manual":
+                    job.trigger = trigger
+                if run_at < job._run_at:
+                    job._schedule(run_at)
+            else:
+                job = SyncJob(file_id, trigger, full)
+                job._schedule(run_at)
+                self._pending[file_id] = job
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="onedrive-sync", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        return next((job for job in self.jobs() if job.id == job_id), None)
+
+    def jobs(self) -> List[SyncJob]:
+        """Queued, running, then finished jobs (most recent first)."""
+        with self._cond:
+            jobs = sorted(self._pending.values(), key=lambda j: j._run_at)
+            if self._running:
+                jobs.append(self._running)
+            jobs.extend(self._history)
+            return jobs
+
+    def _next_job(self) -> SyncJob:
+        with self._cond:
+            while True:
+                job = min(self._pending.values(), key=lambda j: j._run_at, default=None)
+                if job is None:
+                    self._cond.wait()
+                    continue
+                delay = job._run_at - time.monotonic()
+                if delay <= 0:
+                    break
+                self._cond.wait(delay)
+
+            del self._pending[job.file_id]
+            self._running = job
+            self._last_start[job.file_id] = time.monotonic()
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            logger.info(f"OneDrive sync job {job.id} started ({job.trigger}, {job.notifications} requests)")
+            try:
+                job.result = self._runner(job)
+                job.status = "done"
+            except Exception as e:
+                job.error = getattr(e, "detail", None) or str(e)
+                job.status = "failed"
+                logger.error(f"OneDrive sync job {job.id} failed: {job.error}")
+            finally:
+                with self._cond:
+                    job.finished_at = datetime.now(timezone.utc)
+                    self._running = None
+                    self._history.appendleft(job)
+                job._done.set()
+
+
+def _run_sync(job: SyncJob) -> Dict[str, Any]:
+    from .onedrive_client import OneDriveClient
+    from .onedrive_sync import sync_workbook, record_last_run
+
+    db = BackgroundSessionLocal()
+    try:
+        client = OneDriveClient(db)
+        content = asyncio.run(client.download_file(job.file_id))
+        result = sync_workbook(content, job.file_id, db, full=job.full)
+        record_last_run(db)
+        return result
+    finally:
+        db.close()
+
+
+sync_queue = SyncJobQueue(_run_sync, ONEDRIVE_SYNC_DEBOUNCE_SECONDS, ONEDRIVE_SYNC_MIN_INTERVAL_SECONDS)
@@ -0,0 +1,219 @@
+"""
+Webhook Dispatcher
+Delivers outgoing webhooks from one background event loop, instead of a
+thread and a TCP connection per event and subscription.
+
+Deliveries wait in a bounded queue (WEBHOOK_QUEUE_SIZE, overflow is dropped
+and logged) and go out through a single pooled httpx.AsyncClient. Each
+subscription gets at most WEBHOOK_MAX_CONCURRENCY requests in flight; payloads
+waiting for the same subscription are sent together, up to WEBHOOK_BATCH_SIZE
+per request, as {"event": "batch", "count": n, "events": [...]} (a single
+payload is sent as is). Failed requests are retried with exponential backoff,
+then recorded on the subscription (`failure_count`, reset on success, and
+`last_triggered_at`).
+
+`on_done` callbacks passed to submit() run on the dispatcher thread with
+True (delivered), False (given up) or None (dropped, never attempted).
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, update
+
+from ..database import BackgroundSessionLocal
+from ..models import WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "2")) # Per subscription
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "1"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "20"))
+
+
+DoneCallback = Callable[[Optional[bool]], None]
+
+
+@dataclass(frozen=True)
+class WebhookTarget:
+    subscription_id: int
+    url: str
+    secret: Optional[str] = None
+
+
+class WebhookDispatcher:
+    def __init__(self, queue_size: int, max_concurrency: int, batch_size: int,
+                 max_attempts: int, retry_base: float):
+        self.queue_size = queue_size
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending: Dict[WebhookTarget, Deque[Tuple[Dict[str, Any], Optional[DoneCallback]]]] = {}
+        self._in_flight: Dict[WebhookTarget, int] = {}
+        self._idle: Optional[asyncio.Event] = None
+
+    def submit(self, target: WebhookTarget, payload: Dict[str, Any], on_done: Optional[DoneCallback] = None):
+        """Queue `payload` for `target`. Never blocks: drops it if the queue is full."""
+        loop = self._ensure_started()
+        loop.call_soon_threadsafe(self._put, target, payload, on_done)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued webhook is delivered or given up. False on timeout."""
+        if self._loop is None:
+            return True
+        future = asyncio.run_coroutine_threadsafe(self._wait_idle(), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except TimeoutError:
+            future.cancel()
+            return False
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run, args=(started,), name="webhook-dispatcher", daemon=True
+                )
+                self._thread.start()
+                started.wait()
+            return self._loop
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._client = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=WEBHOOK_MAX_CONNECTIONS, max_keepalive_connections=WEBHOOK_MAX_CONNECTIONS),
+            headers={"Content-Type": "application/json", "User-Agent": "BBOXL-Webhook/1.0"},
+        )
+        self._loop.create_task(self._consume())
+        started.set()
+        self._loop.run_forever()
+
+    def _put(self, target: WebhookTarget, payload: Dict[str, Any], on_done: Optional[DoneCallback]):
+        try:
+            self._queue.put_nowait((target, payload, on_done))
+            self._idle.clear()
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Webhook queue full, dropped {payload.get('event')} for {target.url}")
+            _notify([on_done], None)
+
+    async def _wait_idle(self):
+        await self._idle.wait()
+
+    def _check_idle(self):
+        if self._queue.empty() and not any(self._pending.values()) and not any(self._in_flight.values()):
+            self._idle.set()
+
+    async def _consume(self):
+        while True:
+            target, payload, on_done = await self._queue.get()
+            self._pending.setdefault(target, deque()).append((payload, on_done))
+            # Let a burst pile up before starting senders, so it leaves in batches
+            while not self._queue.empty():
+                target, payload, on_done = self._queue.get_nowait()
+                self._pending.setdefault(target, deque()).append((payload, on_done))
+            for target in list(self._pending):
+                self._start_senders(target)
+
+    def _start_senders(self, target: WebhookTarget):
+        pending = self._pending[target]
+        while pending and self._in_flight.get(target, 0) < self.max_concurrency:
+            batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+            self._in_flight[target] = self._in_flight.get(target, 0) + 1
+            self._loop.create_task(self._send(target, batch))
+        if not pending:
+            del self._pending[target]
+
+    async def _send(self, target: WebhookTarget, batch: List[Tuple[Dict[str, Any], Optional[DoneCallback]]]):
+        payloads = [payload for payload, _ in batch]
+        ok = False
+        try:
+            body = payloads[0] if len(payloads) == 1 else {"event": "batch", "count": len(payloads), "events": payloads}
+            headers = {"X-Hub-Signature": target.secret} if target.secret else {} # simplistic signature
+            ok = await self._post(target.url, body, headers)
+            await asyncio.to_thread(_record_delivery, target.subscription_id, ok)
+        except Exception as e:
+            logger.error(f"Webhook delivery to {target.url} crashed: {e}")
+        finally:
+            _notify([on_done for _, on_done in batch], ok)
+            self._in_flight[target] -= 1
+            if not self._in_flight[target]:
+                del self._in_flight[target]
+            if target in self._pending:
+                self._start_senders(target)
+            self._check_idle()
+
+    async def _post(self, url: str, body: Dict[str, Any], headers: Dict[str, str]) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = await self._client.post(url, json=body, headers=headers)
+                if response.is_success:
+                    logger.info(f"Webhook sent to {url} | Status: {response.status_code}")
+                    return True
+                error = f"status {response.status_code}"
+                retry = response.status_code == 429 or response.status_code >= 500
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+                retry = True
+
+            if not retry or attempt == self.max_attempts:
+                logger.error(f"Webhook failed for {url} after {attempt} attempts: {error}")
+                return False
+            delay = self.retry_base * 2 ** (attempt - 1)
+            logger.warning(f"Webhook to {url} failed ({error}), retry in {delay:g}s")
+            await asyncio.sleep(delay)
+        return False
+
+
+def _notify(callbacks: List[Optional[DoneCallback]], ok: Optional[bool]):
+    for on_done in callbacks:
+        if on_done is None:
+            continue
+        try:
+            on_done(ok)
+        except Exception as e:
+            logger.error(f"Webhook on_done callback failed: {e}")
+
+
+def _record_delivery(subscription_id: int, ok: bool):
+    values = {"last_triggered_at": datetime.now(timezone.utc)}
+    if ok:
+        values["failure_count"] = 0
+    else:
+        values["failure_count"] = func.coalesce(WebhookSubscription.failure_count, 0) + 1
+    db = BackgroundSessionLocal()
+    try:
+        db.execute(update(WebhookSubscription).where(WebhookSubscription.id == subscription_id).values(values))
+        db.commit()
+    finally:
+        db.close()
+
+
+webhook_dispatcher = WebhookDispatcher(
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_MAX_CONCURRENCY, WEBHOOK_BATCH_SIZE,
+    WEBHOOK_MAX_ATTEMPTS, WEBHOOK_RETRY_BASE_SECONDS
+)
@@ -0,0 +1,226 @@
+"""
+Webhook Outbox
+Transactional outbox for the event.created and shipment.created webhooks.
+
+New Events and Shipments are recorded in webhook_outbox by the flush that
+inserts them (one statement per flush), so nothing is announced for a
+transaction that rolls back. After commit the relay claims pending rows in
+batches of WEBHOOK_OUTBOX_BATCH_SIZE, builds the payloads from the committed
+rows, and hands them to the webhook dispatcher. A row is deleted once every
+subscription got it (or the dispatcher gave up); rows of a crashed or
+overloaded process are claimed again when their lease expires. Delivery is
+therefore at least once: receivers can deduplicate with the payload's
+`sequence` (outbox id, increasing).
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..database import BackgroundSessionLocal, SessionLocal
+from ..models import Event, Shipment, WebhookOutbox
+from .webhook_dispatcher import webhook_dispatcher
+from .webhook_routing import webhook_routes
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_OUTBOX_BATCH_SIZE = int(os.getenv("WEBHOOK_OUTBOX_BATCH_SIZE", "500"))
+WEBHOOK_OUTBOX_POLL_SECONDS = float(os.getenv("WEBHOOK_OUTBOX_POLL_SECONDS", "30"))
+WEBHOOK_OUTBOX_LEASE_SECONDS = float(os.getenv("WEBHOOK_OUTBOX_LEASE_SECONDS", "300"))
+
+EVENT_CREATED = "event.created"
+SHIPMENT_CREATED = "shipment.created"
+
+_SESSION_KEY = "webhook_outbox_written"
+
+
+def record_outbox(db: Session, topic: str, entity_ids: Iterable[int]):
+    """Add outbox rows in the current transaction of `db`."""
+    rows = [{"topic": topic, "entity_id": entity_id} for entity_id in entity_ids]
+    if rows:
+        db.connection().execute(insert(WebhookOutbox.__table__), rows)
+        db.info[_SESSION_KEY] = True
+
+
+def _event_payloads(db: Session, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    rows = db.query(Event.id, Event.type, Event.shipment_id, Event.timestamp, Event.payload).filter(Event.id.in_(ids))
+    return {
+        r.id: {
+            "event": EVENT_CREATED,
+            "type": r.type,
+            "shipment_id": r.shipment_id,
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+            "data": r.payload
+        }
+        for r in rows
+    }
+
+
+def _shipment_payloads(db: Session, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    rows = db.query(Shipment.id, Shipment.reference, Shipment.created_at).filter(Shipment.id.in_(ids))
+    return {
+        r.id: {
+            "event": SHIPMENT_CREATED,
+            "shipment_id": r.id,
+            "reference": r.reference,
+            "timestamp": r.created_at.isoformat() if r.created_at else None
+        }
+        for r in rows
+    }
+
+
+_PAYLOAD_BUILDERS = {
+    EVENT_CREATED: _event_payloads,
+    SHIPMENT_CREATED: _shipment_payloads,
+}
+
+
+class OutboxRelay:
+    def __init__(self, batch_size: int, poll_interval: float, lease: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_in_flight = 4 * batch_size
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._remaining: Dict[int, int] = {} # outbox id -> deliveries not finished
+        self._delivered: List[int] = []
+
+    def wake(self):
+        """Drain the outbox now (called after a commit that wrote to it)."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="webhook-outbox", daemon=True)
+                self._worker.start()
+        self._wake.set()
+
+    def _work(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                # Stop while the dispatcher still has plenty to send; deliveries wake us up
+                while len(self._remaining) < self.max_in_flight and self.drain() == self.batch_size:
+                    pass
+                self._delete_delivered()
+            except Exception as e:
+                logger.error(f"Webhook outbox relay failed: {e}")
+
+    def drain(self) -> int:
+        """Claim and dispatch one batch. Returns the number of rows claimed."""
+        self._delete_delivered()
+        db = BackgroundSessionLocal()
+        try:
+            claimable = (
+                select(WebhookOutbox.id)
+                .where(or_(WebhookOutbox.locked_until.is_(None), WebhookOutbox.locked_until < func.now()))
+                .order_by(WebhookOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = db.execute(
+                update(WebhookOutbox)
+                .where(WebhookOutbox.id.in_(claimable.scalar_subquery()))
+                .values(locked_until=func.now() + timedelta(seconds=self.lease))
+                .returning(WebhookOutbox.id, WebhookOutbox.topic, WebhookOutbox.entity_id)
+            ).all()
+            db.commit()
+            if not claimed:
+                return 0
+
+            payloads = {}
+            for topic, builder in _PAYLOAD_BUILDERS.items():
+                ids = [r.entity_id for r in claimed if r.topic == topic]
+                if ids:
+                    payloads[topic] = builder(db, ids)
+        finally:
+            db.close()
+
+        for row in sorted(claimed, key=lambda r: r.id):
+            payload = payloads.get(row.topic, {}).get(row.entity_id)
+            # Entity deleted since, or unknown topic: nothing left to announce
+            targets = webhook_routes.targets(payload["type"] if row.topic == EVENT_CREATED else row.topic) if payload else ()
+            if not targets:
+                self._done(row.id)
+                continue
+            with self._lock:
+                self._remaining[row.id] = len(targets)
+            payload = {**payload, "sequence": row.id}
+            for target in targets:
+                webhook_dispatcher.submit(target, payload, on_done=partial(self._delivery_done, row.id))
+
+        logger.info(f"Webhook outbox: {len(claimed)} rows dispatched")
+        return len(claimed)
+
+    def _delivery_done(self, outbox_id: int, ok: Optional[bool]):
+        with self._lock:
+            if outbox_id not in self._remaining:
+                return
+            if ok is None:
+                # Dropped by the dispatcher: leave the row to be claimed again
+                del self._remaining[outbox_id]
+                return
+            self._remaining[outbox_id] -= 1
+            if self._remaining[outbox_id]:
+                return
+            del self._remaining[outbox_id]
+            self._delivered.append(outbox_id)
+            if len(self._delivered) < self.batch_size:
+                return
+        self._wake.set()
+
+    def _done(self, outbox_id: int):
+        with self._lock:
+            self._delivered.append(outbox_id)
+
+    def _delete_delivered(self):
+        with self._lock:
+            ids, self._delivered = self._delivered, []
+        if not ids:
+            return
+        db = BackgroundSessionLocal()
+        try:
+            db.execute(delete(WebhookOutbox).where(WebhookOutbox.id.in_(ids)))
+            db.commit()
+        except Exception:
+            with self._lock:
+                self._delivered.extend(ids)
+            raise
+        finally:
+            db.close()
+
+
+outbox_relay = OutboxRelay(WEBHOOK_OUTBOX_BATCH_SIZE, WEBHOOK_OUTBOX_POLL_SECONDS, WEBHOOK_OUTBOX_LEASE_SECONDS)
+
+
+# -------------------------------------------------------------------------
+# Session hooks
+# -------------------------------------------------------------------------
+
+def _record_new_entities(session, flush_context):
+    """after_flush: one outbox row per Event / Shipment this flush inserted."""
+    events = [obj.id for obj in session.new if isinstance(obj, Event)]
+    shipments = [obj.id for obj in session.new if isinstance(obj, Shipment)]
+    record_outbox(session, EVENT_CREATED, events)
+    record_outbox(session, SHIPMENT_CREATED, shipments)
+
+
+def _relay_after_commit(session):
+    if session.info.pop(_SESSION_KEY, None):
+        outbox_relay.wake()
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def setup_webhook_outbox(session_factory=SessionLocal):
+    event.listen(session_factory, "after_flush", _record_new_entities)
+    event.listen(session_factory, "after_commit", _relay_after_commit)
+    event.listen(session_factory, "after_rollback", _discard_after_rollback)
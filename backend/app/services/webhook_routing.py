@@ -0,0 +1,83 @@
+"""
+Webhook Routing
+In-memory index of the active webhook subscriptions by event type, so
+dispatching an event costs a dict lookup instead of a query and a scan of
+every subscription's `events` list.
+
+The table is loaded on first use (warmed at startup) and reloaded after
+routers/webhook_settings.py changes a subscription. WEBHOOK_ROUTES_TTL_SECONDS
+bounds how long another worker process can serve a stale table.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from ..database import BackgroundSessionLocal
+from ..models import WebhookSubscription
+from .webhook_dispatcher import WebhookTarget
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_ROUTES_TTL_SECONDS = float(os.getenv("WEBHOOK_ROUTES_TTL_SECONDS", "60"))
+
+WILDCARD = "*"
+
+
+class WebhookRoutingTable:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._routes: Optional[Dict[str, Tuple[WebhookTarget, ...]]] = None
+        self._wildcard: Tuple[WebhookTarget, ...] = ()
+        self._loaded_at = 0.0
+
+    def targets(self, event_type: str) -> Tuple[WebhookTarget, ...]:
+        """Active subscriptions for `event_type`, wildcard subscriptions included."""
+        routes, wildcard = self._routes, self._wildcard
+        if routes is None or time.monotonic() - self._loaded_at > self.ttl:
+            routes, wildcard = self.load()
+        return routes.get(event_type, wildcard)
+
+    def invalidate(self):
+        """Drop the table; the next dispatch reloads it."""
+        with self._lock:
+            self._generation += 1
+            self._routes = None
+
+    def load(self):
+        with self._lock:
+            generation = self._generation
+
+        db = BackgroundSessionLocal()
+        try:
+            subs = db.query(
+                WebhookSubscription.id, WebhookSubscription.url,
+                WebhookSubscription.secret, WebhookSubscription.events
+            ).filter(WebhookSubscription.is_active == True).order_by(WebhookSubscription.id).all()
+        finally:
+            db.close()
+
+        wildcard = tuple(WebhookTarget(s.id, s.url, s.secret) for s in subs if WILDCARD in (s.events or []))
+        routes: Dict[str, Tuple[WebhookTarget, ...]] = {}
+        for s in subs:
+            events = s.events or []
+            if WILDCARD in events:
+                continue
+            target = WebhookTarget(s.id, s.url, s.secret)
+            for event_type in set(events):
+                routes[event_type] = routes.get(event_type, ()) + (target,)
+        routes = {event_type: targets + wildcard for event_type, targets in routes.items()}
+
+        with self._lock:
+            # A subscription changed while loading: serve this table once, reload next time
+            if generation == self._generation:
+                self._routes, self._wildcard = routes, wildcard
+                self._loaded_at = time.monotonic()
+        logger.info(f"Webhook routes loaded: {len(subs)} active subscriptions")
+        return routes, wildcard
+
+
+webhook_routes = WebhookRoutingTable(WEBHOOK_ROUTES_TTL_SECONDS)
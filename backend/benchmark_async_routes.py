@@ -0,0 +1,87 @@
+"""
+Load test: concurrent requests on the async routes (POST /webhooks/carrier).
+
+Usage: python benchmark_async_routes.py [base_url] [requests] [concurrency]
+Run it against a running API (default http://localhost:8000), on the commit
+before the async session stack and on this one, to compare. Sends the carrier
+webhook `requests` times with `concurrency` in flight, while probing
+GET /health: a route running blocking database calls on the event loop
+holds up the probes as well.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.database import SessionLocal
+from app.models import Shipment
+
+# Spread over several shipments, so requests don't queue on one row lock
+REFERENCES = [f"BENCH-ASYNC-{i:03d}" for i in range(100)]
+STATUSES = ["TRANSIT_OCEAN", "ARRIVAL_PORT_NYNJ"]
+
+
+def ensure_shipments():
+    db = SessionLocal()
+    try:
+        existing = {r for (r,) in db.query(Shipment.reference).filter(Shipment.reference.in_(REFERENCES))}
+        db.add_all(Shipment(reference=r, customer="BENCH", status="ORDER_INFO") for r in REFERENCES if r not in existing)
+        db.commit()
+    finally:
+        db.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+async def run(base_url, total, concurrency):
+    latencies, probes, errors = [], [], []
+    remaining = iter(range(total))
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency + 1)) as client:
+        async def worker():
+            for i in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/webhooks/carrier", json={
+                        "ref": REFERENCES[i % len(REFERENCES)], "status": STATUSES[i // len(REFERENCES) % 2], "location": "Benchmark"
+                    })
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    errors.append(e)
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                probes.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    print(f"{total} requests, concurrency {concurrency}: {elapsed:.2f}s, {len(latencies) / elapsed:.0f} req/s"
+          f" ({len(errors)} errors{': ' + repr(errors[0]) if errors else ''})")
+    print(f"  webhook latency  p50 {percentile(latencies, 0.5):.1f} ms  p95 {percentile(latencies, 0.95):.1f} ms")
+    print(f"  /health latency  p50 {percentile(probes, 0.5):.1f} ms  p95 {percentile(probes, 0.95):.1f} ms"
+          f"  max {max(probes, default=0) * 1000:.1f} ms  ({len(probes)} probes, mean {statistics.fmean(probes or [0]) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    ensure_shipments()
+    asyncio.run(run(base_url, total, concurrency))
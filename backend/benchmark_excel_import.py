@@ -0,0 +1,56 @@
+"""
+Benchmark: row-by-row vs vectorized Excel parsing (services/excel_import).
+
+Usage: python benchmark_excel_import.py [path/to/master.xlsx] [repeat]
+Checks that both engines return identical rows, then prints timings.
+"""
+import sys
+import time
+import math
+import warnings
+
+from app.services.excel_import import _read_frame, _parse_rows_iterrows, _parse_rows_vectorized
+
+warnings.simplefilter("ignore")
+
+
+def same(a, b):
+    if type(a) != type(b):
+        return False
+    if isinstance(a, dict):
+        return list(a) == list(b) and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "master.xlsx"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with open(path, "rb") as f:
+        content = f.read()
+
+    read_time, df = best_of(lambda: _read_frame(content), 1)
+    print(f"File: {path} ({len(content) / 1024:.0f} KB, {len(df)} rows, {len(df.columns)} columns)")
+    print(f"read_excel:  {read_time * 1000:8.1f} ms")
+
+    legacy_time, legacy_rows = best_of(lambda: _parse_rows_iterrows(df), repeat)
+    vector_time, vector_rows = best_of(lambda: list(_parse_rows_vectorized(df)), repeat)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(legacy_rows, vector_rows)) if not same(a, b)]
+    if len(legacy_rows) != len(vector_rows) or mismatches:
+        print(f"MISMATCH: {len(mismatches)} rows differ (first: {mismatches[:5]})")
+        sys.exit(1)
+
+    print(f"iterrows:    {legacy_time * 1000:8.1f} ms")
+    print(f"vectorized:  {vector_time * 1000:8.1f} ms  (x{legacy_time / vector_time:.1f}, rows identical)")
@@ -0,0 +1,79 @@
+"""
+Benchmark: in-memory vs streaming Excel reading (services/excel_import).
+
+Usage: python benchmark_excel_stream.py [path/to/master.xlsx] [copies,copies,...]
+Builds workbooks holding the sheet repeated N times, checks that both readers
+return identical rows, then prints time and peak memory for each size.
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from openpyxl import Workbook, load_workbook
+
+from app.services.excel_import import parse_excel, ExcelStream
+from benchmark_excel_import import same
+
+warnings.simplefilter("ignore")
+
+
+def build_workbook(path, copies, target):
+    source = load_workbook(path, read_only=True, data_only=True)
+    rows = [list(row) for row in source.worksheets[0].iter_rows(values_only=True)]
+    source.close()
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(rows[0])
+    for _ in range(copies):
+        for row in rows[1:]:
+            ws.append(row)
+    wb.save(target)
+
+
+def measure(func):
+    # Timed without tracing (tracemalloc slows allocations down a lot)
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def read_in_memory(target):
+    with open(target, "rb") as f:
+        rows, _ = parse_excel(f.read())
+    return sum(1 for _ in rows)
+
+
+def read_streaming(target):
+    with open(target, "rb") as f:
+        return sum(len(chunk) for chunk in ExcelStream(f).chunks())
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "master.xlsx"
+    sizes = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 4]
+
+    for copies in sizes:
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+            build_workbook(path, copies, tmp.name)
+
+            with open(tmp.name, "rb") as f:
+                expected, _ = parse_excel(f.read())
+            with open(tmp.name, "rb") as f:
+                streamed = [row for chunk in ExcelStream(f).chunks() for row in chunk]
+            if len(expected) != len(streamed) or not all(same(a, b) for a, b in zip(expected, streamed)):
+                sys.exit(f"Streaming reader mismatch with {copies} copies")
+            del expected, streamed
+
+            memory_time, memory_peak, rows = measure(lambda: read_in_memory(tmp.name))
+            stream_time, stream_peak, _ = measure(lambda: read_streaming(tmp.name))
+
+        print(f"{rows:7d} rows  in-memory: {memory_time:6.2f} s  peak {memory_peak / 2**20:7.1f} MiB"
+              f"  |  streaming: {stream_time:6.2f} s  peak {stream_peak / 2**20:7.1f} MiB")
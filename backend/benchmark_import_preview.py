@@ -0,0 +1,108 @@
+"""
+Benchmark: key lookup vs full table scan in validate_and_preview (services/excel_import).
+
+Usage: python benchmark_import_preview.py [path/to/master.xlsx] [existing_shipments]
+Seeds BENCHMARK_DATABASE_URL (default: "logistics_bench" database next to
+DATABASE_URL, dropped and re-created) with the file's shipments plus N
+synthetic ones, checks both lookups return the same preview, then prints timings.
+"""
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+
+from app.database import Base, DATABASE_URL
+from app.models import Shipment, shipment_import_key_index
+from app.services.excel_import import parse_excel, validate_and_preview, _import_key
+
+warnings.simplefilter("ignore")
+
+BENCHMARK_DATABASE_URL = os.getenv(
+    "BENCHMARK_DATABASE_URL",
+    make_url(DATABASE_URL).set(database="logistics_bench").render_as_string(hide_password=False)
+)
+
+
+def fresh_database():
+    url = make_url(BENCHMARK_DATABASE_URL)
+    admin = create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{url.database}"')
+        conn.exec_driver_sql(f'CREATE DATABASE "{url.database}"')
+    admin.dispose()
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(CreateIndex(shipment_import_key_index, if_not_exists=True))
+    return engine
+
+
+def seed(engine, rows, count):
+    columns = ["reference", "order_number", "batch_number", "customer", "status", "incoterm"]
+    keys = {_import_key(r["data"]["order_number"], r["data"].get("batch_number")) for r in rows if r.get("data", {}).get("order_number")}
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            with cur.copy(f"COPY {Shipment.__tablename__} ({', '.join(columns)}) FROM STDIN") as copy:
+                for i, (order, batch) in enumerate(keys):
+                    copy.write_row((f"FILE-{i:07d}", order, batch, "BENCH", "CREATED", "FOB"))
+                for i in range(count):
+                    copy.write_row((f"BENCH-{i:07d}", f"BENCH{i:07d}", str(i % 7 or ""), "BENCH", "CREATED", "FOB"))
+        raw.commit()
+    finally:
+        raw.close()
+
+    # Planner statistics as autovacuum would leave them on a live database
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f"ANALYZE {Shipment.__tablename__}")
+
+
+def timed(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "master.xlsx"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    with open(path, "rb") as f:
+        rows, columns = parse_excel(f.read())
+
+    engine = fresh_database()
+    Session = sessionmaker(bind=engine)
+
+    # Half of the file already in the database, so the preview has both "new" and "update" rows
+    seed(engine, rows[: len(rows) // 2], count)
+
+    db = Session()
+    scan_time, scan_peak, scan = timed(lambda: validate_and_preview(rows, db, key_lookup=False))
+    db.close()
+    db = Session()
+    lookup_time, lookup_peak, lookup = timed(lambda: validate_and_preview(rows, db))
+    db.close()
+
+    if scan != lookup:
+        diff = sum(a != b for a, b in zip(scan, lookup))
+        sys.exit(f"Preview mismatch on {diff} rows")
+
+    statuses = {}
+    for r in lookup:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+
+    print(f"{len(rows)} rows against {count} existing shipments: {statuses}")
+    print(f"full scan:  {scan_time * 1000:8.1f} ms  peak {scan_peak / 2**20:7.1f} MiB")
+    print(f"key lookup: {lookup_time * 1000:8.1f} ms  peak {lookup_peak / 2**20:7.1f} MiB")
+    print(f"speedup:    {scan_time / lookup_time:8.1f}x")
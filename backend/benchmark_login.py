@@ -0,0 +1,85 @@
+"""
+Benchmark: login throughput and event loop stalls during a burst of logins.
+
+Usage: python benchmark_login.py [logins] [concurrency]
+Sends `logins` POST /auth/login (default 200), `concurrency` at a time
+(default 20), in-process against DATABASE_URL, while a probe coroutine sleeps
+in 10 ms steps on the same event loop. Prints the logins per second, the
+latency percentiles and how late the probe woke up (p99 and worst): the time
+the loop was blocked, i.e. websocket broadcasts and chatbot streams held back.
+Tune PASSWORD_HASH_WORKERS / PASSWORD_HASH_ROUNDS and compare.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.auth import PASSWORD_HASH_ROUNDS, PASSWORD_HASH_WORKERS, get_password_hash
+from app.database import SessionLocal
+from app.main import app
+from app.models import User
+
+BENCH_USER = "bench-login@example.com"
+BENCH_PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.01
+
+
+def ensure_user():
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.email == BENCH_USER).first() is None:
+            db.add(User(email=BENCH_USER, name="Bench", role="client", password_hash=get_password_hash(BENCH_PASSWORD)))
+            db.commit()
+    finally:
+        db.close()
+
+
+async def probe(stalls, done):
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        stalls.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run(logins, concurrency):
+    # No lifespan: the startup hooks (scheduler, seeding) would run too
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        form = {"username": BENCH_USER, "password": BENCH_PASSWORD}
+        (await client.post("/auth/login", data=form)).raise_for_status()  # Warm up
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def login():
+            async with semaphore:
+                start = time.perf_counter()
+                (await client.post("/auth/login", data=form)).raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        stalls, done = [], asyncio.Event()
+        prober = asyncio.create_task(probe(stalls, done))
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    latencies.sort()
+    print(f"{logins} logins, {concurrency} concurrent, "
+          f"{PASSWORD_HASH_WORKERS} hashing threads, {PASSWORD_HASH_ROUNDS} rounds")
+    print(f"throughput      {logins / elapsed:8.1f} logins/s")
+    print(f"latency p50     {statistics.median(latencies) * 1000:8.1f} ms")
+    print(f"latency p95     {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.1f} ms")
+    stalls.sort()
+    print(f"loop stall p99  {stalls[int(len(stalls) * 0.99) - 1] * 1000:8.1f} ms")
+    print(f"loop stall max  {stalls[-1] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    ensure_user()
+    asyncio.run(run(logins, concurrency))
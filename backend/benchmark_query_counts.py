@@ -0,0 +1,115 @@
+"""
+Regression check: SQL statements per request on the main read paths.
+
+Usage: python benchmark_query_counts.py [shipments] [repeat]
+Seeds `shipments` BENCH-QC-xxx shipments in DATABASE_URL (default 100, with
+events, an alert and a document each), then runs each read path in-process,
+printing the statements it runs and its mean time over `repeat` runs.
+Exits with status 1 if a path runs more statements than its budget, which
+doesn't depend on the number of shipments: a relationship loaded lazily per
+shipment shows up as N extra queries.
+"""
+import statistics
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token, get_password_hash
+from app.database import SessionLocal
+from app.loading import count_queries
+from app.main import app
+from app.models import Alert, Document, Event, Shipment, User
+from app.services.chatbot.scenarios import ChatbotScenarios
+
+PREFIX = "BENCH-QC-"
+BENCH_USER = "bench-queries@example.com"
+EVENT_TYPES = ["PRODUCTION_READY", "LOADING_IN_PROGRESS", "TRANSIT_OCEAN"]
+
+
+def ensure_data(count):
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.email == BENCH_USER).first() is None:
+            db.add(User(email=BENCH_USER, name="Bench", role="ops", password_hash=get_password_hash("bench")))
+        existing = db.query(Shipment).filter(Shipment.reference.like(f"{PREFIX}%")).count()
+        for i in range(existing, count):
+            shipment = Shipment(reference=f"{PREFIX}{i:04d}", customer="BENCH",
+                                status="FINAL_DELIVERY" if i % 2 else "TRANSIT_OCEAN")
+            shipment.events = [Event(type=t, source="BENCH") for t in EVENT_TYPES]
+            shipment.alerts = [Alert(type="DELAY", message="Benchmark")]
+            shipment.documents = [Document(type="POD", filename=f"pod-{i}.pdf", url=f"/docs/pod-{i}.pdf")]
+            db.add(shipment)
+        db.commit()
+    finally:
+        db.close()
+
+
+def read_paths(client, headers, ref, shipment_id, user):
+    def get(url):
+        def call():
+            client.get(url, headers=headers).raise_for_status()
+        return call
+
+    def scenario(name):
+        def call():
+            db = SessionLocal()
+            try:
+                getattr(ChatbotScenarios(db, user), name)(ref)
+            finally:
+                db.close()
+        return call
+
+    # (name, call, statement budget)
+    return [
+        ("GET /shipments/?limit=100", get("/shipments/?limit=100"), 3),
+        ("GET /shipments/{id}", get(f"/shipments/{shipment_id}"), 3),
+        ("GET /shipments/list", get("/shipments/list?limit=100"), 3),  # A page may span the NULL and non-NULL segments
+        ("GET /shipments/stats", get("/shipments/stats"), 2),
+        ("GET /events/shipments/{id}", get(f"/events/shipments/{shipment_id}"), 3),
+        ("chatbot get_tracking", scenario("get_tracking"), 3),
+        ("chatbot get_exw_to_ddp_status", scenario("get_exw_to_ddp_status"), 2),
+        ("chatbot get_documents_status", scenario("get_documents_status"), 2),
+        ("chatbot check_pod_completion", scenario("check_pod_completion"), 2),
+    ]
+
+
+def run(count, repeat):
+    ensure_data(count)
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCH_USER).one()
+        shipment = db.query(Shipment).filter(Shipment.reference == f"{PREFIX}0001").one()
+        ref, shipment_id = shipment.reference, shipment.id
+    finally:
+        db.close()
+
+    # No `with`: the startup hooks (scheduler, workers) would run queries too
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': BENCH_USER})}"}
+
+    over_budget = []
+    print(f"{count} shipments, {repeat} runs per path")
+    print(f"{'path':<34}{'queries':>8}{'budget':>8}{'mean ms':>10}")
+    for name, call, budget in read_paths(client, headers, ref, shipment_id, user):
+        call()  # Warm up (connections, dialect initialization)
+        with count_queries() as counter:
+            call()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<34}{counter.count:>8}{budget:>8}{statistics.fmean(timings) * 1000:>10.1f}")
+        if counter.count > budget:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(count, repeat)
@@ -0,0 +1,73 @@
+"""
+Index advisor: EXPLAIN the chatbot's SQL templates and flag sequential scans.
+
+Usage: python explain_chatbot_queries.py [value] [--planner]
+Replays every "SQL:" example of the chatbot prompt (services/chatbot/engine.py)
+on DATABASE_URL, with '%X%' searching for `value` (default "LG79"), and lists
+the sequential scans of each plan.
+
+By default plans are made with enable_seqscan off, so a sequential scan only
+remains where no index can serve the query, whatever the size of the tables
+(on a small database a sequential scan is the cheapest plan anyway):
+ - SEQ SCAN: rows filtered by a condition no index serves -> index candidate
+ - full read: no filter (aggregates over the whole table), nothing to index
+--planner keeps the planner's own choices, to check a production-sized database.
+"""
+import sys
+
+from app.database import engine
+from app.services.chatbot.engine import SQL_PROMPT
+
+
+def templates():
+    seen = set()
+    for line in SQL_PROMPT.splitlines():
+        if line.startswith("SQL: ") and line not in seen:
+            seen.add(line)
+            yield line[len("SQL: "):].rstrip(";")
+
+
+def seq_scans(plan):
+    if plan["Node Type"] == "Seq Scan":
+        yield plan
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def run(value, planner):
+    flagged, full_reads, errors = 0, 0, 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for sql in templates():
+            sql = sql.replace("'%X%'", "'%" + value.replace("'", "''") + "%'")
+            try:
+                if not planner:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                # No parameters: the templates' % are not placeholders
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                [(plan,)] = cursor.fetchall()
+            except Exception as e:
+                errors += 1
+                print(f"ERROR      {sql}\n           {str(e).splitlines()[0]}")
+                continue
+            finally:
+                connection.rollback()
+
+            for scan in seq_scans(plan[0]["Plan"]):
+                if scan.get("Filter"):
+                    flagged += 1
+                    print(f"SEQ SCAN   {scan['Relation Name']}: {scan['Filter']}\n           {sql}")
+                else:
+                    full_reads += 1
+                    print(f"full read  {scan['Relation Name']}\n           {sql}")
+    finally:
+        connection.close()
+
+    print(f"\n{len(list(templates()))} templates: {flagged} filtered sequential scans, "
+          f"{full_reads} full reads, {errors} errors")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    run(args[0] if args else "LG79", "--planner" in sys.argv)
@@ -4,7 +4,6 @@ import { useEffect, useState } from "react";
 import { Link } from "@/navigation";
 import { useAuth } from "@/contexts/AuthContext";
 import { shipmentService } from "@/services/shipmentService";
-import { Shipment } from "@/types/shipment";
 import ShipmentsTable from "@/components/ShipmentsTable";
 import { Card } from "@/components/ui/Card";
 import { useTranslations } from "next-intl";
@@ -31,14 +30,9 @@ export default function DashboardPage() {
     const loadStats = async () => {
         try {
             if (!token) return;
-            const data = await shipmentService.getAll(token);
-
-            const total = data.length;
-            const delivered = data.filter((s) => s.status === "FINAL_DELIVERY").length;
-            const inTransit = data.filter((s) => s.status && (s.status.includes("TRANSIT") || s.status.includes("ON BOARD") || s.status === "ON_BOARD")).length;
-            const pending = total - delivered - inTransit;
-
-            setStats({ total, inTransit, delivered, pending });
+            // Counted server-side instead of downloading every shipment
+            const data = await shipmentService.getStats(token);
+            setStats({ total: data.total, inTransit: data.in_transit, delivered: data.delivered, pending: data.pending });
         } catch (e: any) {
             // Ignore 401 errors as they are handled globally
             if (e?.status !== 401) {
@@ -29,10 +29,33 @@ function getTimeAgo(dateString: string | null | undefined, t: any) {
     return date.toLocaleDateString();
 }
 
+// Pushed on /ws/shipments after shipments change
+interface ShipmentDelta {
+    id: number;
+    op: "created" | "updated" | "deleted";
+    status?: string;
+    fields?: Partial<Shipment>;
+}
+
+interface ShipmentsDeltaMessage {
+    type: "shipments.delta";
+    shipments: ShipmentDelta[];
+}
+
+// Columns the table renders, requested from /shipments/list (same as the live deltas)
+const LIST_FIELDS = [
+    "reference", "customer", "origin", "destination", "incoterm", "planned_etd", "planned_eta",
+    "sku", "quantity", "order_number", "mad_date", "its_date", "vessel", "bl_number",
+    "forwarder_ref", "status", "created_at",
+];
+const PAGE_SIZE = 100;
+
 export default function ShipmentsTable() {
     const t = useTranslations('ShipmentsTable');
     const [shipments, setShipments] = useState<Shipment[]>([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState<string | null>(null);
     const { token, logout } = useAuth();
     const wsRef = useRef<WebSocket | null>(null);
@@ -57,25 +80,33 @@ export default function ShipmentsTable() {
     const [sortConfig, setSortConfig] = useState<{ key: keyof Shipment | 'created_at', direction: 'asc' | 'desc' }>({ key: 'created_at', direction: 'desc' });
     const [showSortMenu, setShowSortMenu] = useState(false);
 
+    // First page, again whenever the sort changes (sorted server-side)
     useEffect(() => {
         if (!token) return;
         loadShipments();
+    }, [token, sortConfig]);
+
+    useEffect(() => {
+        if (!token) return;
 
         // WebSocket Login
         const API_BASE = process.env.NEXT_PUBLIC_API_URL || "/api";
-        const wsUrl = API_BASE.replace("http", "ws") + "/ws/shipments";
+        const wsUrl = API_BASE.replace("http", "ws") + "/ws/shipments?token=" + encodeURIComponent(token);
 
         try {
             const ws = new WebSocket(wsUrl);
             wsRef.current = ws;
 
             ws.onopen = () => console.log("🟢 WS Connected");
-            ws.onmessage = async (event) => {
-                const message = event.data;
-                console.log("⚡ WS Message:", message);
-
-                if (message.startsWith("event_created")) {
-                    await loadShipments(); // Refresh data
+            ws.onmessage = (event) => {
+                let message: ShipmentsDeltaMessage;
+                try {
+                    message = JSON.parse(event.data);
+                } catch {
+                    return;
+                }
+                if (message.type === "shipments.delta") {
+                    applyDeltas(message.shipments);
                 }
             };
 
@@ -87,11 +118,54 @@ export default function ShipmentsTable() {
         }
     }, [token]);
 
-    const loadShipments = async () => {
+    // Merge pushed changes into the list instead of refetching it
+    const applyDeltas = (deltas: ShipmentDelta[]) => {
+        setShipments(prev => {
+            const byId = new Map(prev.map(s => [s.id, s]));
+            for (const delta of deltas) {
+                if (delta.op === "deleted") {
+                    byId.delete(delta.id);
+                    continue;
+                }
+                const current = byId.get(delta.id);
+                if (current) {
+                    byId.set(delta.id, { ...current, ...delta.fields, status: delta.status ?? current.status });
+                } else if (delta.fields?.reference !== undefined) {
+                    // New, or newly visible: deltas without reference only carry the changed columns
+                    byId.set(delta.id, { ...delta.fields, id: delta.id, status: delta.status } as Shipment);
+                }
+            }
+            return Array.from(byId.values());
+        });
+
+        const changed = deltas.filter(d => d.op !== "deleted").map(d => d.id);
+        if (changed.length) {
+            setFlashingRows(new Set(changed));
+            setTimeout(() => setFlashingRows(new Set()), 2000);
+        }
+    };
+
+    const loadShipments = async (cursor?: string) => {
         try {
             if (!token) return;
-            const data = await shipmentService.getAll(token);
-            setShipments(data);
+            if (cursor) setLoadingMore(true);
+            const page = await shipmentService.getPage(token, {
+                sort: sortConfig.key as "created_at" | "reference" | "planned_eta" | "planned_etd",
+                direction: sortConfig.direction,
+                fields: LIST_FIELDS,
+                limit: PAGE_SIZE,
+                cursor,
+            });
+            if (cursor) {
+                // Skip rows already pushed over the WebSocket
+                setShipments(prev => {
+                    const seen = new Set(prev.map(s => s.id));
+                    return [...prev, ...page.items.filter(s => !seen.has(s.id))];
+                });
+            } else {
+                setShipments(page.items);
+            }
+            setNextCursor(page.next_cursor ?? null);
         } catch (err: any) {
             console.error(err);
             // 401 is handled globally by AuthContext now
@@ -100,21 +174,23 @@ export default function ShipmentsTable() {
             }
         } finally {
             setLoading(false);
+            setLoadingMore(false);
         }
     };
 
-    // Memoized Sorted Data
+    // Pages come sorted; this keeps rows pushed over the WebSocket in place
     const sortedShipments = useMemo(() => {
         if (!shipments) return [];
         return [...shipments].sort((a, b) => {
             let aValue = a[sortConfig.key];
             let bValue = b[sortConfig.key];
 
-            // Specific handling for dates to ensure proper comparison
+            // Specific handling for dates to ensure proper comparison (no date last, as the server sorts)
             if (sortConfig.key === 'created_at' || sortConfig.key === 'planned_eta' || sortConfig.key === 'planned_etd') {
-                const dateA = aValue ? new Date(aValue as string).getTime() : 0;
-                const dateB = bValue ? new Date(bValue as string).getTime() : 0;
-                return sortConfig.direction === 'asc' ? dateA - dateB : dateB - dateA;
+                const dateA = aValue ? new Date(aValue as string).getTime() : Infinity;
+                const dateB = bValue ? new Date(bValue as string).getTime() : Infinity;
+                if (dateA === dateB) return 0;
+                return (dateA < dateB ? -1 : 1) * (sortConfig.direction === 'asc' ? 1 : -1);
             }
 
             // String comparison
@@ -129,7 +205,9 @@ export default function ShipmentsTable() {
     }, [shipments, sortConfig]);
 
     const handleSort = (key: keyof Shipment | 'created_at', direction: 'asc' | 'desc') => {
-        setSortConfig({ key, direction });
+        if (key !== sortConfig.key || direction !== sortConfig.direction) {
+            setSortConfig({ key, direction });
+        }
         setShowSortMenu(false);
     };
 
@@ -248,7 +326,7 @@ export default function ShipmentsTable() {
                     </thead>
                     <tbody className="divide-y divide-surface-2">
                         {sortedShipments.map((shipment) => (
-                            <tr key={shipment.id} className="hover:bg-surface-1/50 transition-colors group">
+                            <tr key={shipment.id} className={`hover:bg-surface-1/50 transition-colors group ${flashingRows.has(shipment.id) ? 'bg-brand-primary/5' : ''}`}>
                                 {visibleColumns.reference && (
                                     <td className="px-4 py-3 whitespace-nowrap">
                                         <div className="flex flex-col">
@@ -384,6 +462,18 @@ export default function ShipmentsTable() {
                     </Card>
                 ))}
             </div>
+
+            {nextCursor && (
+                <div className="flex justify-center">
+                    <button
+                        onClick={() => loadShipments(nextCursor)}
+                        disabled={loadingMore}
+                        className="btn btn-secondary text-sm bg-white border border-surface-3 hover:bg-surface-1 disabled:opacity-50"
+                    >
+                        {loadingMore ? t('loadingData') : t('loadMore')}
+                    </button>
+                </div>
+            )}
         </div >
     );
 }
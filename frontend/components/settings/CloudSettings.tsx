@@ -334,7 +334,7 @@ function OneDriveSyncConfig({ token }: { token: string | null }) {
                 method: 'POST',
                 token
             });
-            alert(t('successSync', { created: res.created, updated: res.updated, skipped: res.skipped, errors: res.errors.length }));
+            alert(t('successSync', { created: res.created, updated: res.updated, unchanged: res.unchanged ?? 0, skipped: res.skipped, errors: res.errors.length }));
             loadConfig(); // Reload last_run
         } catch (e) {
             alert(t('alerts.syncError'));
@@ -14,12 +14,20 @@ interface ApiKey {
     created_at: string;
     last_used_at: string | null;
     is_active: boolean;
+    scopes: string[];
 }
 
 interface ApiKeyCreated extends ApiKey {
     key: string;
 }
 
+// Labels of the scopes known to this UI; others are shown as is
+const SCOPE_LABELS: Record<string, string> = {
+    "read:shipments": "Lecture des expéditions",
+    "read:events": "Lecture des jalons",
+    "write:events": "Création de jalons",
+};
+
 export default function SecuritySettings() {
     const t = useTranslations("Settings.Security");
     const { token } = useAuth();
@@ -27,6 +35,8 @@ export default function SecuritySettings() {
     const [isLoading, setIsLoading] = useState(false);
     const [showCreateModal, setShowCreateModal] = useState(false);
     const [newKeyName, setNewKeyName] = useState("");
+    const [availableScopes, setAvailableScopes] = useState<string[]>([]);
+    const [newKeyScopes, setNewKeyScopes] = useState<string[]>([]);
     const [createdKey, setCreatedKey] = useState<string | null>(null);
 
     const fetchKeys = useCallback(async () => {
@@ -46,16 +56,30 @@ export default function SecuritySettings() {
         fetchKeys();
     }, [fetchKeys]);
 
+    useEffect(() => {
+        if (!token) return;
+        apiFetch<string[]>("/settings/api-keys/scopes", { token })
+            .then(setAvailableScopes)
+            .catch(console.error);
+    }, [token]);
+
+    const toggleScope = (scope: string) => {
+        setNewKeyScopes((scopes) =>
+            scopes.includes(scope) ? scopes.filter((s) => s !== scope) : [...scopes, scope]
+        );
+    };
+
     const handleCreateKey = async () => {
-        if (!newKeyName.trim()) return;
+        if (!newKeyName.trim() || newKeyScopes.length === 0) return;
         try {
             const data = await apiFetch<ApiKeyCreated>("/settings/api-keys/", {
                 token,
                 method: "POST",
-                body: JSON.stringify({ name: newKeyName })
+                body: JSON.stringify({ name: newKeyName, scopes: newKeyScopes })
             });
             setCreatedKey(data.key); // Provide the full key to user
             setNewKeyName("");
+            setNewKeyScopes([]);
             fetchKeys(); // Refresh list
         } catch (e) {
             console.error(e);
@@ -81,6 +105,7 @@ export default function SecuritySettings() {
         setShowCreateModal(false);
         setCreatedKey(null);
         setNewKeyName("");
+        setNewKeyScopes([]);
     }
 
     return (
@@ -118,6 +143,16 @@ export default function SecuritySettings() {
                                             {t("created", { date: format(new Date(key.created_at), "dd MMM yyyy", { locale: fr }) })}
                                         </span>
                                     </div>
+                                    <div className="flex flex-wrap gap-1 mt-2">
+                                        {key.scopes.length === 0 && (
+                                            <span className="text-xs text-amber-700">Aucune permission</span>
+                                        )}
+                                        {key.scopes.map((scope) => (
+                                            <span key={scope} className="text-xs bg-white px-2 py-0.5 rounded border border-slate-200 text-slate-600">
+                                                {SCOPE_LABELS[scope] ?? scope}
+                                            </span>
+                                        ))}
+                                    </div>
                                 </div>
                                 <div className="flex items-center gap-4">
                                     <span className="text-xs text-slate-500">
@@ -187,6 +222,23 @@ export default function SecuritySettings() {
                                             autoFocus
                                         />
                                     </div>
+                                    <div>
+                                        <span className="block text-sm font-medium text-slate-700 mb-1">Permissions</span>
+                                        <div className="space-y-2">
+                                            {availableScopes.map((scope) => (
+                                                <label key={scope} className="flex items-center gap-2 text-sm text-slate-700">
+                                                    <input
+                                                        type="checkbox"
+                                                        checked={newKeyScopes.includes(scope)}
+                                                        onChange={() => toggleScope(scope)}
+                                                        className="rounded border-slate-300"
+                                                    />
+                                                    {SCOPE_LABELS[scope] ?? scope}
+                                                    <code className="text-xs text-slate-400 font-mono">{scope}</code>
+                                                </label>
+                                            ))}
+                                        </div>
+                                    </div>
                                     <div className="flex justify-end gap-3 pt-4">
                                         <button
                                             onClick={() => setShowCreateModal(false)}
@@ -196,7 +248,7 @@ export default function SecuritySettings() {
                                         </button>
                                         <button
                                             onClick={handleCreateKey}
-                                            disabled={!newKeyName.trim()}
+                                            disabled={!newKeyName.trim() || newKeyScopes.length === 0}
                                             className="bg-brand-primary disabled:opacity-50 text-white px-4 py-2 rounded-lg"
                                         >
                                             Générer
@@ -1,5 +1,5 @@
 import { apiFetch } from "./api";
-import { Shipment, ShipmentCreate } from "../types/shipment";
+import { Shipment, ShipmentCreate, ShipmentListParams, ShipmentPage, ShipmentStats } from "../types/shipment";
 import { Event, EventCreate } from "../types/event";
 
 export const shipmentService = {
@@ -7,6 +7,26 @@ export const shipmentService = {
         return apiFetch<Shipment[]>("/shipments/", { token });
     },
 
+    // One page of the listing, without events; pass next_cursor back as `cursor`
+    getPage: async (token: string, params: ShipmentListParams = {}): Promise<ShipmentPage> => {
+        const query = new URLSearchParams();
+        for (const [key, value] of Object.entries(params)) {
+            if (value === undefined || value === null) continue;
+            if (key === "fields") {
+                query.set(key, (value as string[]).join(","));
+            } else if (Array.isArray(value)) {
+                value.forEach(v => query.append(key, v));
+            } else {
+                query.set(key, String(value));
+            }
+        }
+        return apiFetch<ShipmentPage>(`/shipments/list?${query}`, { token });
+    },
+
+    getStats: async (token: string): Promise<ShipmentStats> => {
+        return apiFetch<ShipmentStats>("/shipments/stats", { token });
+    },
+
     getById: async (id: number | string, token: string): Promise<Shipment> => {
         return apiFetch<Shipment>(`/shipments/${id}`, { token });
     },
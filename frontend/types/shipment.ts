@@ -47,6 +47,34 @@ export interface Shipment {
     created_at: string; // ISO DateTime
 }
 
+// GET /shipments/list: rows only carry the requested `fields` (and id)
+export interface ShipmentPage {
+    items: Shipment[];
+    next_cursor?: string | null; // Pass as `cursor` for the next page
+    limit: number;
+}
+
+export interface ShipmentListParams {
+    cursor?: string | null;
+    limit?: number;
+    sort?: "planned_eta" | "planned_etd" | "created_at" | "reference";
+    direction?: "asc" | "desc";
+    fields?: string[];
+    status?: string[];
+    customer?: string[];
+    mode?: string[];
+    eta_from?: string;
+    eta_to?: string;
+    rush?: boolean;
+}
+
+export interface ShipmentStats {
+    total: number;
+    in_transit: number;
+    delivered: number;
+    pending: number;
+}
+
 export interface ShipmentCreate {
     reference: string;
     customer?: string | null;